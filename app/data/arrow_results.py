@@ -0,0 +1,142 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.data.db import connect_database
+
+BATCH_ROWS = 50000
+
+# Column kinds per table (as in app.models.batches): category columns are
+# dictionary-encoded, date/datetime columns are parsed from their ISO text
+TABLE_KINDS = {
+    "cyber_incidents": {"id": "int", "date": "date", "incident_type": "category", "severity": "category",
+                        "status": "category", "created_at": "datetime", "risk_score": "float"},
+    "it_tickets": {"id": "int", "ticket_id": "text", "subject": "category", "priority": "category",
+                   "status": "category", "created_date": "date", "created_at": "datetime"},
+    "datasets_metadata": {"id": "int", "dataset_name": "text", "category": "category", "file_size_mb": "float",
+                          "created_at": "datetime", "size_bytes": "int", "row_count": "int", "column_count": "int"},
+}
+
+
+def _array(kind: str, values) -> pa.Array:
+    """Builds one typed Arrow column straight from a list of Python values."""
+    if kind == "int":
+        return pa.array(values, pa.int64())
+    if kind == "float":
+        return pa.array(values, pa.float64())
+    try:
+        text = pa.array(values, pa.string())
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        text = pa.array([None if v is None else str(v) for v in values], pa.string())
+    if kind == "category":
+        return text.dictionary_encode()
+    if kind == "date":
+        parsed = pc.strptime(pc.utf8_slice_codeunits(text, 0, 10), format="%Y-%m-%d", unit="s", error_is_null=True)
+        return parsed.cast(pa.date32())
+    if kind == "datetime":
+        return pc.strptime(pc.utf8_slice_codeunits(text, 0, 19), format="%Y-%m-%d %H:%M:%S", unit="s",
+                           error_is_null=True)
+    return text
+
+
+def rows_to_batch(rows, columns, kinds) -> pa.RecordBatch:
+    """One RecordBatch from row tuples; columns without a known kind are inferred by Arrow."""
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    arrays = [_array(kinds[c], list(v)) if c in kinds else pa.array(list(v)) for c, v in zip(columns, values)]
+    return pa.RecordBatch.from_arrays(arrays, names=list(columns))
+
+
+def iter_batches(sql: str, params=(), table: str = None, batch_rows: int = BATCH_ROWS, conn=None):
+    """
+    Runs a query and yields its result as Arrow RecordBatches of up to
+    batch_rows rows, typed from TABLE_KINDS[table] when given.
+    """
+    kinds = TABLE_KINDS.get((table or "").lower(), {})
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    try:
+        cursor = conn.execute(sql, params)
+        columns = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                break
+            yield rows_to_batch(rows, columns, kinds)
+    finally:
+        if ownConnection:
+            conn.close()
+
+
+def query_arrow(sql: str, params=(), table: str = None, batch_rows: int = BATCH_ROWS, conn=None) -> pa.Table:
+    """
+    The whole result of a query as one Arrow table, ready for st.dataframe.
+    Dictionaries are unified across batches so every chunk shares one.
+    """
+    batches = list(iter_batches(sql, params, table, batch_rows, conn))
+    if not batches:
+        # No rows: run it again only for the column names
+        ownConnection = conn is None
+        conn = conn or connect_database()
+        try:
+            columns = [d[0] for d in conn.execute(sql, params).description]
+        finally:
+            if ownConnection:
+                conn.close()
+        batches = [rows_to_batch([], columns, TABLE_KINDS.get((table or "").lower(), {}))]
+    return pa.Table.from_batches(batches).unify_dictionaries()
+
+
+def table_arrow(table: str, where: str = "", params=()) -> pa.Table:
+    """Every row of a table (optionally filtered) as a typed Arrow table."""
+    sql = "SELECT * FROM {}".format(table)
+    if where:
+        sql += " WHERE " + where
+    return query_arrow(sql, params, table)
+
+
+if __name__ == "__main__":
+    import sqlite3
+    import tempfile
+    import time
+    import tracemalloc
+    from pathlib import Path
+
+    import numpy as np
+    import pandas as pd
+
+    # 500k synthetic incidents in a scratch database
+    rng = np.random.default_rng(0)
+    n = 500000
+    types = np.array(["Phishing", "Malware", "DDoS", "Data Leak", "Ransomware"])
+    levels = np.array(["Low", "Medium", "High", "Critical"])
+    statuses = np.array(["Open", "Closed", "Resolved", "Under Investigation"])
+    days = np.datetime64("2020-01-01") + rng.integers(0, 2000, n)
+    path = Path(tempfile.mkdtemp()) / "bench.db"
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE cyber_incidents (id INTEGER PRIMARY KEY, date DATE, incident_type TEXT, "
+                 "severity TEXT, status TEXT, created_at TIMESTAMP)")
+    conn.executemany("INSERT INTO cyber_incidents VALUES (?, ?, ?, ?, ?, ?)",
+                     zip(range(n), days.astype(str), types[rng.integers(0, 5, n)], levels[rng.integers(0, 4, n)],
+                         statuses[rng.integers(0, 4, n)], (days.astype(str).astype(object) + " 10:00:00")))
+    conn.commit()
+
+    def measure(fn):
+        """Time of a clean run, then peak traced memory of a second one."""
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return result, elapsed, peak
+
+    sql = "SELECT * FROM cyber_incidents"
+    frame, pdTime, pdPeak = measure(lambda: pd.read_sql_query(sql, conn))
+    arrowFromPandas, convTime, _ = measure(lambda: pa.Table.from_pandas(frame))
+    table, paTime, paPeak = measure(lambda: query_arrow(sql, table="cyber_incidents", conn=conn))
+    conn.close()
+    mb = 1024 * 1024
+    print("pandas:  {:.2f} s read + {:.2f} s to Arrow for display, result {:.0f} MB, peak {:.0f} MB".format(
+        pdTime, convTime, frame.memory_usage(deep=True).sum() / mb, pdPeak / mb))
+    print("arrow:   {:.2f} s, result {:.0f} MB, peak {:.0f} MB".format(paTime, table.nbytes / mb, paPeak / mb))
+    print(table.schema)
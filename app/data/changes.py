@@ -0,0 +1,156 @@
+import json
+import threading
+
+from app.data.db import connect_database
+
+# table -> (key column, columns captured in the changelog, columns whose updates are logged)
+TRACKED_TABLES = {
+    "cyber_incidents": ("id", ("id", "date", "incident_type", "severity", "status", "created_at"),
+                        ("date", "incident_type", "severity", "status")),
+    "it_tickets": ("ticket_id", ("id", "ticket_id", "subject", "priority", "status", "created_date", "created_at"),
+                   ("ticket_id", "subject", "priority", "status", "created_date", "created_at")),
+    "datasets_metadata": ("id", ("id", "dataset_name", "category", "file_size_mb", "created_at"),
+                          ("dataset_name", "category", "file_size_mb", "created_at")),
+}
+
+# Seconds between polls of the changelog from the pages
+POLL_SECONDS = 10
+
+# Changes kept behind the newest even once every reader in this process has
+# applied them, for readers in other processes (which reload if they fall further behind)
+KEEP_CHANGES = 10000
+
+_readers = []
+_readersLock = threading.Lock()
+
+def add_change_reader(reader):
+    """
+    Registers an object that replays the log, such as a LiveView. Its .seq
+    (the last change it applied) is never pruned past while it is ._loaded.
+    """
+    with _readersLock:
+        _readers.append(reader)
+
+def _json_row(prefix, columns):
+    return "json_object({})".format(", ".join("'{0}', {1}.{0}".format(c, prefix) for c in columns))
+
+def create_changelog(conn):
+    """
+    Create the change_log table and the triggers that append one row per
+    insert, update or delete on the tracked tables. seq only ever grows.
+    """
+    cursor = conn.cursor()
+    cursor.executescript("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_key TEXT NOT NULL,
+            old_values TEXT,
+            new_values TEXT,
+            changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_change_log_table ON change_log (table_name, seq);
+    """)
+    for table, (key, columns, watched) in TRACKED_TABLES.items():
+        cursor.executescript("""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_cdc_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, op, row_key, new_values)
+                VALUES ('{table}', 'insert', NEW.{key}, {new});
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_cdc_update AFTER UPDATE OF {watched} ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, op, row_key, old_values, new_values)
+                VALUES ('{table}', 'update', NEW.{key}, {old}, {new});
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_cdc_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, op, row_key, old_values)
+                VALUES ('{table}', 'delete', OLD.{key}, {old});
+            END;
+        """.format(table=table, key=key, watched=", ".join(watched),
+                   old=_json_row("OLD", columns), new=_json_row("NEW", columns)))
+    conn.commit()
+
+def latest_sequence(table=None, conn=None):
+    """Returns the newest change sequence number, for one table or overall (0 if none)."""
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    if table:
+        row = conn.execute("SELECT MAX(seq) FROM change_log WHERE table_name = ?", (table.lower(),)).fetchone()
+    else:
+        row = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()
+    if ownConnection:
+        conn.close()
+    return row[0] or 0
+
+def get_changes_since(seq, table=None, limit=10000, until=None, conn=None):
+    """
+    Returns up to limit changes with a sequence number above seq (and at most
+    until, if given), oldest first, as dicts with seq, table, op, key, old and
+    new (old/new are column dicts or None).
+    """
+    sql = "SELECT seq, table_name, op, row_key, old_values, new_values FROM change_log WHERE seq > ?"
+    params = (seq,)
+    if until is not None:
+        sql += " AND seq <= ?"
+        params += (until,)
+    if table:
+        sql += " AND table_name = ?"
+        params += (table.lower(),)
+    sql += " ORDER BY seq LIMIT ?"
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    rows = conn.execute(sql, params + (limit,)).fetchall()
+    if ownConnection:
+        conn.close()
+    return [{"seq": s, "table": t, "op": op, "key": key,
+             "old": json.loads(old) if old else None,
+             "new": json.loads(new) if new else None}
+            for s, t, op, key, old, new in rows]
+
+def sequence_range(conn=None):
+    """
+    Returns (oldest, newest) sequence numbers still in the log, or (None, None).
+    A reader whose position is below oldest - 1 has missed pruned changes and must reload.
+    """
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    row = conn.execute("SELECT MIN(seq), MAX(seq) FROM change_log").fetchone()
+    if ownConnection:
+        conn.close()
+    return row
+
+def prune_changes(keep_after_seq):
+    """
+    Deletes changes up to and including keep_after_seq, always keeping the
+    newest one per table so readers can still tell how far the log was
+    pruned and latest_sequence(table) does not move back.
+    Returns the number of rows removed.
+    """
+    conn = connect_database()
+    cursor = conn.execute("""
+        DELETE FROM change_log
+        WHERE seq <= ? AND seq NOT IN (SELECT MAX(seq) FROM change_log GROUP BY table_name)
+    """, (keep_after_seq,))
+    conn.commit()
+    conn.close()
+    return cursor.rowcount
+
+def prune_consumed(keep=KEEP_CHANGES):
+    """
+    Prunes the changes every registered reader has applied, keeping at
+    least the newest keep. Returns the number of rows removed.
+    """
+    oldest, newest = sequence_range()
+    if newest is None:
+        return 0
+    horizon = newest - keep
+    with _readersLock:
+        positions = [reader.seq for reader in _readers if reader._loaded]
+    if positions:
+        horizon = min(horizon, min(positions))
+    if oldest is None or horizon < oldest:
+        return 0
+    return prune_changes(horizon)
@@ -0,0 +1,386 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from app.data.arrow_results import TABLE_KINDS, iter_batches
+from app.data.changes import latest_sequence
+from app.data.repository import PERIOD_FORMATS, REPOSITORIES
+
+try:
+    import duckdb
+except ImportError:  # duckdb is optional, pyarrow compute runs the aggregates instead
+    duckdb = None
+
+# Where the Parquet snapshots live, one directory per table partitioned by month
+COLUMNAR_DIR = Path(os.environ.get("COLUMNAR_DIR", str(Path("DATA") / "columnar")))
+
+# The background exporter only runs when COLUMNAR_SNAPSHOTS=1; a snapshot
+# exported by hand (python -m app.data.columnar export) is used either way
+COLUMNAR_ENABLED = os.environ.get("COLUMNAR_SNAPSHOTS") == "1"
+EXPORT_INTERVAL = 60
+
+# Date column each table is partitioned on
+PARTITION_COLUMNS = {table: repo.date_column for table, repo in REPOSITORIES.items()}
+
+MANIFEST = "_snapshot.json"
+
+logger = logging.getLogger(__name__)
+
+
+def _months(batch: pa.RecordBatch, dateColumn: str) -> pa.Array:
+    """YYYY-MM of the table's date column, "unknown" where it is missing."""
+    dates = batch.column(dateColumn)
+    if pa.types.is_date(dates.type):
+        dates = dates.cast(pa.timestamp("s"))
+    return pc.fill_null(pc.strftime(dates, format="%Y-%m"), "unknown")
+
+
+def export_snapshot(table: str, directory: Path = COLUMNAR_DIR, conn=None) -> dict:
+    """
+    Writes the table's typed columns to Parquet, one file per month under
+    month=YYYY-MM/, streaming rows in date order so only one month's writer
+    is open at a time. The new snapshot replaces the old one with a rename
+    and records the changelog position it was taken at.
+    """
+    # 1. Read the position first, so changes made while exporting make it stale
+    seq = latest_sequence(table, conn)
+    dateColumn = PARTITION_COLUMNS[table]
+    sql = "SELECT {} FROM {} ORDER BY {}".format(", ".join(TABLE_KINDS[table]), table, dateColumn)
+
+    # 2. Write into a scratch directory
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / table
+    building = directory / (table + ".building")
+    shutil.rmtree(building, ignore_errors=True)
+    building.mkdir()
+    rows = files = 0
+    writer, current = None, None
+    try:
+        for batch in iter_batches(sql, table=table, conn=conn):
+            months = _months(batch, dateColumn)
+            for month in pc.unique(months).to_pylist():
+                part = batch.filter(pc.equal(months, month))
+                if month != current:
+                    if writer is not None:
+                        writer.close()
+                    (building / "month={}".format(month)).mkdir()
+                    writer = pq.ParquetWriter(building / "month={}".format(month) / "part-0.parquet",
+                                              _plain_schema(part.schema))
+                    current = month
+                    files += 1
+                # Dictionaries differ between batches; Parquet dictionary-encodes the strings itself
+                writer.write_table(pa.Table.from_batches([part]).combine_chunks().cast(_plain_schema(part.schema)))
+                rows += part.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+    # 3. Swap it in
+    manifest = {"table": table, "rows": rows, "files": files, "seq": seq, "built_at": time.time()}
+    (building / MANIFEST).write_text(json.dumps(manifest))
+    old = directory / (table + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if target.exists():
+        target.rename(old)
+    building.rename(target)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+class ColumnarEngine:
+    """
+    Runs the repository's aggregate queries over a table's Parquet snapshot,
+    with DuckDB when it is installed and pyarrow compute otherwise. Results
+    have the same shape as the SQLite queries they replace.
+    """
+
+    def __init__(self, directory: Path = COLUMNAR_DIR):
+        self.directory = directory
+        self.backend = "duckdb" if duckdb is not None else "pyarrow"
+        self._datasets: Dict[str, tuple] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def manifest(self, table: str) -> Optional[dict]:
+        """The snapshot's manifest, or None if there is no snapshot."""
+        try:
+            return json.loads((self.directory / table / MANIFEST).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, table: str, conn=None) -> bool:
+        """True when the snapshot was taken at the table's current changelog position."""
+        manifest = self.manifest(table)
+        return manifest is not None and manifest["seq"] == latest_sequence(table, conn)
+
+    def _dataset(self, table: str) -> ds.Dataset:
+        """The table's dataset, opened again only after a new export."""
+        built = (self.manifest(table) or {}).get("built_at")
+        with self._lock:
+            cached = self._datasets.get(table)
+            if cached is None or cached[0] != built:
+                partitioning = ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+                cached = self._datasets[table] = (built, ds.dataset(self.directory / table, format="parquet",
+                                                                      partitioning=partitioning))
+            return cached[1]
+
+    # --- Query building -----------------------------------------------------
+
+    def _filter(self, table: str, filters=None, start=None, end=None):
+        """Equality filters plus [start, end) on the date column; bounds also prune months."""
+        dateColumn = PARTITION_COLUMNS[table]
+        kind = TABLE_KINDS[table][dateColumn]
+        dateType = pa.date32() if kind == "date" else pa.timestamp("s")
+        expression = None
+        parts = [ds.field(c) == v for c, v in (filters or {}).items()]
+        if start:
+            parts += [ds.field(dateColumn) >= pa.scalar(start).cast(dateType), ds.field("month") >= start[:7]]
+        if end:
+            parts += [ds.field(dateColumn) < pa.scalar(end).cast(dateType), ds.field("month") <= end[:7]]
+        for part in parts:
+            expression = part if expression is None else expression & part
+        return expression
+
+    def _duck_where(self, table: str, filters=None, start=None, end=None):
+        dateColumn = PARTITION_COLUMNS[table]
+        conditions, params = [], []
+        for column, value in (filters or {}).items():
+            conditions.append("{} = ?".format(column))
+            params.append(value)
+        if start:
+            conditions += ["{} >= CAST(? AS {})".format(dateColumn, _duck_type(table)), "month >= ?"]
+            params += [start, start[:7]]
+        if end:
+            conditions += ["{} < CAST(? AS {})".format(dateColumn, _duck_type(table)), "month <= ?"]
+            params += [end, end[:7]]
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def _duck(self, table: str, sql: str, params: List) -> list:
+        """Runs sql with {t} standing for the table's Parquet files, on a per-thread DuckDB connection."""
+        if not hasattr(self._local, "duck"):
+            self._local.duck = duckdb.connect()
+        source = "read_parquet('{}', hive_partitioning = true)".format(
+            (self.directory / table / "**" / "*.parquet").as_posix())
+        rows = self._local.duck.execute(sql.format(t=source), params).fetchall()
+        return [tuple(_iso(v) for v in row) for row in rows]
+
+    # --- Aggregates ---------------------------------------------------------
+
+    def count_by(self, table, column, filters=None, limit=None, start=None, end=None):
+        if self.backend == "duckdb":
+            where, params = self._duck_where(table, filters, start, end)
+            return self._duck(table, "SELECT {0}, COUNT(*) AS n FROM {{t}}{1} GROUP BY {0} ORDER BY n DESC LIMIT ?"
+                              .format(column, where), params + [int(limit) if limit else -1])
+        data = self._dataset(table).to_table(columns=[column], filter=self._filter(table, filters, start, end))
+        counts = data.group_by(column).aggregate([([], "count_all")]).sort_by([("count_all", "descending")])
+        rows = list(zip(_plain(counts.column(column)), counts.column("count_all").to_pylist()))
+        return rows[:int(limit)] if limit else rows
+
+    def count_between(self, table, start=None, end=None, filters=None) -> int:
+        if self.backend == "duckdb":
+            where, params = self._duck_where(table, filters, start, end)
+            return self._duck(table, "SELECT COUNT(*) FROM {t}" + where, params)[0][0]
+        return self._dataset(table).count_rows(filter=self._filter(table, filters, start, end))
+
+    def count_by_period(self, table, period, filters=None, start=None, end=None):
+        dateColumn = PARTITION_COLUMNS[table]
+        if self.backend == "duckdb":
+            where, params = self._duck_where(table, filters, start, end)
+            return self._duck(table, "SELECT strftime({0}, '{1}') AS period, COUNT(*) FROM {{t}}{2} "
+                              "GROUP BY period ORDER BY period NULLS FIRST".format(dateColumn, PERIOD_FORMATS[period],
+                                                                                  where), params)
+        data = self._dataset(table).to_table(columns=[dateColumn, "month"],
+                                             filter=self._filter(table, filters, start, end))
+        if period == "month":
+            periods = pc.if_else(pc.equal(data.column("month"), "unknown"), None, data.column("month"))
+        else:
+            dates = data.column(dateColumn)
+            if pa.types.is_date(dates.type):
+                dates = dates.cast(pa.timestamp("s"))
+            periods = pc.strftime(dates, format=PERIOD_FORMATS[period])
+        counts = pa.table({"period": periods}).group_by("period").aggregate([([], "count_all")])
+        counts = counts.sort_by([("period", "ascending")])
+        rows = list(zip(counts.column("period").to_pylist(), counts.column("count_all").to_pylist()))
+        # SQLite sorts NULL first
+        return sorted(rows, key=lambda row: (row[0] is not None, row[0] or ""))
+
+    def group_counts(self, table, column):
+        """(value, count) per value of any column, in value order like SQLite's GROUP BY."""
+        if self.backend == "duckdb":
+            return self._duck(table, "SELECT {0}, COUNT(*) FROM {{t}} GROUP BY {0} ORDER BY {0} NULLS FIRST"
+                              .format(column), [])
+        data = self._dataset(table).to_table(columns=[column])
+        counts = data.group_by(column).aggregate([([], "count_all")])
+        rows = list(zip(_plain(counts.column(column)), counts.column("count_all").to_pylist()))
+        return sorted(rows, key=lambda row: (row[0] is not None, row[0] if row[0] is not None else ""))
+
+
+def _duck_type(table: str) -> str:
+    return "DATE" if TABLE_KINDS[table][PARTITION_COLUMNS[table]] == "date" else "TIMESTAMP"
+
+
+def _plain_schema(schema: pa.Schema) -> pa.Schema:
+    """The schema with dictionary columns as their value type."""
+    return pa.schema([pa.field(f.name, f.type.value_type if pa.types.is_dictionary(f.type) else f.type)
+                      for f in schema])
+
+
+def _iso(value):
+    """Dates and times back to the ISO text SQLite stores."""
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _plain(column) -> list:
+    """Python values as SQLite would return them: dates and times back to ISO text."""
+    return [_iso(v) for v in column.to_pylist()]
+
+
+_engine: Optional[ColumnarEngine] = None
+
+
+def get_columnar_engine() -> ColumnarEngine:
+    """The process-wide engine over COLUMNAR_DIR."""
+    global _engine
+    if _engine is None:
+        _engine = ColumnarEngine()
+    return _engine
+
+
+def fresh_engine(table: str) -> Optional[ColumnarEngine]:
+    """The engine if the table has an up to date snapshot, else None (use SQLite)."""
+    if table not in PARTITION_COLUMNS:
+        return None
+    engine = get_columnar_engine()
+    try:
+        return engine if engine.is_fresh(table) else None
+    except Exception:  # e.g. no changelog yet
+        return None
+
+
+class ColumnarExporter(threading.Thread):
+    """
+    Daemon thread that re-exports a table's snapshot once its changelog
+    position has moved on, checking every interval seconds.
+    """
+
+    def __init__(self, interval: float = EXPORT_INTERVAL, directory: Path = COLUMNAR_DIR):
+        super().__init__(name="columnar-exporter", daemon=True)
+        self.interval = interval
+        self.directory = directory
+        self.exports = 0
+        self._halt = threading.Event()
+
+    def run_once(self) -> int:
+        """Exports the stale tables. Returns how many were exported."""
+        engine = ColumnarEngine(self.directory)
+        exported = 0
+        for table in PARTITION_COLUMNS:
+            if not engine.is_fresh(table):
+                export_snapshot(table, self.directory)
+                exported += 1
+        self.exports += exported
+        return exported
+
+    def run(self) -> None:
+        while not self._halt.is_set():
+            try:
+                self.run_once()
+            except Exception:  # keep the exporter alive, e.g. while the DB is locked
+                logger.exception("Columnar exporter run failed")
+            self._halt.wait(self.interval)
+
+    def stop(self) -> None:
+        self._halt.set()
+
+
+_exporter: Optional[ColumnarExporter] = None
+_exporterLock = threading.Lock()
+
+
+def start_columnar_exporter(interval: float = EXPORT_INTERVAL) -> Optional[ColumnarExporter]:
+    """Starts the process-wide exporter once if COLUMNAR_SNAPSHOTS=1, else returns None."""
+    global _exporter
+    if not COLUMNAR_ENABLED:
+        return None
+    with _exporterLock:
+        if _exporter is None or not _exporter.is_alive():
+            _exporter = ColumnarExporter(interval)
+            _exporter.start()
+        return _exporter
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Parquet snapshots of the domain tables for aggregate queries.")
+    parser.add_argument("command", choices=["export", "benchmark"])
+    args = parser.parse_args()
+
+    if args.command == "export":
+        for table in PARTITION_COLUMNS:
+            print(export_snapshot(table))
+    else:
+        import sqlite3
+        import tempfile
+
+        import numpy as np
+
+        INCIDENTS = REPOSITORIES["cyber_incidents"]
+
+        # 5M synthetic incidents in a scratch database
+        rng = np.random.default_rng(0)
+        n = 5000000
+        scratch = Path(tempfile.mkdtemp())
+        conn = sqlite3.connect(str(scratch / "bench.db"))
+        conn.execute("CREATE TABLE cyber_incidents (id INTEGER PRIMARY KEY, date DATE, incident_type TEXT, "
+                     "severity TEXT, status TEXT, created_at TIMESTAMP, risk_score REAL)")
+        conn.execute("CREATE TABLE change_log (seq INTEGER PRIMARY KEY, table_name TEXT)")
+        days = (np.datetime64("2018-01-01") + rng.integers(0, 2800, n)).astype(str)
+        conn.executemany("INSERT INTO cyber_incidents VALUES (?, ?, ?, ?, ?, NULL, NULL)", zip(
+            range(n), days, np.array(["Phishing", "Malware", "DDoS", "Data Leak", "Ransomware"])[rng.integers(0, 5, n)],
+            np.array(["Low", "Medium", "High", "Critical"])[rng.integers(0, 4, n)],
+            np.array(["Open", "Closed", "Resolved", "Under Investigation"])[rng.integers(0, 4, n)]))
+        conn.commit()
+
+        start = time.perf_counter()
+        export_snapshot("cyber_incidents", scratch, conn)
+        print("export: {:.1f} s".format(time.perf_counter() - start))
+
+        engine = ColumnarEngine(scratch)
+        queries = [("count_by severity", lambda e: e("severity")),
+                   ("count_by type, Open, 2023", lambda e: e("incident_type", {"status": "Open"}, None,
+                                                              "2023-01-01", "2024-01-01"))]
+        for name, query in queries:
+            start = time.perf_counter()
+            expected = query(lambda *a: INCIDENTS.count_by(*a, conn=conn))
+            sqliteTime = time.perf_counter() - start
+            start = time.perf_counter()
+            got = query(lambda *a: engine.count_by("cyber_incidents", *a))
+            columnarTime = time.perf_counter() - start
+            assert sorted(got) == sorted(expected), name
+            print("{}: SQLite {:.2f} s, {} {:.2f} s".format(name, sqliteTime, engine.backend, columnarTime))
+        for name, fn in (("count_by_period month", lambda c: INCIDENTS.count_by_period("month", conn=c)),):
+            start = time.perf_counter()
+            expected = fn(conn)
+            sqliteTime = time.perf_counter() - start
+            start = time.perf_counter()
+            got = engine.count_by_period("cyber_incidents", "month")
+            columnarTime = time.perf_counter() - start
+            assert got == expected, name
+            print("{}: SQLite {:.2f} s, {} {:.2f} s".format(name, sqliteTime, engine.backend, columnarTime))
+        conn.close()
@@ -0,0 +1,294 @@
+import csv
+import hashlib
+import io
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+from app.data.db import connect_database, notify_change
+from app.data.repository import get_repository
+from app.data.retention import RETENTION_POLICIES
+from app.data.status_history import record_transition
+
+BLOCK_BYTES = 1024 * 1024
+BATCH_ROWS = 5000
+
+_dayFirst = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})$")
+
+def _iso_date(value):
+    """Converts dd/mm/yyyy dates from the exports to the ISO dates stored in the DB."""
+    match = _dayFirst.match(value.strip())
+    if match:
+        day, month, year = match.groups()
+        return "{}-{:02d}-{:02d}".format(year, int(month), int(day))
+    return value
+
+# source name -> how a CSV export maps onto its table
+SOURCES = {
+    "cyber_incidents": {
+        "path": Path("DATA/cyber_incidents.csv"),
+        "table": "cyber_incidents",
+        "columns": ("id", "date", "incident_type", "severity", "status"),
+        "key": ("id",),
+        "watermark": "id",
+        "order": int,
+        "convert": lambda row: (int(row[0]), _iso_date(row[1]), row[2], row[3], row[4]),
+    },
+    "it_tickets": {
+        "path": Path("DATA/it_tickets.csv"),
+        "table": "IT_Tickets",
+        "columns": ("ticket_id", "subject", "priority", "status", "created_date", "created_at"),
+        "key": ("ticket_id",),
+        "watermark": "created_at",
+        "order": str,
+        "convert": lambda row: tuple(row[:6]),
+    },
+    "datasets_metadata": {
+        "path": Path("DATA/datasets_metadata.csv"),
+        "table": "Datasets_Metadata",
+        "columns": ("dataset_name", "category", "file_size_mb", "created_at"),
+        "key": ("dataset_name", "created_at"),
+        "watermark": "created_at",
+        "order": str,
+        "convert": lambda row: (row[0], row[1], float(row[2]), row[3]),
+    },
+}
+
+def _upsert_sql(source):
+    """
+    INSERT for rows not in the table yet. A key repeated within the file
+    updates the row instead, but only when a value actually changed.
+    """
+    columns = source["columns"]
+    others = [c for c in columns if c not in source["key"]]
+    return """
+        INSERT INTO {table} ({columns}) VALUES ({marks})
+        ON CONFLICT ({key}) DO UPDATE SET {updates}
+        WHERE {changed}
+    """.format(
+        table=source["table"],
+        columns=", ".join(columns),
+        marks=", ".join("?" * len(columns)),
+        key=", ".join(source["key"]),
+        updates=", ".join("{0} = excluded.{0}".format(c) for c in others),
+        changed=" OR ".join("{0} IS NOT excluded.{0}".format(c) for c in others),
+    )
+
+def _update_sql(source):
+    """UPDATE of every non-key column of the row with the given key."""
+    others = [c for c in source["columns"] if c not in source["key"]]
+    return "UPDATE {} SET {} WHERE {}".format(
+        source["table"], ", ".join("{} = ?".format(c) for c in others),
+        " AND ".join("{} = ?".format(k) for k in source["key"]))
+
+def _prefix_hash(path, offset):
+    """
+    Hasher fed with the first offset bytes of the file. Its digest is stored
+    after a sync; if it no longer matches, the synced part was rewritten.
+    """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = offset
+        while remaining > 0:
+            block = f.read(min(BLOCK_BYTES, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+def _read_lines(path, offset, hasher):
+    """
+    Yields complete lines from offset onwards, a block at a time, feeding the
+    bytes consumed to hasher. A trailing line without a newline (still being
+    written) is left for next time. The final byte offset reached is stored
+    in the returned list's single item.
+    """
+    end = [offset]
+
+    def lines():
+        with open(path, "rb") as f:
+            f.seek(offset)
+            carry = b""
+            while True:
+                block = f.read(BLOCK_BYTES)
+                if not block:
+                    break
+                block = carry + block
+                cut = block.rfind(b"\n") + 1
+                carry = block[cut:]
+                if cut:
+                    end[0] += cut
+                    hasher.update(block[:cut])
+                    yield from io.StringIO(block[:cut].decode("utf-8"), newline="")
+    return lines(), end
+
+def _split_batch(conn, source, batch):
+    """
+    Splits parsed rows into (new rows, changed rows as UPDATE parameters,
+    number of archived rows, status changes as (key, old, new)) by looking
+    their keys up first. Unchanged rows are dropped, so a re-read costs no
+    write and no AUTOINCREMENT id; rows the retention job has archived are
+    dropped too rather than brought back.
+    """
+    columns = source["columns"]
+    repository = get_repository(source["table"])
+    statusIndex = columns.index("status") if repository.entity else None
+    keyIndex = [columns.index(k) for k in source["key"]]
+    otherIndex = [i for i in range(len(columns)) if i not in keyIndex]
+    keys = list({tuple(values[i] for i in keyIndex) for values in batch})
+    stored = {}
+    step = max(1, 500 // len(keyIndex))
+    for start in range(0, len(keys), step):
+        chunk = keys[start:start + step]
+        sql = "SELECT {} FROM {} WHERE ({}) IN (VALUES {})".format(
+            ", ".join(columns), source["table"], ", ".join(source["key"]),
+            ", ".join("({})".format(", ".join("?" * len(keyIndex))) for _ in chunk))
+        for row in conn.execute(sql, [v for key in chunk for v in key]):
+            stored[tuple(row[i] for i in keyIndex)] = tuple(row)
+    archived = set()
+    if source["table"].lower() in RETENTION_POLICIES:
+        missing = [key[0] for key in keys if key not in stored]
+        archived = {(key,) for key in repository.existing_keys(missing, conn)}
+    new, changed, transitions = [], [], []
+    statuses = {}
+    skipped = 0
+    for values in batch:
+        key = tuple(values[i] for i in keyIndex)
+        current = stored.get(key)
+        if key in archived:
+            skipped += 1
+            continue
+        if current is None:
+            new.append(values)
+        elif current != tuple(values):
+            changed.append(tuple(values[i] for i in otherIndex) + tuple(values[i] for i in keyIndex))
+        if statusIndex is not None:
+            # A key repeated within the batch changes from its previous row's status
+            old = statuses[key] if key in statuses else (current[statusIndex] if current else None)
+            statuses[key] = values[statusIndex]
+            if old != values[statusIndex]:
+                transitions.append((key[0], old, values[statusIndex]))
+    return new, changed, skipped, transitions
+
+def _load_state(conn, name):
+    return conn.execute(
+        "SELECT size, mtime, byte_offset, tail_hash, high_water FROM csv_sync_state WHERE source = ?",
+        (name,)).fetchone()
+
+def sync_source(name, path=None):
+    """
+    Brings one table up to date with its CSV export and returns a dict of counts.
+
+    Unchanged files (same size and mtime) are skipped. Files that only grew
+    (the synced prefix hashes the same) are read from the last synced byte
+    offset, skipping rows below the high-water mark that an export repeated.
+    Rewritten files are streamed in full; only new and changed rows are written,
+    and rows already moved to an archive table are left there.
+    """
+    source = SOURCES[name]
+    path = Path(path or source["path"])
+    stat = os.stat(path)
+
+    conn = connect_database()
+    state = _load_state(conn, name)
+
+    # 1. Work out where to start reading
+    if state and state[0] == stat.st_size and state[1] == stat.st_mtime:
+        conn.close()
+        return {"source": name, "mode": "unchanged", "rows_read": 0, "rows_written": 0}
+    hasher = None
+    if state is not None and stat.st_size >= state[2]:
+        hasher = _prefix_hash(path, state[2])
+    appendOnly = hasher is not None and hasher.hexdigest() == state[3]
+    offset = state[2] if appendOnly else 0
+    if not appendOnly:
+        hasher = hashlib.sha256()
+    order = source["order"]
+    highWater = order(state[4]) if appendOnly and state[4] is not None else None
+    floor = highWater
+
+    # 2. Stream rows and apply them in batches inside one transaction
+    lines, end = _read_lines(path, offset, hasher)
+    reader = csv.reader(lines)
+    if offset == 0:
+        next(reader, None)  # Header row
+
+    insertSql, updateSql = _upsert_sql(source), _update_sql(source)
+    entity = get_repository(source["table"]).entity
+    watermarkIndex = source["columns"].index(source["watermark"])
+    rowsRead = rowsWritten = rowsSkipped = rowsArchived = 0
+    batch = []
+    cursor = conn.cursor()
+
+    def apply(batch):
+        nonlocal rowsArchived
+        new, changed, archived, transitions = _split_batch(conn, source, batch)
+        rowsArchived += archived
+        cursor.executemany(insertSql, new)
+        written = cursor.rowcount if new else 0
+        cursor.executemany(updateSql, changed)
+        written += cursor.rowcount if changed else 0
+        # Status changes go to the history in the same transaction, as for edits made in the app
+        for key, old, status in transitions:
+            record_transition(cursor, entity, key, old, status)
+        return written
+
+    for row in reader:
+        if not row:
+            continue
+        values = source["convert"](row)
+        mark = order(values[watermarkIndex])
+        rowsRead += 1
+        # Appended rows older than everything synced are repeats (exports append in watermark order)
+        if floor is not None and mark < floor:
+            rowsSkipped += 1
+            continue
+        batch.append(values)
+        if highWater is None or mark > highWater:
+            highWater = mark
+        if len(batch) >= BATCH_ROWS:
+            rowsWritten += apply(batch)
+            batch = []
+    if batch:
+        rowsWritten += apply(batch)
+
+    # 3. Record the new fingerprint and high-water mark in the same transaction
+    cursor.execute("""
+        INSERT OR REPLACE INTO csv_sync_state
+        (source, size, mtime, byte_offset, tail_hash, high_water, synced_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (name, stat.st_size, stat.st_mtime, end[0], hasher.hexdigest(),
+          None if highWater is None else str(highWater), datetime.now().isoformat(" ", "seconds")))
+    conn.commit()
+    conn.close()
+
+    if rowsWritten:
+        notify_change(source["table"], "load")
+    return {"source": name, "mode": "append" if appendOnly else "full",
+            "rows_read": rowsRead, "rows_written": rowsWritten, "rows_skipped": rowsSkipped,
+            "rows_archived": rowsArchived, "high_water": highWater}
+
+def sync_all():
+    """Runs sync_source for every configured export and returns the results."""
+    return [sync_source(name) for name in SOURCES]
+
+def reset_sync_state(name=None):
+    """Forgets the stored fingerprint(s) so the next sync re-reads the whole file."""
+    conn = connect_database()
+    if name:
+        conn.execute("DELETE FROM csv_sync_state WHERE source = ?", (name,))
+    else:
+        conn.execute("DELETE FROM csv_sync_state")
+    conn.commit()
+    conn.close()
+
+if __name__ == "__main__":
+    import time
+    for name in SOURCES:
+        start = time.perf_counter()
+        result = sync_source(name)
+        print("{:<18} {:<9} read {:>7} written {:>7} high water {} ({:.1f} ms)".format(
+            name, result["mode"], result["rows_read"], result["rows_written"],
+            result.get("high_water"), (time.perf_counter() - start) * 1000))
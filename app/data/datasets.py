@@ -1,159 +1,117 @@
-import csv
-from pathlib import Path
-import pandas as pd 
 from app.data.db import connect_database
+from app.data.repository import DATASETS, PERIOD_FORMATS
+
+# Columns that aggregate queries may group or filter on
+METADATA_COLUMNS = DATASETS.group_columns
 
 def insert_metadata(dataset_name, category, file_size_mb):
     """
-    Adds a new dataset metadata record to the database.
+    Adds a new dataset metadata record to the database and returns its ID.
     """
-    # 1. Connect to the DB
-    db = connect_database()
-    cursor = db.cursor()
-
-    # 2. Run the SQL Command
-    sql = """
-        INSERT INTO Datasets_Metadata 
-        (dataset_name, category, file_size_mb)
-        VALUES (?, ?, ?)
-    """
-    values = (dataset_name, category, file_size_mb)
-    
-    cursor.execute(sql, values)
-    db.commit()
-    db.close()
+    return DATASETS.insert((dataset_name, category, file_size_mb))
 
 def update_metadata(id, dataset_name, category, file_size_mb):
     """
     Updates an existing dataset metadata record in the database.
     Returns True if successful, False otherwise.
     """
-    # 1. Connect to the DB
-    db = connect_database()
-    cursor = db.cursor()
-
-    # 2. Run the SQL Command
-    sql = """
-        UPDATE Datasets_Metadata
-        SET dataset_name = ?, category = ?, file_size_mb = ?
-        WHERE id = ?
-    """
-    values = (dataset_name, category, file_size_mb, id)
-    
-    cursor.execute(sql, values)
-    db.commit()
-
-    # 3. Check if any row was updated
-    success = cursor.rowcount > 0
-    
-    db.close()
-    return success
+    return DATASETS.update(id, (dataset_name, category, file_size_mb))
 
 def delete_metadata(id):
     """
     Deletes a dataset metadata record from the database by its ID.
     Returns True if successful, False otherwise.
     """
-    # 1. Connect to the DB
-    db = connect_database()
-    cursor = db.cursor()
-
-    # 2. Run the SQL Command
-    sql = "DELETE FROM Datasets_Metadata WHERE id = ?"
-    cursor.execute(sql, (id,))
-    db.commit()
-
-    # 3. Check if any row was deleted
-    success = cursor.rowcount > 0
-    
-    db.close()
-    return success
+    return DATASETS.delete(id)
 
 def drop_datasets_metadata_table():
     """
     Drops the Datasets_Metadata table from the database.
     """
-    db = connect_database()
-    cursor = db.cursor()
-    cursor.execute("DROP TABLE IF EXISTS Datasets_Metadata")
-    db.commit()
-    db.close()
+    DATASETS.drop()
 
 def get_groupby(column):
     """
-    Retrieves distinct values for a specified column from the Datasets_Metadata table.
-    Returns a list of distinct values.
+    Retrieves distinct values for a specified column from the Datasets_Metadata table,
+    with a count column per value.
     """
-    db= connect_database()
-    sql_command = f"SELECT {column}, COUNT(*) as count FROM Datasets_Metadata GROUP BY {column}"
-    df = pd.read_sql_query(sql_command, db)
-    db.close()
-    return df
+    return DATASETS.group_counts(column).rename(columns={"COUNT(*)": "count"})
 
 def get_all_metadata(filter_str,column):
     """
-    Retrieves ticket records from the database and returns them as a DataFrame.
+    Counts datasets per value of a column and returns them as a DataFrame.
     Applies the provided SQL filter string to refine the results.
     """
-    db=connect_database()
-    sql_command =f"SELECT {column},COUNT(*) FROM Datasets_Metadata GROUP BY {column}"
-    df = pd.read_sql_query(sql_command, db)
-    db.close()
-    return df
+    return DATASETS.group_counts(column, filter_str)
 
 def get_metadata_dataframe(filter_str):
     """
     Retrieves dataset metadata records from the database and returns them as a DataFrame.
     Applies the provided SQL filter string to refine the results.
     """
-    db = connect_database()
-    sql_command = "SELECT * FROM Datasets_Metadata"
-    df= pd.read_sql_query(sql_command, db)
-    db.close()
-    return df
+    return DATASETS.frame(filter_str)
 
 def get_metadataquery(filter_str,column):
     """
-    Constructs the SQL query string for retrieving tickets with an optional filter.
+    Constructs the SQL query string for counting datasets per value of a column
+    with an optional filter.
     """
-    query = f"SELECT {column},COUNT(*) FROM Datasets_Metadata GROUP BY {column}"
-    if filter_str:
-        query += f" WHERE {filter_str}"
-    return query
+    return DATASETS.select_sql(column, filter_str, grouped=True)
 
 def total_metadata(filter_str):
     """
-    Executes the query with the optional filter and returns the total count of matches
-    in the it_tickets table.
+    Returns the total count of datasets matching the optional filter.
     """
-    conn= connect_database()
-    sqlcmd = get_all_metadata(filter_str)
-    df_results = pd.read_sql_query(sqlcmd, conn)
-    conn.close()
-    return len(df_results)
+    return DATASETS.total(filter_str)
 
-def transfer_csv():
-    import csv
-    from pathlib import Path
-    
-    conn = connect_database()
-    cursor = conn.cursor()
-    
-    # Updated to read from the correct file 'datasets_metadata.csv'
-    # Note: Adjust the path "DATA/" if your file is in a specific folder
-    with open(Path("DATA/datasets_metadata.csv")) as csv_file:
-        reader = csv.reader(csv_file)
-                    
-        # Skip the header row
-        next(reader)
-        
-        for row in reader:
-            cursor.execute("""
-                INSERT INTO datasets_metadata 
-                (dataset_name, category, file_size_mb, created_at)
-                VALUES (?, ?, ?, ?)
-            """, (row[0], row[1], row[2], row[3]))
-            
-    conn.commit()
-    conn.close()
+def get_metadata_page(page, page_size=50, sort=None, descending=False, filters=None):
+    """
+    Returns one page of datasets, newest first unless a sort column is given.
+    """
+    return DATASETS.page(page, page_size, sort, descending, filters)
 
+def count_by(column, filters=None, limit=None, start=None, end=None):
+    """
+    Counts datasets per value of a column, largest group first.
+    start/end optionally bound the date column as in count_between.
+    Returns a list of (value, count) tuples.
+    """
+    return DATASETS.count_by(column, filters, limit, start, end)
+
+def count_between(start=None, end=None, filters=None):
+    """
+    Counts datasets whose created_at is in [start, end). Dates are ISO strings,
+    either bound may be None.
+    """
+    return DATASETS.count_between(start, end, filters)
+
+def count_by_period(period, filters=None, start=None, end=None):
+    """
+    Counts datasets per day, week or month of created_at, oldest first.
+    Returns a list of (period, count) tuples.
+    """
+    return DATASETS.count_by_period(period, filters, start, end)
+
+def latest_date():
+    """Returns the most recent created_at, or None if the table is empty."""
+    return DATASETS.latest_date()
+
+def size_by_category():
+    """
+    Returns (category, dataset count, total size in MB) per category, largest first.
+    """
+    db = connect_database()
+    rows = db.execute("""
+        SELECT category, COUNT(*), SUM(file_size_mb) FROM Datasets_Metadata
+        GROUP BY category ORDER BY SUM(file_size_mb) DESC
+    """).fetchall()
+    db.close()
+    return rows
+
+def transfer_csv():
+    """
+    Loads the CSV export into the table. Safe to re-run: only new or changed
+    rows are applied (see app.data.csv_sync).
+    """
+    from app.data.csv_sync import sync_source
+    return sync_source("datasets_metadata")
@@ -1,8 +1,39 @@
 import sqlite3
+import threading
 from pathlib import Path
 
 DB_PATH = Path("DATA") / "intelligence_platform.db"
 
+_versionLock = threading.Lock()
+_tableVersions = {}
+_changeListeners = []
+
 def connect_database(db_path=DB_PATH):
     """Connect to SQLite database."""
-    return sqlite3.connect(str(db_path))
\ No newline at end of file
+    return sqlite3.connect(str(db_path))
+
+def notify_change(table, action=None, key=None):
+    """
+    Records that a table was written to by this process.
+    Bumps the table's data version and tells any registered listeners.
+    """
+    table = table.lower()
+    with _versionLock:
+        _tableVersions[table] = _tableVersions.get(table, 0) + 1
+        listeners = list(_changeListeners)
+    for listener in listeners:
+        listener(table, action, key)
+
+def get_data_version(*tables):
+    """
+    Returns a tuple that changes whenever one of the tables is written to.
+    Use it as part of a cache key.
+    """
+    with _versionLock:
+        return tuple(_tableVersions.get(t.lower(), 0) for t in tables)
+
+def add_change_listener(listener):
+    """Registers listener(table, action, key) to be called after each write."""
+    with _versionLock:
+        if listener not in _changeListeners:
+            _changeListeners.append(listener)
@@ -1,25 +1,13 @@
-import pandas as pd
-from app.data.db import connect_database
+from app.data.repository import INCIDENTS, PERIOD_FORMATS
+
+# Columns that aggregate queries may group or filter on
+INCIDENT_COLUMNS = INCIDENTS.group_columns
 
 def insert_incident(id, date, incident_type, severity, status):
     """
     Adds a new incident record to the database and returns the new ID.
     """
-    # 1. Connect to the DB
-    db = connect_database()
-    cursor = db.cursor()
-
-    # 2. Run the SQL Command
-    sql = """
-        INSERT INTO cyber_incidents 
-        (id, date, incident_type, severity, status)
-        VALUES (?, ?, ?, ?, ?)
-    """
-    values = (id, date, incident_type, severity, status)
-    
-    cursor.execute(sql, values)
-    db.commit()
-    db.close()
+    return INCIDENTS.insert((id, date, incident_type, severity, status))
 
 
 def update_incident(id, date, incident_type, severity, status):
@@ -27,102 +15,34 @@ def update_incident(id, date, incident_type, severity, status):
     Updates an existing incident record in the database.
     Returns True if successful, False otherwise.
     """
-    # 1. Connect to the DB
-    db = connect_database()
-    cursor = db.cursor()
-
-    # 2. Run the SQL Command
-    sql = """
-        UPDATE cyber_incidents
-        SET date = ?, incident_type = ?, severity = ?, status = ?
-        WHERE id = ?
-    """
-    values = (date, incident_type, severity, status, id)
-    
-    cursor.execute(sql, values)
-    db.commit()
-
-    # 3. Check if any row was updated
-    success = cursor.rowcount > 0
-    
-    db.close()
-    return success
+    return INCIDENTS.update(id, (date, incident_type, severity, status))
 
 def delete_incident(incident_id):
     """
     Deletes an incident record from the database by its ID.
     Returns True if successful, False otherwise.
     """
-    # 1. Connect to the DB
-    db = connect_database()
-    cursor = db.cursor()
-
-    # 2. Run the SQL Command
-    sql = "DELETE FROM cyber_incidents WHERE id = ?"
-    cursor.execute(sql, (incident_id,))
-    db.commit()
-
-    # 3. Check if any row was deleted
-    success = cursor.rowcount > 0
-    
-    db.close()
-    return success
+    return INCIDENTS.delete(incident_id)
 
 def get_groupby(column):
     """
     Retrieves distinct values for a specified column from the cyber_incidents table.
     """
-    # 1. Establish connection
-    db = connect_database()
-    
-    # 2. Generate the full SQL command
-    sql_command = f"SELECT {column},COUNT(*) FROM cyber_incidents GROUP BY {column}"
-    
-    # 3. Execute query and load directly into a Pandas DataFrame
-    results_df = pd.read_sql_query(sql_command, db)
-    print(results_df)
-    
-    # 4. Close connection and return data
-    db.close()
-    return results_df
+    return INCIDENTS.group_counts(column)
 
 
 def get_all_incidents(filter_str,column):
     """
-    Retrieves distinct values for a specified column from the cyber_incidents table.
+    Retrieves distinct values for a specified column from the cyber_incidents table,
+    counting only rows that match the optional SQL filter string.
     """
-    # 1. Establish connection
-    db = connect_database()
-    
-    # 2. Generate the full SQL command
-    sql_command = f"SELECT {column},COUNT(*) FROM cyber_incidents GROUP BY {column}"
-    
-    # 3. Execute query and load directly into a Pandas DataFrame
-    results_df = pd.read_sql_query(sql_command, db)
-    print(results_df)
-    
-    # 4. Close connection and return data
-    db.close()
-    return results_df
+    return INCIDENTS.group_counts(column, filter_str)
 
 def get_dataframequery(filter_str):
     """
     Returns the DataFrame
     """
-    # 1. Establish connection
-    db = connect_database()
-    
-    # 2. Generate the full SQL command using the helper function
-    sql_command = 'Select * from cyber_incidents'
-    
-    # 3. Execute query and load directly into a Pandas DataFrame
-    results_df = pd.read_sql_query(sql_command, db)
-    print(results_df)
-    
-    # 4. Close connection and return data
-    db.close()
-    return results_df
-   
+    return INCIDENTS.frame(filter_str)
 
 
 def get_incidents_query(filter_str,column):
@@ -130,62 +50,71 @@ def get_incidents_query(filter_str,column):
     Builds the SQL query to select incident types.
     Appends a WHERE clause only if a filter string is provided.
     """
-    # 1. Define the base requirement
-    query = "SELECT "+column+" FROM cyber_incidents"
-    
-    # 2. Add the condition if it exists
-    if filter_str:
-        query += f" WHERE {filter_str}"
-    print('Filter string 1',filter_str)
-    
-    return query
+    return INCIDENTS.select_sql(column, filter_str)
 
 def droptable():
     """
     Drops the cyber_incidents table from the database.
     """
-    conn = connect_database()
-    cursor = conn.cursor()
-    cursor.execute("DROP TABLE cyber_incidents")
-    conn.commit()
-    conn.close()
+    INCIDENTS.drop()
 
 def total_incidents(filter_str: str) -> int:
     """
-    Executes the query with the optional filter and returns the total count of matches.
-    """
-    # 1. Open Connection
-    conn = connect_database()
-    
-    # 2. Get the SQL string
-    sql_cmd = get_incidents_query(filter_str)
-    
-    # 3. Load results into a DataFrame
-    df_results = pd.read_sql_query(sql_cmd, conn)
-    
-    conn.close()
-    
-    # 4. Return the number of rows found
-    return len(df_results)
+    Returns the total count of incidents matching the optional filter.
+    """
+    return INCIDENTS.total(filter_str)
+
+def get_incidents_page(page, page_size=50, sort=None, descending=False, filters=None):
+    """
+    Returns one page of incidents, newest first unless a sort column is given.
+    """
+    return INCIDENTS.page(page, page_size, sort, descending, filters)
+
+def count_by(column, filters=None, limit=None, start=None, end=None):
+    """
+    Counts incidents per value of a column, largest group first.
+    start/end optionally bound the date column as in count_between.
+    Returns a list of (value, count) tuples.
+    """
+    return INCIDENTS.count_by(column, filters, limit, start, end)
+
+def count_between(start=None, end=None, filters=None):
+    """
+    Counts incidents whose date is in [start, end). Dates are ISO strings,
+    either bound may be None.
+    """
+    return INCIDENTS.count_between(start, end, filters)
+
+def count_by_period(period, filters=None, start=None, end=None):
+    """
+    Counts incidents per day, week or month of date, oldest first.
+    Returns a list of (period, count) tuples.
+    """
+    return INCIDENTS.count_by_period(period, filters, start, end)
+
+def latest_date():
+    """Returns the most recent date, or None if the table is empty."""
+    return INCIDENTS.latest_date()
+
+def get_incidents_by_risk(limit=20, open_only=True):
+    """
+    Returns the highest risk incidents as a DataFrame, walking the risk_score index.
+    Scores are filled in by app.services.risk_scoring.
+    """
+    return INCIDENTS.top("risk_score", limit, open_only, digits=1)
 
 def transfer_csv():
-    import csv
-    from pathlib import Path
-    
-    conn = connect_database()
-    cursor = conn.cursor()
-    
-    with open(Path("DATA/cyber_incidents.csv")) as csv_file:
-        reader = csv.reader(csv_file)
-                   
-        next(reader)
-        
-        for row in reader:
-            cursor.execute("""
-                INSERT INTO cyber_incidents 
-                (id,date, incident_type, severity, status)
-                VALUES ( ?, ?, ?, ?, ?)
-            """, (row[0],row[1], row[2], row[3], row[4]))
-            
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    """
+    Loads the CSV export into the table. Safe to re-run: only new or changed
+    rows are applied (see app.data.csv_sync).
+    """
+    from app.data.csv_sync import sync_source
+    return sync_source("cyber_incidents")
+
+def queue_incident(id, date, incident_type, severity, status, timeout=None):
+    """
+    Queues an incident for a batched write (see app.data.write_buffer) instead
+    of committing it now. For high-rate feeds; blocks while the buffer is full.
+    """
+    from app.data.write_buffer import get_write_buffer
+    get_write_buffer("cyber_incidents").put((id, date, incident_type, severity, status), timeout)
@@ -0,0 +1,408 @@
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from app.data.arrow_results import TABLE_KINDS
+from app.data.db import connect_database, notify_change
+from app.data.retention import RETENTION_POLICIES
+from app.data.status_history import (DELETED_STATUS, ENTITY_INCIDENT, ENTITY_TICKET, TERMINAL_STATUSES,
+                                     record_transition)
+from app.data.typed_frames import read_typed
+
+# strftime formats for time bucketed counts
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+
+
+@contextmanager
+def _connection(conn=None):
+    """Yields conn, or a fresh connection that is closed afterwards."""
+    if conn is not None:
+        yield conn
+        return
+    db = connect_database()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class TableRepository:
+    """
+    Reads and writes one domain table. Everything that differs between the
+    tables is configuration; the SQL for CRUD, aggregates, counts and paging
+    is built once here and reused, so a fix or speed-up lands everywhere.
+    """
+
+    def __init__(self, table: str, key: str, fields: Tuple[str, ...], group_columns: Tuple[str, ...],
+                 date_column: str, default_sort: str, entity: Optional[int] = None):
+        # 1. Configuration
+        self.table = table
+        self.key = key
+        self.fields = fields
+        self.group_columns = group_columns
+        self.date_column = date_column
+        self.default_sort = default_sort
+        self.entity = entity
+        # Tables the retention job archives are read through {table}_all for historical queries
+        self.history = table + "_all" if table in RETENTION_POLICIES else table
+        self.kinds = TABLE_KINDS[table]
+        self.columns = tuple(self.kinds)
+        self.updates = tuple(c for c in fields if c != key)
+        self._status = (fields.index("status"), self.updates.index("status")) if entity else None
+
+        # 2. Fixed statements
+        self.sql = {
+            "insert": "INSERT INTO {} ({}) VALUES ({})".format(table, ", ".join(fields), ", ".join("?" * len(fields))),
+            "update": "UPDATE {} SET {} WHERE {} = ?".format(
+                table, ", ".join("{} = ?".format(c) for c in self.updates), key),
+            "delete": "DELETE FROM {} WHERE {} = ?".format(table, key),
+            "get": "SELECT * FROM {} WHERE {} = ?".format(table, key),
+            "status": "SELECT status FROM {} WHERE {} = ?".format(table, key),
+            "change_status": "UPDATE {} SET status = ? WHERE {} = ? AND status = ?".format(table, key),
+            "latest": "SELECT MAX({}) FROM {}".format(date_column, table),
+            "drop": "DROP TABLE IF EXISTS {}".format(table),
+        }
+        self.groups = {c: "SELECT {0}, COUNT(*) FROM {1} GROUP BY {0}".format(c, table) for c in self.columns}
+
+        # 3. Filtered statements, built on first use of each filter shape
+        self._statements: Dict[tuple, str] = {}
+
+    # --- Writes -------------------------------------------------------------
+
+    def insert(self, values: tuple, conn=None):
+        """Adds a row (values in fields order) and returns its key."""
+        with _connection(conn) as db:
+            cursor = db.cursor()
+            self._check_archived(db, [values[self.fields.index(self.key)]] if self.key in self.fields else [])
+            cursor.execute(self.sql["insert"], values)
+            key = values[self.fields.index(self.key)] if self.key in self.fields else cursor.lastrowid
+            if self.entity:
+                record_transition(cursor, self.entity, key, None, values[self._status[0]])
+            db.commit()
+        notify_change(self.table, "insert", key)
+        return key
+
+    def insert_many(self, rows, conn=None) -> int:
+        """
+        Adds many rows (each in fields order) in one transaction, logging
+        their initial status alongside. Nothing is written if any row fails.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        with _connection(conn) as db:
+            cursor = db.cursor()
+            try:
+                if self.key in self.fields:
+                    self._check_archived(db, [values[self.fields.index(self.key)] for values in rows])
+                cursor.executemany(self.sql["insert"], rows)
+                if self.entity:
+                    keyIndex = self.fields.index(self.key)
+                    for values in rows:
+                        record_transition(cursor, self.entity, values[keyIndex], None, values[self._status[0]])
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+        # One bulk notification; listeners reload rather than apply each row
+        notify_change(self.table, "load")
+        return len(rows)
+
+    def update(self, key, values: tuple, conn=None) -> bool:
+        """
+        Overwrites a row (values in updates order). Returns True if it existed.
+        A status change is logged in the same transaction.
+        """
+        with _connection(conn) as db:
+            cursor = db.cursor()
+            old = cursor.execute(self.sql["status"], (key,)).fetchone() if self.entity else None
+            cursor.execute(self.sql["update"], tuple(values) + (key,))
+            success = cursor.rowcount > 0
+            if success and self.entity:
+                record_transition(cursor, self.entity, key, old[0], values[self._status[1]])
+            db.commit()
+        if success:
+            notify_change(self.table, "update", key)
+        return success
+
+    def change_status(self, key, expected: str, status: str, conn=None) -> bool:
+        """
+        Moves a row to status only if its status is still expected, so two
+        sessions cannot both act on the same row. Returns True if it moved.
+        """
+        with _connection(conn) as db:
+            cursor = db.cursor()
+            cursor.execute(self.sql["change_status"], (status, key, expected))
+            success = cursor.rowcount > 0
+            if success and self.entity:
+                record_transition(cursor, self.entity, key, expected, status)
+            db.commit()
+        if success:
+            notify_change(self.table, "update", key)
+        return success
+
+    def delete(self, key, conn=None) -> bool:
+        """
+        Deletes a row by key. Returns True if it existed.
+        The deletion is logged as a status change in the same transaction.
+        """
+        with _connection(conn) as db:
+            cursor = db.cursor()
+            old = cursor.execute(self.sql["status"], (key,)).fetchone() if self.entity else None
+            cursor.execute(self.sql["delete"], (key,))
+            success = cursor.rowcount > 0
+            if success and self.entity:
+                record_transition(cursor, self.entity, key, old[0], DELETED_STATUS)
+            db.commit()
+        if success:
+            notify_change(self.table, "delete", key)
+        return success
+
+    def drop(self):
+        """Drops the table."""
+        with _connection() as db:
+            db.execute(self.sql["drop"])
+            db.commit()
+        notify_change(self.table, "drop")
+
+    # --- Reads --------------------------------------------------------------
+
+    def get(self, key, conn=None) -> Optional[dict]:
+        """One row by key as a dict, or None."""
+        with _connection(conn) as db:
+            cursor = db.execute(self.sql["get"], (key,))
+            row = cursor.fetchone()
+            return dict(zip([d[0] for d in cursor.description], row)) if row else None
+
+    def frame(self, where: str = "", conn=None) -> pd.DataFrame:
+        """Every row (optionally filtered by a SQL condition) with compact dtypes."""
+        with _connection(conn) as db:
+            return read_typed(self.select_sql("*", where), table=self.table, conn=db)
+
+    def page(self, number: int, size: int = 50, sort: Optional[str] = None, descending: bool = False,
+             filters=None, conn=None) -> pd.DataFrame:
+        """One page (numbered from 0) of rows in sort order, default_sort if not given."""
+        if sort is not None and sort not in self.columns:
+            raise ValueError("Cannot sort {} by column '{}'".format(self.table, sort))
+        order = "{} {}".format(sort, "DESC" if descending else "ASC") if sort else self.default_sort
+        where, params = self._where(filters)
+        sql = self._statement(("page", order) + tuple(filters or ()),
+                              lambda: "SELECT * FROM {}{} ORDER BY {} LIMIT ? OFFSET ?".format(self.table, where, order))
+        with _connection(conn) as db:
+            return read_typed(sql, params + (int(size), int(number) * int(size)), self.table, conn=db)
+
+    def top(self, column: str, limit: int = 20, open_only: bool = False, digits: Optional[int] = None,
+            conn=None) -> pd.DataFrame:
+        """
+        The limit rows with the largest non-null value of a numeric column, as
+        fields plus that column (rounded to digits if given), walking its index
+        when it has one. open_only leaves out rows in a terminal status.
+        """
+        if column not in self.columns:
+            raise ValueError("Cannot rank {} by column '{}'".format(self.table, column))
+        if open_only and not self.entity:
+            raise ValueError("{} has no status to filter on".format(self.table))
+        params = TERMINAL_STATUSES if open_only else ()
+        value = column if digits is None else "ROUND({0}, {1}) AS {0}".format(column, int(digits))
+        selected = [value if c == column else c for c in self.fields] + ([] if column in self.fields else [value])
+        terminal = " AND status NOT IN ({})".format(", ".join("?" * len(params))) if open_only else ""
+        sql = self._statement(("top", column, open_only, digits),
+                              lambda: "SELECT {} FROM {} WHERE {} IS NOT NULL{} ORDER BY {} DESC LIMIT ?".format(
+                                  ", ".join(selected), self.table, column, terminal, column))
+        with _connection(conn) as db:
+            return pd.read_sql_query(sql, db, params=params + (int(limit),))
+
+    def select_sql(self, column: str, where: str = "", grouped: bool = False) -> str:
+        """
+        SELECT text for a column with an optional SQL condition, for callers
+        that build their own queries. grouped adds COUNT(*) per value.
+        """
+        sql = "SELECT {}{} FROM {}".format(column, ", COUNT(*)" if grouped else "", self.table)
+        if where:
+            sql += " WHERE " + where
+        if grouped:
+            sql += " GROUP BY " + column
+        return sql
+
+    def existing_keys(self, keys, conn=None) -> set:
+        """The given keys that are already used, by live or archived rows."""
+        keys = list(keys)
+        found = set()
+        with _connection(conn) as db:
+            source = self._source(db)
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                found.update(row[0] for row in db.execute("SELECT {0} FROM {1} WHERE {0} IN ({2})".format(
+                    self.key, source, ", ".join("?" * len(chunk))), chunk))
+        return found
+
+    def latest_date(self, conn=None):
+        """The most recent date_column value, or None if the table is empty."""
+        with _connection(conn) as db:
+            return db.execute(self.sql["latest"]).fetchone()[0]
+
+    # --- Aggregates ---------------------------------------------------------
+
+    def group_counts(self, column: str, where: str = "", conn=None) -> pd.DataFrame:
+        """[column, COUNT(*)] for every value of a column, as a DataFrame."""
+        if column not in self.columns:
+            raise ValueError("Cannot group {} by column '{}'".format(self.table, column))
+        engine = None if where else self._columnar(conn)
+        if engine is not None:
+            try:
+                return pd.DataFrame(engine.group_counts(self.table, column), columns=[column, "COUNT(*)"])
+            except Exception:
+                pass  # Unreadable snapshot: answer from SQLite
+        sql = self.select_sql(column, where, grouped=True) if where else self.groups[column]
+        with _connection(conn) as db:
+            return pd.read_sql_query(sql, db)
+
+    def total(self, where: str = "", conn=None) -> int:
+        """Number of rows matching an optional SQL condition."""
+        with _connection(conn) as db:
+            return db.execute(self.select_sql("COUNT(*)", where)).fetchone()[0]
+
+    def count_by(self, column, filters=None, limit=None, start=None, end=None, conn=None):
+        """
+        (value, count) per value of a whitelisted column, largest group first.
+        start/end optionally bound date_column as in count_between, and then
+        archived rows are counted too.
+        """
+        if column not in self.group_columns:
+            raise ValueError("Cannot group {} by column '{}'".format(self.table, column))
+        where, params = self._where(filters, start, end)
+        with _connection(conn) as db:
+            source = self._source(db) if start or end else self.table
+            engine = self._columnar(conn) if source == self.table else None
+            if engine is not None:
+                try:
+                    return engine.count_by(self.table, column, filters, limit, start, end)
+                except Exception:
+                    pass
+            sql = self._statement(("count_by", source, column, bool(start), bool(end)) + tuple(filters or ()),
+                                  lambda: "SELECT {0}, COUNT(*) FROM {1}{2} GROUP BY {0} ORDER BY COUNT(*) DESC LIMIT ?"
+                                  .format(column, source, where))
+            return db.execute(sql, params + (int(limit) if limit else -1,)).fetchall()
+
+    def count_between(self, start=None, end=None, filters=None, conn=None) -> int:
+        """
+        Rows whose date_column is in [start, end), archived rows included.
+        Dates are ISO strings, either may be None.
+        """
+        where, params = self._where(filters, start, end)
+        with _connection(conn) as db:
+            source = self._source(db)
+            engine = self._columnar(conn) if source == self.table else None
+            if engine is not None:
+                try:
+                    return engine.count_between(self.table, start, end, filters)
+                except Exception:
+                    pass
+            sql = self._statement(("count", source, bool(start), bool(end)) + tuple(filters or ()),
+                                  lambda: "SELECT COUNT(*) FROM {}{}".format(source, where))
+            return db.execute(sql, params).fetchone()[0]
+
+    def count_by_period(self, period, filters=None, start=None, end=None, conn=None):
+        """(period, count) per day, week or month of date_column, oldest first, archived rows included."""
+        if period not in PERIOD_FORMATS:
+            raise ValueError("Unknown period '{}'".format(period))
+        where, params = self._where(filters, start, end)
+        with _connection(conn) as db:
+            source = self._source(db)
+            engine = self._columnar(conn) if source == self.table else None
+            if engine is not None:
+                try:
+                    return engine.count_by_period(self.table, period, filters, start, end)
+                except Exception:
+                    pass
+            sql = self._statement(("period", source, period, bool(start), bool(end)) + tuple(filters or ()),
+                                  lambda: "SELECT strftime('{}', {}) AS period, COUNT(*) FROM {}{} GROUP BY period "
+                                          "ORDER BY period".format(PERIOD_FORMATS[period], self.date_column,
+                                                                   source, where))
+            return db.execute(sql, params).fetchall()
+
+    def _source(self, db) -> str:
+        """
+        What historical reads query: {table}_all once the retention job has
+        archived rows of this table, else the table itself.
+        """
+        if self.history == self.table:
+            return self.table
+        try:
+            archived = db.execute("SELECT 1 FROM archive_tables WHERE table_name = ? LIMIT 1", (self.table,)).fetchone()
+        except sqlite3.OperationalError:  # Database set up before archiving existed
+            return self.table
+        return self.history if archived else self.table
+
+    def _check_archived(self, db, keys) -> None:
+        """
+        Archive tables carry no UNIQUE constraint, so a key that was archived
+        is refused here rather than inserted a second time.
+        """
+        if keys and self._source(db) != self.table:
+            used = self.existing_keys(keys, db)
+            if used:
+                raise sqlite3.IntegrityError("UNIQUE constraint failed: {}.{} ({} already used)".format(
+                    self.table, self.key, ", ".join(str(k) for k in sorted(used, key=str)[:5])))
+
+    def _columnar(self, conn=None):
+        """
+        The Parquet snapshot engine (app.data.columnar) when the table's
+        snapshot is up to date, else None. Callers passing their own
+        connection always get SQLite.
+        """
+        if conn is not None:
+            return None
+        from app.data.columnar import fresh_engine
+        return fresh_engine(self.table)
+
+    # --- SQL building -------------------------------------------------------
+
+    def _where(self, filters=None, start=None, end=None):
+        """
+        A parameterised WHERE clause for equality filters on whitelisted
+        columns plus optional [start, end) bounds on date_column.
+        """
+        conditions, params = [], ()
+        for column, value in (filters or {}).items():
+            if column not in self.group_columns:
+                raise ValueError("Cannot filter {} on column '{}'".format(self.table, column))
+            conditions.append("{} = ?".format(column))
+            params += (value,)
+        if start:
+            conditions.append("{} >= ?".format(self.date_column))
+            params += (start,)
+        if end:
+            conditions.append("{} < ?".format(self.date_column))
+            params += (end,)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def _statement(self, shape: tuple, build) -> str:
+        """The SQL for a query shape, built once and then reused."""
+        sql = self._statements.get(shape)
+        if sql is None:
+            sql = self._statements[shape] = build()
+        return sql
+
+
+INCIDENTS = TableRepository("cyber_incidents", key="id",
+                            fields=("id", "date", "incident_type", "severity", "status"),
+                            group_columns=("incident_type", "severity", "status"),
+                            date_column="date", default_sort="date DESC, id DESC", entity=ENTITY_INCIDENT)
+TICKETS = TableRepository("it_tickets", key="ticket_id",
+                          fields=("ticket_id", "subject", "priority", "status", "created_date"),
+                          group_columns=("subject", "priority", "status"),
+                          date_column="created_date", default_sort="created_date DESC, id DESC", entity=ENTITY_TICKET)
+DATASETS = TableRepository("datasets_metadata", key="id",
+                           fields=("dataset_name", "category", "file_size_mb"),
+                           group_columns=("category",),
+                           date_column="created_at", default_sort="created_at DESC, id DESC")
+
+REPOSITORIES = {repo.table: repo for repo in (INCIDENTS, TICKETS, DATASETS)}
+
+
+def get_repository(table: str) -> TableRepository:
+    """The repository for a domain table."""
+    return REPOSITORIES[table.lower()]
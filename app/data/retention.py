@@ -0,0 +1,260 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.data.db import connect_database, notify_change
+from app.data.status_history import TERMINAL_STATUSES
+
+# table -> (date column whose age decides when a finished row is archived, key column)
+RETENTION_POLICIES = {"cyber_incidents": ("date", "id"), "it_tickets": ("created_date", "ticket_id")}
+
+# Closed/resolved rows older than this many days are moved out of the live tables
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+
+# The background worker only runs when RETENTION_ARCHIVING=1; a manual run
+# (python -m app.data.retention run) works either way
+RETENTION_ENABLED = os.environ.get("RETENTION_ARCHIVING") == "1"
+RETENTION_INTERVAL = 24 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def create_archive_tables(conn):
+    """
+    Create the registry of monthly archive tables and the {table}_all views
+    that put live and archived rows back together for historical queries.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive_tables (
+            archive TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            month TEXT NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0,
+            archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for archive, table in conn.execute("SELECT archive, table_name FROM archive_tables").fetchall():
+        _index_archive(conn, archive, table)
+    for table in RETENTION_POLICIES:
+        _create_view(conn, table)
+    conn.commit()
+
+
+def archive_name(table: str, month: str) -> str:
+    """Archive table for one month, e.g. cyber_incidents_archive_2024_03."""
+    return "{}_archive_{}".format(table, month.replace("-", "_"))
+
+
+def _index_archive(conn, archive: str, table: str) -> None:
+    """Date and key indexes; the key one keeps the archived-key check on insert cheap."""
+    for column in RETENTION_POLICIES[table]:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_{0}_{1} ON {0} ({1})".format(archive, column))
+
+
+def _columns(conn, table: str) -> List[str]:
+    return [row[1] for row in conn.execute("PRAGMA table_info({})".format(table))]
+
+
+def _create_view(conn, table: str) -> None:
+    """
+    (Re)creates {table}_all as the live table UNION ALL its archives, with
+    NULL for columns an older archive table does not have.
+    """
+    columns = _columns(conn, table)
+    parts = ["SELECT {} FROM {}".format(", ".join(columns), table)]
+    archives = conn.execute("SELECT archive FROM archive_tables WHERE table_name = ? ORDER BY month",
+                            (table,)).fetchall()
+    for (archive,) in archives:
+        present = set(_columns(conn, archive))
+        parts.append("SELECT {} FROM {}".format(
+            ", ".join(c if c in present else "NULL AS {}".format(c) for c in columns), archive))
+    conn.execute("DROP VIEW IF EXISTS {}_all".format(table))
+    conn.execute("CREATE VIEW {}_all AS {}".format(table, "\nUNION ALL ".join(parts)))
+
+
+def _eligible(table: str, days: int):
+    """WHERE clause and parameters for finished rows older than days."""
+    dateColumn = RETENTION_POLICIES[table][0]
+    where = "status IN ({}) AND {} < date('now', ?)".format(", ".join("?" * len(TERMINAL_STATUSES)), dateColumn)
+    return where, TERMINAL_STATUSES + ("-{} days".format(int(days)),)
+
+
+def eligible_rows(table: str, days: int = ARCHIVE_AFTER_DAYS, conn=None) -> Dict[str, int]:
+    """Rows that an archive run would move, per month."""
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    where, params = _eligible(table, days)
+    rows = conn.execute("SELECT strftime('%Y-%m', {0}) AS month, COUNT(*) FROM {1} WHERE {2} GROUP BY month".format(
+        RETENTION_POLICIES[table][0], table, where), params).fetchall()
+    if ownConnection:
+        conn.close()
+    return dict(rows)
+
+
+def archive_table(table: str, days: int = ARCHIVE_AFTER_DAYS, conn=None) -> Dict[str, int]:
+    """
+    Moves closed/resolved rows older than days into one archive table per
+    month, in a single transaction, and rebuilds {table}_all.
+    Returns the number of rows moved per month.
+    """
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    dateColumn = RETENTION_POLICIES[table][0]
+    where, params = _eligible(table, days)
+    moved = {}
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        months = [row[0] for row in conn.execute(
+            "SELECT DISTINCT strftime('%Y-%m', {}) FROM {} WHERE {}".format(dateColumn, table, where), params)]
+        for month in months:
+            archive = archive_name(table, month)
+            conn.execute("CREATE TABLE IF NOT EXISTS {} AS SELECT * FROM {} WHERE 0".format(archive, table))
+            _index_archive(conn, archive, table)
+            columns = ", ".join(_columns(conn, archive))
+            monthWhere = "{} AND strftime('%Y-%m', {}) = ?".format(where, dateColumn)
+            cursor = conn.execute("INSERT INTO {0} ({1}) SELECT {1} FROM {2} WHERE {3}".format(
+                archive, columns, table, monthWhere), params + (month,))
+            moved[month] = cursor.rowcount
+            conn.execute("DELETE FROM {} WHERE {}".format(table, monthWhere), params + (month,))
+            conn.execute("""
+                INSERT INTO archive_tables (archive, table_name, month, rows) VALUES (?, ?, ?, ?)
+                ON CONFLICT(archive) DO UPDATE SET rows = rows + excluded.rows, archived_at = CURRENT_TIMESTAMP
+            """, (archive, table, month, moved[month]))
+        if moved:
+            _create_view(conn, table)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if ownConnection:
+            conn.close()
+    if moved:
+        notify_change(table, "archive")
+    return moved
+
+
+def duplicate_keys(table: str, conn=None) -> int:
+    """Keys that appear more than once across the live table and its archives (should be 0)."""
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    key = RETENTION_POLICIES[table][1]
+    try:
+        return conn.execute("SELECT COUNT(*) FROM (SELECT {0} FROM {1}_all GROUP BY {0} HAVING COUNT(*) > 1)".format(
+            key, table)).fetchone()[0]
+    finally:
+        if ownConnection:
+            conn.close()
+
+
+def enable_incremental_vacuum(conn) -> bool:
+    """
+    Switches the file to auto_vacuum=INCREMENTAL so freed pages can be given
+    back without rewriting it. The switch itself needs one full VACUUM, so it
+    only happens once. Returns True if it was switched now.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+def run_retention(days: int = ARCHIVE_AFTER_DAYS, conn=None) -> Dict[str, object]:
+    """
+    Archives every table under RETENTION_POLICIES, then refreshes the
+    planner statistics and returns the freed pages to the filesystem.
+    """
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    try:
+        create_archive_tables(conn)
+        moved = {table: archive_table(table, days, conn) for table in RETENTION_POLICIES}
+        report = {"moved": {t: sum(m.values()) for t, m in moved.items()}, "months": moved}
+        if any(report["moved"].values()):
+            pagesBefore = conn.execute("PRAGMA page_count").fetchone()[0]
+            report["vacuum_enabled"] = enable_incremental_vacuum(conn)
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA incremental_vacuum")
+            report["pages_freed"] = pagesBefore - conn.execute("PRAGMA page_count").fetchone()[0]
+        return report
+    finally:
+        if ownConnection:
+            conn.close()
+
+
+class RetentionWorker(threading.Thread):
+    """Daemon thread that runs the archival and maintenance every interval seconds."""
+
+    def __init__(self, interval: float = RETENTION_INTERVAL, days: int = ARCHIVE_AFTER_DAYS):
+        super().__init__(name="retention-worker", daemon=True)
+        self.interval = interval
+        self.days = days
+        self.last_report: Optional[dict] = None
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        while not self._halt.is_set():
+            try:
+                self.last_report = run_retention(self.days)
+            except Exception:  # keep the worker alive, e.g. while the DB is locked
+                logger.exception("Retention worker run failed")
+            self._halt.wait(self.interval)
+
+    def stop(self) -> None:
+        self._halt.set()
+
+
+_worker: Optional[RetentionWorker] = None
+_workerLock = threading.Lock()
+
+
+def start_retention_worker(interval: float = RETENTION_INTERVAL) -> Optional[RetentionWorker]:
+    """Starts the process-wide worker once if RETENTION_ARCHIVING=1, else returns None."""
+    global _worker
+    if not RETENTION_ENABLED:
+        return None
+    with _workerLock:
+        if _worker is None or not _worker.is_alive():
+            _worker = RetentionWorker(interval)
+            _worker.start()
+        return _worker
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move old closed incidents and resolved tickets to archive tables.")
+    parser.add_argument("command", choices=["preview", "run", "check"])
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    args = parser.parse_args()
+
+    if args.command == "preview":
+        for table in RETENTION_POLICIES:
+            print(table, eligible_rows(table, args.days))
+    elif args.command == "run":
+        start = time.perf_counter()
+        print(run_retention(args.days))
+        print("{:.2f} s".format(time.perf_counter() - start))
+    else:
+        # Archive, then re-sync every CSV export from scratch, on a scratch copy of DATA:
+        # no archived row may come back into the live table
+        import shutil
+        import tempfile
+
+        from app.data.csv_sync import reset_sync_state, sync_all
+        from app.data.schema import create_all_tables
+
+        scratch = tempfile.mkdtemp()
+        shutil.copytree("DATA", os.path.join(scratch, "DATA"))
+        os.chdir(scratch)
+        create_all_tables()
+        print(run_retention(args.days)["moved"])
+        reset_sync_state()
+        print([(r["source"], r["rows_written"], r["rows_archived"]) for r in sync_all()])
+        duplicates = {table: duplicate_keys(table) for table in RETENTION_POLICIES}
+        print("duplicate keys:", duplicates)
+        shutil.rmtree(scratch)
+        assert not any(duplicates.values()), "re-sync brought archived rows back"
@@ -1,3 +1,7 @@
+from app.data.changes import create_changelog
+from app.data.retention import create_archive_tables
+from app.data.status_history import backfill_once, create_metrics_tables, create_status_history_tables
+
 def create_users_table(conn):
     """Create users table."""
     cursor = conn.cursor()
@@ -55,6 +59,79 @@ def create_it_tickets_table(conn):
     """)
     conn.commit()
 
+def create_csv_sync_state_table(conn):
+    """Create the table that remembers how far each CSV export has been synced."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS csv_sync_state (
+            source TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            byte_offset INTEGER,
+            tail_hash TEXT,
+            high_water TEXT,
+            synced_at TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+def add_risk_score_column(conn):
+    """
+    Add the persisted risk_score column to cyber_incidents, its index, and a
+    trigger that clears the score when a scored field changes so only those
+    rows are recomputed (see app.services.risk_scoring).
+    """
+    cursor = conn.cursor()
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(Cyber_Incidents)")]
+    if "risk_score" not in columns:
+        cursor.execute("ALTER TABLE Cyber_Incidents ADD COLUMN risk_score REAL")
+    cursor.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_incidents_risk ON Cyber_Incidents (risk_score DESC);
+        CREATE TRIGGER IF NOT EXISTS trg_incidents_risk_dirty
+        AFTER UPDATE OF date, incident_type, severity, status ON Cyber_Incidents
+        BEGIN
+            UPDATE Cyber_Incidents SET risk_score = NULL WHERE id = NEW.id;
+        END;
+    """)
+    conn.commit()
+
+def add_profile_columns(conn):
+    """
+    Add the columns the catalog profiler fills from the actual data files
+    (see app.services.catalog_profiler), keyed by a unique source_path.
+    """
+    cursor = conn.cursor()
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(Datasets_Metadata)")]
+    for name, kind in (("source_path", "TEXT"), ("size_bytes", "INTEGER"), ("row_count", "INTEGER"),
+                       ("column_count", "INTEGER"), ("checksum", "TEXT"), ("file_mtime", "REAL"),
+                       ("profiled_at", "TIMESTAMP")):
+        if name not in columns:
+            cursor.execute("ALTER TABLE Datasets_Metadata ADD COLUMN {} {}".format(name, kind))
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_datasets_source
+        ON Datasets_Metadata (source_path) WHERE source_path IS NOT NULL
+    """)
+    conn.commit()
+
+def create_indexes(conn):
+    """Create indexes used by the dashboard and assistant aggregate queries."""
+    cursor = conn.cursor()
+    cursor.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_incidents_severity_status ON Cyber_Incidents (severity, status);
+        CREATE INDEX IF NOT EXISTS idx_incidents_type ON Cyber_Incidents (incident_type);
+        CREATE INDEX IF NOT EXISTS idx_incidents_status ON Cyber_Incidents (status);
+        CREATE INDEX IF NOT EXISTS idx_incidents_date ON Cyber_Incidents (date);
+        CREATE INDEX IF NOT EXISTS idx_tickets_subject ON IT_Tickets (subject);
+        CREATE INDEX IF NOT EXISTS idx_tickets_priority ON IT_Tickets (priority);
+        CREATE INDEX IF NOT EXISTS idx_tickets_status ON IT_Tickets (status);
+        CREATE INDEX IF NOT EXISTS idx_tickets_created_date ON IT_Tickets (created_date);
+        CREATE INDEX IF NOT EXISTS idx_datasets_category ON Datasets_Metadata (category, file_size_mb);
+        CREATE INDEX IF NOT EXISTS idx_datasets_created_at ON Datasets_Metadata (created_at);
+        CREATE INDEX IF NOT EXISTS idx_datasets_size ON Datasets_Metadata (file_size_mb);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_datasets_name_created ON Datasets_Metadata (dataset_name, created_at);
+    """)
+    conn.commit()
+
 def create_all_tables()->None:
     """Create all necessary tables."""
     import sqlite3
@@ -65,4 +142,15 @@ def create_all_tables()->None:
     create_users_table(conn)
     create_cyber_incidents_table(conn)
     create_datasets_metadata_table(conn)
-    create_it_tickets_table(conn)
\ No newline at end of file
+    create_it_tickets_table(conn)
+    create_csv_sync_state_table(conn)
+    add_risk_score_column(conn)
+    add_profile_columns(conn)
+    create_status_history_tables(conn)
+    create_metrics_tables(conn)
+    create_indexes(conn)
+    create_changelog(conn)
+    create_archive_tables(conn)
+    # Rows created before the status history existed get a creation event, once
+    backfill_once(conn)
+    conn.close()
@@ -0,0 +1,183 @@
+import threading
+
+from app.data.db import connect_database
+
+# Entity codes stored in status_events.entity
+ENTITY_INCIDENT = 1
+ENTITY_TICKET = 2
+ENTITY_NAMES = {ENTITY_INCIDENT: "incident", ENTITY_TICKET: "ticket"}
+
+# Statuses that end a piece of work
+TERMINAL_STATUSES = ("Closed", "Resolved")
+# Recorded when an incident or ticket is deleted; ends the work without resolving it
+DELETED_STATUS = "Deleted"
+
+_codeLock = threading.Lock()
+_codes = {}
+
+def create_status_history_tables(conn):
+    """
+    Create the append-only status_events log and the status_states lookup
+    that maps each status name to a small integer code.
+    """
+    cursor = conn.cursor()
+    cursor.executescript("""
+        CREATE TABLE IF NOT EXISTS status_states (
+            code INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            terminal INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS status_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity INTEGER NOT NULL,
+            entity_id TEXT NOT NULL,
+            from_state INTEGER,
+            to_state INTEGER NOT NULL,
+            changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_status_events_time ON status_events (entity, changed_at);
+        CREATE INDEX IF NOT EXISTS idx_status_events_item ON status_events (entity, entity_id, id);
+    """)
+    conn.commit()
+    _load_codes(conn)
+
+def create_metrics_tables(conn):
+    """Tables the status aggregation jobs (app.services.status_metrics) write to, plus their checkpoints."""
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            job TEXT PRIMARY KEY,
+            last_event_id INTEGER NOT NULL,
+            updated_at TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS open_work (
+            entity INTEGER NOT NULL,
+            entity_id TEXT NOT NULL,
+            opened_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (entity, entity_id)
+        );
+        CREATE TABLE IF NOT EXISTS resolution_times (
+            entity INTEGER NOT NULL,
+            entity_id TEXT NOT NULL,
+            resolved_at TIMESTAMP NOT NULL,
+            seconds REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_resolution_times ON resolution_times (entity, resolved_at);
+        CREATE TABLE IF NOT EXISTS status_daily (
+            entity INTEGER NOT NULL,
+            day DATE NOT NULL,
+            opened INTEGER NOT NULL DEFAULT 0,
+            resolved INTEGER NOT NULL DEFAULT 0,
+            reopened INTEGER NOT NULL DEFAULT 0,
+            removed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (entity, day)
+        );
+    """)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(status_daily)")]
+    if "removed" not in columns:
+        conn.execute("ALTER TABLE status_daily ADD COLUMN removed INTEGER NOT NULL DEFAULT 0")
+    conn.commit()
+
+def _load_codes(conn):
+    """
+    Caches the committed status codes. Only codes read here are cached: one
+    added inside a transaction that is later rolled back could be handed to
+    a different status by the next writer.
+    """
+    rows = conn.execute("SELECT name, code FROM status_states").fetchall()
+    with _codeLock:
+        _codes.update(rows)
+
+def state_code(cursor, status):
+    """Returns the integer code for a status name, adding it on first use."""
+    if status is None:
+        return None
+    with _codeLock:
+        if status in _codes:
+            return _codes[status]
+    # Not cached: read it (or add it) inside the caller's transaction every time
+    row = cursor.execute("SELECT code FROM status_states WHERE name = ?", (status,)).fetchone()
+    if row:
+        return row[0]
+    cursor.execute("INSERT INTO status_states (name, terminal) VALUES (?, ?)",
+                   (status, int(status in TERMINAL_STATUSES or status == DELETED_STATUS)))
+    return cursor.lastrowid
+
+def record_transition(cursor, entity, entity_id, old_status, new_status, changed_at=None):
+    """
+    Appends a status change to status_events using the caller's cursor, so it
+    commits (or rolls back) together with the write that caused it.
+    Nothing is written when the status did not change.
+    """
+    if old_status == new_status:
+        return False
+    values = (entity, str(entity_id), state_code(cursor, old_status), state_code(cursor, new_status))
+    if changed_at is None:
+        cursor.execute("INSERT INTO status_events (entity, entity_id, from_state, to_state) VALUES (?, ?, ?, ?)",
+                       values)
+    else:
+        cursor.execute("""
+            INSERT INTO status_events (entity, entity_id, from_state, to_state, changed_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, values + (changed_at,))
+    return True
+
+def get_state_names():
+    """Returns {code: (name, is_terminal)} for every known status."""
+    conn = connect_database()
+    rows = conn.execute("SELECT code, name, terminal FROM status_states").fetchall()
+    conn.close()
+    return {code: (name, bool(terminal)) for code, name, terminal in rows}
+
+def get_events_since(last_id, limit=10000, conn=None):
+    """
+    Returns up to limit events with id > last_id, oldest first, as
+    (id, entity, entity_id, from_state, to_state, changed_at) tuples.
+    """
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    rows = conn.execute("""
+        SELECT id, entity, entity_id, from_state, to_state, changed_at
+        FROM status_events WHERE id > ? ORDER BY id LIMIT ?
+    """, (last_id, limit)).fetchall()
+    if ownConnection:
+        conn.close()
+    return rows
+
+def backfill_status_history(conn=None):
+    """
+    Adds a creation event for every incident and ticket that has no history
+    yet, dated from the record itself, so metrics cover pre-existing rows.
+    Returns the number of events added.
+    """
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    cursor = conn.cursor()
+    sources = (
+        (ENTITY_INCIDENT, "SELECT id, status, date FROM cyber_incidents"),
+        (ENTITY_TICKET, "SELECT ticket_id, status, created_at FROM IT_Tickets"),
+    )
+    added = 0
+    for entity, sql in sources:
+        seen = {row[0] for row in cursor.execute(
+            "SELECT DISTINCT entity_id FROM status_events WHERE entity = ?", (entity,))}
+        for entityId, status, createdAt in cursor.execute(sql).fetchall():
+            if str(entityId) not in seen and status is not None:
+                record_transition(cursor, entity, entityId, None, status, str(createdAt))
+                added += 1
+    conn.commit()
+    if ownConnection:
+        conn.close()
+    return added
+
+def backfill_once(conn):
+    """
+    Runs backfill_status_history the first time the tables are set up and
+    marks it done in job_checkpoints; later calls do nothing.
+    Returns the number of events added.
+    """
+    if conn.execute("SELECT 1 FROM job_checkpoints WHERE job = 'backfill'").fetchone():
+        return 0
+    # The marker commits together with the events
+    conn.execute("INSERT INTO job_checkpoints (job, last_event_id, updated_at) "
+                 "VALUES ('backfill', (SELECT COALESCE(MAX(id), 0) FROM status_events), CURRENT_TIMESTAMP)")
+    return backfill_status_history(conn)
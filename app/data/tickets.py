@@ -1,199 +1,110 @@
-import csv
-from pathlib import Path
-import pandas as pd 
-from app.data.db import connect_database
+from app.data.repository import TICKETS, PERIOD_FORMATS
+
+# Columns that aggregate queries may group or filter on
+TICKET_COLUMNS = TICKETS.group_columns
 
 def insert_ticket(ticket_id, subject, priority, status, created_date):
     """
     Adds a new ticket record to the database matching the CSV structure.
     """
-    # 1. Connect to the DB
-    db = connect_database()
-    cursor = db.cursor()
-
-    # 2. Run the SQL Command
-    sql = """
-        INSERT INTO IT_Tickets 
-        (ticket_id, subject, priority, status, created_date)
-        VALUES (?, ?, ?, ?, ?)
-    """
-    values = (ticket_id, subject, priority, status, created_date)
-    
-    cursor.execute(sql, values)
-    db.commit()
-    db.close()
+    return TICKETS.insert((ticket_id, subject, priority, status, created_date))
 
 def drop_tickets_table():
     """
     Drops the IT_Tickets table from the database.
     """
-    # 1. Connect to the DB
-    db = connect_database()
-    cursor = db.cursor()
-
-    # 2. Run the SQL Command
-    sql = "DROP TABLE IF EXISTS IT_Tickets"
-    
-    cursor.execute(sql)
-    db.commit()
-    db.close()
+    TICKETS.drop()
 
 def update_ticket(ticket_id, subject, priority, status, created_date):
     """
     Updates an existing ticket record in the database.
     Returns True if successful, False otherwise.
     """
-    # 1. Connect to the DB
-    db = connect_database()
-    cursor = db.cursor()
-
-    # 2. Run the SQL Command
-    sql = """
-        UPDATE IT_Tickets
-        SET subject = ?, priority = ?, status = ?, created_date = ?
-        WHERE ticket_id = ?
-    """
-    # The ticket_id goes last to match the WHERE clause
-    values = (subject, priority, status, created_date, ticket_id)
-    
-    cursor.execute(sql, values)
-    db.commit()
-
-    # 3. Check if any row was updated
-    success = cursor.rowcount > 0
-    
-    db.close()
-    return success
+    return TICKETS.update(ticket_id, (subject, priority, status, created_date))
 
 def delete_ticket(ticket_id):
     """
     Deletes a ticket record from the database by its ticket_id.
     Returns True if successful, False otherwise.
     """
-    # 1. Connect to the DB
-    db = connect_database()
-    cursor = db.cursor()
-
-    # 2. Run the SQL Command
-    sql = "DELETE FROM IT_Tickets WHERE ticket_id = ?"
-    cursor.execute(sql, (ticket_id,))
-    db.commit()
-
-    # 3. Check if any row was deleted
-    success = cursor.rowcount > 0
-    
-    db.close()
-    return success
+    return TICKETS.delete(ticket_id)
 
 def get_groupby(column):
     """
     Retrieves distinct values for a specified column from the IT_Tickets table.
     """
-    # 1. Establish connection
-    db = connect_database()
-    
-    # 2. Generate the full SQL command
-    sql_command = f"SELECT {column},COUNT(*) FROM IT_Tickets GROUP BY {column}"
-    
-    # 3. Execute query and load directly into a Pandas DataFrame
-    results_df = pd.read_sql_query(sql_command, db)
-    print(results_df)
-    
-    # 4. Close connection and return data
-    db.close()
-    return results_df
+    return TICKETS.group_counts(column)
 
 def get_all_tickets(filter_str,column):
     """
-    Retrieves ticket records from the database and returns them as a DataFrame.
+    Counts tickets per value of a column and returns them as a DataFrame.
     Applies the provided SQL filter string to refine the results.
     """
-    # 1. Establish connection
-    db = connect_database()
-    
-    # 2. Generate the full SQL command using the helper function
-    # Renamed to match the IT tickets context
-    sql_command =f"SELECT {column},COUNT(*) FROM IT_Tickets GROUP BY {column}"
-    
-    # 3. Execute query and load directly into a Pandas DataFrame
-    results_df = pd.read_sql_query(sql_command, db)
-    print(results_df)
-    
-    # 4. Close connection and return data
-    db.close()
-    return results_df
+    return TICKETS.group_counts(column, filter_str)
 
 def get_tickets_dataframe(filter_str=None):
     """
     Returns the DataFrame for IT_Tickets table.
     """
-    # 1. Establish connection
-    db = connect_database()
-    
-    # 2. Generate the full SQL command
-    sql_command = "SELECT * FROM IT_Tickets"
-
-    # 3. Execute query and load directly into a Pandas DataFrame
-    results_df = pd.read_sql_query(sql_command, db)
-    print(results_df)
-    
-    # 4. Close connection and return data
-    db.close()
-    return results_df
+    return TICKETS.frame(filter_str or "")
 
 def get_ticketquery(filter_str,column):
     """
-    Constructs the SQL query string for retrieving tickets with an optional filter.
+    Constructs the SQL query string for counting tickets per value of a column
+    with an optional filter.
     """
-    # 1. Define the base requirement
-    query = f"SELECT {column},COUNT(*) FROM IT_Tickets GROUP BY {column}"
-    
-    # 2. Add the condition if it exists
-    if filter_str:
-        query += f" WHERE {filter_str}"
-    print('Filter string 1',filter_str)
-    
-    return query
+    return TICKETS.select_sql(column, filter_str, grouped=True)
 
 def total_tickets(filter_str: str) -> int:
     """
-    Executes the query with the optional filter and returns the total count of matches
-    in the it_tickets table.
-    """
-    # 1. Open Connection
-    conn = connect_database()
-    
-    # 2. Get the SQL string using the helper function we updated earlier
-    sql_cmd = get_all_tickets(filter_str)
-    
-    # 3. Load results into a DataFrame
-    df_results = pd.read_sql_query(sql_cmd, conn)
-    
-    conn.close()
-    
-    # 4. Return the number of rows found
-    return len(df_results)
+    Returns the total count of tickets matching the optional filter.
+    """
+    return TICKETS.total(filter_str)
+
+def get_tickets_page(page, page_size=50, sort=None, descending=False, filters=None):
+    """
+    Returns one page of tickets, newest first unless a sort column is given.
+    """
+    return TICKETS.page(page, page_size, sort, descending, filters)
+
+def count_by(column, filters=None, limit=None, start=None, end=None):
+    """
+    Counts tickets per value of a column, largest group first.
+    start/end optionally bound the date column as in count_between.
+    Returns a list of (value, count) tuples.
+    """
+    return TICKETS.count_by(column, filters, limit, start, end)
+
+def count_between(start=None, end=None, filters=None):
+    """
+    Counts tickets whose created_date is in [start, end). Dates are ISO strings,
+    either bound may be None.
+    """
+    return TICKETS.count_between(start, end, filters)
+
+def count_by_period(period, filters=None, start=None, end=None):
+    """
+    Counts tickets per day, week or month of created_date, oldest first.
+    Returns a list of (period, count) tuples.
+    """
+    return TICKETS.count_by_period(period, filters, start, end)
+
+def latest_date():
+    """Returns the most recent created_date, or None if the table is empty."""
+    return TICKETS.latest_date()
 
 def transfer_csv():
-    import csv
-    from pathlib import Path
-    
-    conn = connect_database()
-    cursor = conn.cursor()
-    
-    # Updated to read from the correct file 'it_tickets.csv'
-    with open(Path("DATA/it_tickets.csv")) as csv_file:
-        reader = csv.reader(csv_file)
-                    
-        # Skip the header row
-        next(reader)
-        
-        for row in reader:
-            cursor.execute("""
-                INSERT INTO IT_Tickets 
-                (ticket_id, subject, priority, status, created_date, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (row[0], row[1], row[2], row[3], row[4], row[5]))
-            
-    conn.commit()
-    conn.close()
+    """
+    Loads the CSV export into the table. Safe to re-run: only new or changed
+    rows are applied (see app.data.csv_sync).
+    """
+    from app.data.csv_sync import sync_source
+    return sync_source("it_tickets")
+
+def queue_ticket(ticket_id, subject, priority, status, created_date, timeout=None):
+    """
+    Queues a ticket for a batched write (see app.data.write_buffer) instead
+    of committing it now. For high-rate feeds; blocks while the buffer is full.
+    """
+    from app.data.write_buffer import get_write_buffer
+    get_write_buffer("it_tickets").put((ticket_id, subject, priority, status, created_date), timeout)
@@ -0,0 +1,121 @@
+from typing import Dict, Iterator, Optional, Union
+
+import pandas as pd
+
+from app.data.arrow_results import TABLE_KINDS
+from app.data.db import connect_database
+
+
+def _categories(table: str, conn) -> Dict[str, pd.CategoricalDtype]:
+    """One fixed CategoricalDtype per category column, so every chunk shares its codes."""
+    return {column: pd.CategoricalDtype(sorted(
+                row[0] for row in conn.execute("SELECT DISTINCT {} FROM {} WHERE {} IS NOT NULL".format(
+                    column, table, column))))
+            for column, kind in TABLE_KINDS[table].items() if kind == "category"}
+
+
+def apply_schema(df: pd.DataFrame, table: str, categories: Optional[Dict[str, pd.CategoricalDtype]] = None) -> pd.DataFrame:
+    """
+    Converts a raw query result in place to compact dtypes: category for
+    low-cardinality text, datetime64 for dates, and the smallest integer or
+    float type that holds each numeric column. Unknown columns are left alone.
+    """
+    kinds = TABLE_KINDS.get(table.lower(), {})
+    for column in df.columns:
+        kind = kinds.get(column)
+        if kind == "category":
+            df[column] = df[column].astype(categories[column] if categories and column in categories else "category")
+        elif kind in ("date", "datetime"):
+            df[column] = pd.to_datetime(df[column], format="ISO8601", errors="coerce")
+        elif kind == "int":
+            numbers = pd.to_numeric(df[column])
+            if numbers.notna().all():
+                df[column] = pd.to_numeric(numbers, downcast="integer")
+            else:
+                # Nullable: Int32 only when the values fit, e.g. size_bytes passes 2**31 for files over 2 GiB
+                fits = numbers.min() >= -2 ** 31 and numbers.max() < 2 ** 31
+                df[column] = numbers.astype("Int32" if fits else "Int64")
+        elif kind == "float":
+            df[column] = pd.to_numeric(df[column], downcast="float")
+    return df
+
+
+def read_typed(sql: str, params=(), table: str = "", chunksize: Optional[int] = None,
+               conn=None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    Runs a query with pandas and returns it with the table's compact dtypes.
+    With chunksize, returns an iterator of typed DataFrames instead, whose
+    category columns all share one dtype so they concatenate cheaply.
+    """
+    table = table.lower()
+    if chunksize is None:
+        ownConnection = conn is None
+        conn = conn or connect_database()
+        df = pd.read_sql_query(sql, conn, params=params)
+        if ownConnection:
+            conn.close()
+        return apply_schema(df, table)
+    return _chunks(sql, params, table, chunksize, conn)
+
+
+def _chunks(sql, params, table, chunksize, conn):
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    try:
+        categories = _categories(table, conn) if table in TABLE_KINDS else {}
+        for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunksize):
+            yield apply_schema(chunk, table, categories)
+    finally:
+        if ownConnection:
+            conn.close()
+
+
+def load_table(table: str, chunksize: Optional[int] = None, conn=None):
+    """Every row of a table with compact dtypes, whole or in chunks."""
+    return read_typed("SELECT * FROM {}".format(table), (), table, chunksize, conn)
+
+
+def memory_report(table: str, conn=None) -> Dict[str, float]:
+    """Deep memory use of a table loaded plainly and with compact dtypes, in MB."""
+    ownConnection = conn is None
+    conn = conn or connect_database()
+    raw = pd.read_sql_query("SELECT * FROM {}".format(table), conn)
+    typed = apply_schema(raw.copy(), table)
+    if ownConnection:
+        conn.close()
+    before = float(raw.memory_usage(deep=True).sum()) / 1024 / 1024
+    after = float(typed.memory_usage(deep=True).sum()) / 1024 / 1024
+    return {"rows": len(raw), "before_mb": round(before, 3), "after_mb": round(after, 3),
+            "ratio": round(before / after, 1) if after else 0.0}
+
+
+if __name__ == "__main__":
+    import sqlite3
+    import tempfile
+    import time
+    from pathlib import Path
+
+    for table in TABLE_KINDS:
+        print(table, memory_report(table))
+
+    # The same tables repeated 200 times, as a stand-in for a larger deployment
+    path = Path(tempfile.mkdtemp()) / "bench.db"
+    source = connect_database()
+    scaled = sqlite3.connect(str(path))
+    for table in TABLE_KINDS:
+        columns = [row[1] for row in source.execute("PRAGMA table_info({})".format(table))]
+        rows = source.execute("SELECT * FROM {}".format(table)).fetchall()
+        scaled.execute("CREATE TABLE {} ({})".format(table, ", ".join(columns)))
+        scaled.executemany("INSERT INTO {} VALUES ({})".format(table, ", ".join("?" * len(columns))), rows * 200)
+    scaled.commit()
+    source.close()
+    for table in TABLE_KINDS:
+        print("x200", table, memory_report(table, scaled))
+
+    start = time.perf_counter()
+    peak = 0
+    for chunk in load_table("cyber_incidents", chunksize=20000, conn=scaled):
+        peak = max(peak, chunk.memory_usage(deep=True).sum())
+    print("chunked cyber_incidents: {:.2f} s, largest chunk {:.1f} MB".format(
+        time.perf_counter() - start, peak / 1024 / 1024))
+    scaled.close()
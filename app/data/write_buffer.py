@@ -0,0 +1,216 @@
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from app.data.db import connect_database
+from app.data.repository import TableRepository, get_repository
+
+# Defaults: flush at 500 rows or 0.5 s after the first queued row, hold at most 10k
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 0.5
+CAPACITY = 10000
+# A locked database is waited on (busy timeout) and then retried this many times before a batch is given up
+BUSY_TIMEOUT_MS = 30000
+LOCK_RETRIES = 5
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBuffer(threading.Thread):
+    """
+    Write-behind insert buffer for one table. put() queues a row and returns
+    at once; a daemon thread writes queued rows in one transaction per batch
+    (FLUSH_ROWS rows or FLUSH_SECONDS after the first, whichever comes first).
+    put() blocks while the queue is full, so a fast feed is slowed down to
+    the rate the database can take instead of growing memory without bound.
+    """
+
+    def __init__(self, repository: TableRepository, flush_rows: int = FLUSH_ROWS,
+                 flush_seconds: float = FLUSH_SECONDS, capacity: int = CAPACITY, connect=connect_database):
+        super().__init__(name="write-buffer-" + repository.table, daemon=True)
+        self.repository = repository
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.connect = connect
+        self.rows = 0
+        self.batches = 0
+        self.failed = 0
+        self.retries = 0
+        self.last_error: Optional[str] = None
+        self.waits = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=capacity)
+        self._latencies = deque(maxlen=1000)
+        self._halt = threading.Event()
+        self._since = time.perf_counter()
+
+    def put(self, values: tuple, timeout: Optional[float] = None) -> None:
+        """
+        Queues one row (in the repository's fields order). Blocks while the
+        buffer is full; raises queue.Full if it is still full after timeout.
+        """
+        if self._halt.is_set():
+            raise RuntimeError("Write buffer for {} is closed".format(self.repository.table))
+        try:
+            self._queue.put_nowait(values)
+        except queue.Full:
+            self.waits += 1
+            self._queue.put(values, timeout=timeout)
+
+    def flush(self) -> None:
+        """Blocks until every row queued so far has been written (or has failed)."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Writes whatever is still queued, then stops the thread."""
+        self._halt.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self) -> None:
+        conn = self.connect()
+        conn.execute("PRAGMA busy_timeout = {}".format(BUSY_TIMEOUT_MS))
+        try:
+            while not (self._halt.is_set() and self._queue.empty()):
+                batch = self._collect()
+                if batch:
+                    self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def _collect(self) -> list:
+        """Waits for a first row, then gathers more until the batch is full or due."""
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        due = time.perf_counter() + self.flush_seconds
+        while len(batch) < self.flush_rows:
+            remaining = due - time.perf_counter()
+            try:
+                # Once due, still take rows that are already waiting, just don't wait for more
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, conn, rows: list) -> None:
+        """insert_many, retried with backoff while the database stays locked."""
+        for attempt in range(LOCK_RETRIES + 1):
+            try:
+                self.repository.insert_many(rows, conn)
+                return
+            except sqlite3.OperationalError:
+                if attempt == LOCK_RETRIES:
+                    raise
+                self.retries += 1
+                time.sleep(min(2.0, 0.1 * 2 ** attempt))
+
+    def _write(self, conn, batch: list) -> None:
+        start = time.perf_counter()
+        try:
+            self._insert(conn, batch)
+            self.rows += len(batch)
+        except sqlite3.OperationalError as error:
+            # Still locked (or the table is unusable) after every retry: nothing was written
+            self.failed += len(batch)
+            self.last_error = str(error)
+            logger.error("Write buffer for %s dropped %d rows: %s", self.repository.table, len(batch), error)
+        except Exception:
+            # A bad row (e.g. a duplicate key) must not lose the rest of the batch
+            for values in batch:
+                try:
+                    self._insert(conn, [values])
+                    self.rows += 1
+                except Exception as error:
+                    self.failed += 1
+                    self.last_error = "{}: {}".format(values[0], error)
+        self.batches += 1
+        self._latencies.append(time.perf_counter() - start)
+        for _ in batch:
+            self._queue.task_done()
+
+    def stats(self) -> Dict[str, float]:
+        """Rows written per second since start, flush latency and queue depth."""
+        latencies = sorted(self._latencies)
+        elapsed = time.perf_counter() - self._since
+        return {
+            "rows": self.rows,
+            "failed": self.failed,
+            "lock_retries": self.retries,
+            "batches": self.batches,
+            "queued": self._queue.qsize(),
+            "full_waits": self.waits,
+            "rows_per_sec": round(self.rows / elapsed, 1) if elapsed else 0.0,
+            "flush_ms_mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "flush_ms_p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else 0.0,
+        }
+
+
+_buffers: Dict[str, WriteBuffer] = {}
+_buffersLock = threading.Lock()
+
+
+def get_write_buffer(table: str) -> WriteBuffer:
+    """The process-wide buffer for a table, started on first use and flushed at exit."""
+    table = table.lower()
+    with _buffersLock:
+        if table not in _buffers or not _buffers[table].is_alive():
+            if not _buffers:
+                atexit.register(close_write_buffers)
+            _buffers[table] = WriteBuffer(get_repository(table))
+            _buffers[table].start()
+        return _buffers[table]
+
+
+def close_write_buffers() -> None:
+    """Flushes and stops every buffer. Registered with atexit."""
+    with _buffersLock:
+        buffers = list(_buffers.values())
+    for buffer in buffers:
+        buffer.close()
+
+
+if __name__ == "__main__":
+    import sqlite3
+    import tempfile
+    from pathlib import Path
+
+    from app.data.changes import create_changelog
+    from app.data.repository import INCIDENTS
+    from app.data.schema import create_cyber_incidents_table, create_datasets_metadata_table, create_it_tickets_table
+    from app.data.status_history import create_status_history_tables
+
+    path = Path(tempfile.mkdtemp()) / "bench.db"
+    setup = sqlite3.connect(str(path))
+    for create in (create_cyber_incidents_table, create_it_tickets_table, create_datasets_metadata_table,
+                   create_status_history_tables, create_changelog):
+        create(setup)
+    setup.close()
+    connect = lambda: sqlite3.connect(str(path))
+    n = 5000
+
+    def row(i):
+        return (i, "2025-01-01", "Phishing", "High", "Open")
+
+    conn = connect()
+    start = time.perf_counter()
+    for i in range(n):
+        INCIDENTS.insert(row(i), conn)
+    perRow = time.perf_counter() - start
+    conn.close()
+    print("one commit per row: {:.0f} rows/s".format(n / perRow))
+
+    buffer = WriteBuffer(INCIDENTS, connect=connect)
+    buffer.start()
+    start = time.perf_counter()
+    for i in range(n, 2 * n):
+        buffer.put(row(i))
+    buffer.flush()
+    buffered = time.perf_counter() - start
+    buffer.close()
+    print("write-behind buffer: {:.0f} rows/s".format(n / buffered), buffer.stats())
@@ -0,0 +1,226 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, Sequence
+
+import numpy as np
+
+from app.data.db import connect_database
+from app.models.dataset import Dataset
+from app.models.it_ticket import ITTicket
+from app.models.security_incident import SecurityIncident
+
+
+class CategoryColumn:
+    """
+    Dictionary-encoded string column: one small integer code per row plus
+    the distinct values once. Repeated strings cost one byte per row.
+    """
+    __slots__ = ("codes", "categories")
+
+    def __init__(self, codes: np.ndarray, categories: np.ndarray):
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def from_values(cls, values) -> "CategoryColumn":
+        values = np.asarray(values, dtype=object)
+        values[values == None] = ""  # noqa: E711 - elementwise comparison
+        categories, codes = np.unique(values.astype(str), return_inverse=True)
+        dtype = np.int8 if len(categories) < 128 else np.int32
+        return cls(codes.astype(dtype), categories.astype(object))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def lookup(self, table: Dict[str, float], default: float = 0, dtype=np.int16) -> np.ndarray:
+        """Maps every row through a {lower-case value: number} table in one pass."""
+        perCategory = np.array([table.get(str(c).lower(), default) for c in self.categories], dtype=dtype)
+        return perCategory[self.codes] if len(perCategory) else np.zeros(len(self.codes), dtype=dtype)
+
+    def isin(self, values) -> np.ndarray:
+        """Boolean mask of rows whose value is one of values."""
+        wanted = np.isin(self.categories, list(values))
+        return wanted[self.codes] if len(wanted) else np.zeros(len(self.codes), dtype=bool)
+
+    def counts(self) -> Dict[str, int]:
+        totals = np.bincount(self.codes, minlength=len(self.categories))
+        return {c: int(n) for c, n in zip(self.categories, totals) if n}
+
+    def take(self, selector) -> "CategoryColumn":
+        return CategoryColumn(self.codes[selector], self.categories)
+
+    def decode(self) -> np.ndarray:
+        return self.categories[self.codes]
+
+
+def _convert(kind: str, values):
+    """Turns a sequence of Python values into the column's array type."""
+    if kind == "category":
+        return CategoryColumn.from_values(values)
+    if kind == "int":
+        return np.asarray(values, dtype=np.int64)
+    if kind == "float":
+        return np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+    if kind == "date":
+        return np.asarray(values, dtype="datetime64[s]").astype("datetime64[D]")
+    if kind == "datetime":
+        return np.asarray(values, dtype="datetime64[s]")
+    return np.asarray(values, dtype=object)
+
+
+def _from_arrow_column(kind: str, column):
+    """Converts one pyarrow column, reusing its buffers where the types allow."""
+    import pyarrow as pa
+
+    array = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if kind == "category":
+        if not pa.types.is_dictionary(array.type):
+            array = array.dictionary_encode()
+        indices = array.indices
+        categories = array.dictionary.to_numpy(zero_copy_only=False).astype(object)
+        categories[categories == None] = ""  # noqa: E711 - elementwise comparison
+        if indices.null_count:
+            # A missing value is the empty string, as in CategoryColumn.from_values
+            blank = np.flatnonzero(categories == "")
+            if not len(blank):
+                categories = np.append(categories, "")
+                blank = [len(categories) - 1]
+            indices = indices.cast(pa.int32()).fill_null(int(blank[0]))
+        return CategoryColumn(indices.to_numpy(zero_copy_only=False), categories)
+    if kind in ("int", "float", "date", "datetime") and array.null_count == 0:
+        try:
+            return array.to_numpy(zero_copy_only=True)
+        except pa.ArrowInvalid:
+            pass  # e.g. date32 has to be widened to datetime64[D]
+    return array.to_numpy(zero_copy_only=False)
+
+
+class ColumnBatch(ABC):
+    """
+    Many records of one table held column by column in NumPy arrays,
+    instead of one Python object per record.
+    Subclasses set TABLE and SCHEMA, a tuple of (column, kind) pairs where
+    kind is int, float, date, datetime, category or text.
+    """
+    __slots__ = ("_columns",)
+    TABLE = ""
+    SCHEMA: Sequence[tuple] = ()
+
+    def __init__(self, columns: Dict[str, object]):
+        self._columns = columns
+
+    def __len__(self) -> int:
+        if not self.SCHEMA:
+            return 0
+        return len(self._columns[self.SCHEMA[0][0]])
+
+    def __getitem__(self, name: str):
+        return self._columns[name]
+
+    @classmethod
+    def column_names(cls):
+        return [name for name, _ in cls.SCHEMA]
+
+    @classmethod
+    def from_rows(cls, rows) -> "ColumnBatch":
+        """Builds a batch from row tuples in SCHEMA order, e.g. a cursor's fetchall()."""
+        rows = list(rows)
+        columns = list(zip(*rows)) if rows else [()] * len(cls.SCHEMA)
+        return cls({name: _convert(kind, values) for (name, kind), values in zip(cls.SCHEMA, columns)})
+
+    @classmethod
+    def from_arrow(cls, table) -> "ColumnBatch":
+        """
+        Builds a batch from a pyarrow Table or RecordBatch without copying
+        numeric, date and dictionary-index buffers that have no nulls.
+        """
+        return cls({name: _from_arrow_column(kind, table.column(name)) for name, kind in cls.SCHEMA})
+
+    @classmethod
+    def from_query(cls, where: str = "", params=(), conn=None) -> "ColumnBatch":
+        """Loads the batch's columns for every row of TABLE matching an optional WHERE clause."""
+        sql = "SELECT {} FROM {}".format(", ".join(cls.column_names()), cls.TABLE)
+        if where:
+            sql += " WHERE " + where
+        ownConnection = conn is None
+        conn = conn or connect_database()
+        rows = conn.execute(sql, tuple(params)).fetchall()
+        if ownConnection:
+            conn.close()
+        return cls.from_rows(rows)
+
+    def filter(self, selector) -> "ColumnBatch":
+        """A new batch with only the rows picked by a boolean mask or index array."""
+        return type(self)({name: (col.take(selector) if isinstance(col, CategoryColumn) else col[selector])
+                           for name, col in self._columns.items()})
+
+    def column_values(self, name: str) -> np.ndarray:
+        column = self._columns[name]
+        return column.decode() if isinstance(column, CategoryColumn) else column
+
+    @abstractmethod
+    def to_objects(self) -> Iterator[object]:
+        """Yields one model object per row, only as they are needed."""
+
+
+class IncidentBatch(ColumnBatch):
+    """Columnar view of cyber_incidents."""
+    __slots__ = ()
+    TABLE = "cyber_incidents"
+    SCHEMA = (("id", "int"), ("date", "date"), ("incident_type", "category"),
+              ("severity", "category"), ("status", "category"))
+
+    def severity_levels(self) -> np.ndarray:
+        """Vectorised SecurityIncident.get_severity_level() for every row."""
+        return self._columns["severity"].lookup(SecurityIncident.SEVERITY_LEVELS)
+
+    def open_mask(self) -> np.ndarray:
+        return ~self._columns["status"].isin(SecurityIncident.CLOSED_STATUSES)
+
+    def to_objects(self):
+        ids, dates = self._columns["id"], self._columns["date"]
+        types, severities, statuses = (self.column_values(c) for c in ("incident_type", "severity", "status"))
+        for i in range(len(self)):
+            yield SecurityIncident.from_row((int(ids[i]), str(dates[i]), types[i], severities[i], statuses[i]))
+
+
+class TicketBatch(ColumnBatch):
+    """Columnar view of IT_Tickets."""
+    __slots__ = ()
+    TABLE = "IT_Tickets"
+    SCHEMA = (("id", "int"), ("ticket_id", "text"), ("subject", "category"),
+              ("priority", "category"), ("status", "category"), ("created_date", "date"))
+
+    def priority_levels(self) -> np.ndarray:
+        return self._columns["priority"].lookup(ITTicket.PRIORITY_LEVELS)
+
+    def open_mask(self) -> np.ndarray:
+        return ~self._columns["status"].isin(ITTicket.CLOSED_STATUSES)
+
+    def to_objects(self):
+        ids, ticketIds = self._columns["id"], self._columns["ticket_id"]
+        subjects, priorities, statuses = (self.column_values(c) for c in ("subject", "priority", "status"))
+        for i in range(len(self)):
+            yield ITTicket.from_row((int(ids[i]), ticketIds[i], subjects[i], priorities[i], statuses[i]))
+
+
+class DatasetBatch(ColumnBatch):
+    """Columnar view of Datasets_Metadata."""
+    __slots__ = ()
+    TABLE = "Datasets_Metadata"
+    SCHEMA = (("id", "int"), ("dataset_name", "text"), ("category", "category"),
+              ("file_size_mb", "float"), ("created_at", "datetime"))
+
+    def size_bytes(self) -> np.ndarray:
+        return (np.nan_to_num(self._columns["file_size_mb"]) * Dataset.BYTES_PER_MB).astype(np.int64)
+
+    def size_by_category(self) -> Dict[str, float]:
+        category = self._columns["category"]
+        totals = np.bincount(category.codes, weights=np.nan_to_num(self._columns["file_size_mb"]),
+                             minlength=len(category.categories))
+        return {c: float(t) for c, t in zip(category.categories, totals)}
+
+    def to_objects(self):
+        ids, names, sizes = self._columns["id"], self._columns["dataset_name"], self._columns["file_size_mb"]
+        categories = self.column_values("category")
+        for i in range(len(self)):
+            yield Dataset.from_row((int(ids[i]), names[i], categories[i], float(sizes[i])))
@@ -1,15 +1,28 @@
 class Dataset:
     """Represents a data science dataset in the platform."""
+    __slots__ = ("__id", "__name", "__size_bytes", "__rows", "__source")
+
+    BYTES_PER_MB = 1024 * 1024
+
     def __init__(self, dataset_id: int, name: str, size_bytes: int, rows: int, source: str):
         self.__id = dataset_id
         self.__name = name
         self.__size_bytes = size_bytes
         self.__rows = rows
         self.__source = source
+
+    @classmethod
+    def from_row(cls, row) -> "Dataset":
+        """
+        Builds a dataset from a Datasets_Metadata row (id, dataset_name, category, file_size_mb, ...).
+        The category is used as the source and the row count is unknown (0).
+        """
+        return cls(row[0], row[1], int((row[3] or 0) * cls.BYTES_PER_MB), 0, row[2])
+
     def calculate_size_mb(self) -> float:
-        return self.__size_bytes / (1024 * 1024)
+        return self.__size_bytes / self.BYTES_PER_MB
     def get_source(self) -> str:
         return self.__source
     def __str__(self) -> str:
         size_mb = self.calculate_size_mb()
-        return f"Dataset {self.__id}: {self.__name} - Size: {size_mb:.2f} MB, Rows: {self.__rows}, Source: {self.__source}"
\ No newline at end of file
+        return f"Dataset {self.__id}: {self.__name} - Size: {size_mb:.2f} MB, Rows: {self.__rows}, Source: {self.__source}"
@@ -1,19 +1,39 @@
 class ITTicket:
     """Represents an IT support ticket."""
+    __slots__ = ("__id", "__title", "__priority", "__status", "__assigned_to")
+
+    PRIORITY_LEVELS = {
+        "low": 1,
+        "medium": 2,
+        "high": 3,
+        "critical": 4,
+    }
+    CLOSED_STATUSES = frozenset({"Closed", "Resolved"})
+
     def __init__(self, ticket_id: int, title: str, priority: str, status: str, assigned_to: str):
         self.__id = ticket_id
         self.__title = title
         self.__priority = priority
         self.__status = status
         self.__assigned_to = assigned_to
+
+    @classmethod
+    def from_row(cls, row) -> "ITTicket":
+        """Builds a ticket from an IT_Tickets row (id, ticket_id, subject, priority, status, ...)."""
+        return cls(row[1], row[2], row[3], row[4], "Unassigned")
+
     def assign_to(self, staff: str) -> None:
         self.__assigned_to = staff
     def close_ticket(self) -> None:
         self.__status = "Closed"
     def get_status(self) -> str:
         return self.__status
+    def get_priority_level(self) -> int:
+        return self.PRIORITY_LEVELS.get(self.__priority.lower(), 0)
+    def is_open(self) -> bool:
+        return self.__status not in self.CLOSED_STATUSES
     def __str__(self) -> str:
         return (
         f"Ticket {self.__id}: {self.__title} "
         f"- Priority: {self.__priority}, Status: {self.__status}, "
-        f"Assigned to: {self.__assigned_to}")
\ No newline at end of file
+        f"Assigned to: {self.__assigned_to}")
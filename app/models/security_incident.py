@@ -1,11 +1,28 @@
 class SecurityIncident:
     """Represents a cybersecurity incident in the platform."""
+    __slots__ = ("__id", "__incident_type", "__severity", "__status", "__description")
+
+    # Shared by every instance instead of being rebuilt on each call
+    SEVERITY_LEVELS = {
+        "low": 1,
+        "medium": 2,
+        "high": 3,
+        "critical": 4,
+    }
+    CLOSED_STATUSES = frozenset({"Closed", "Resolved"})
+
     def __init__(self, incident_id: int, incident_type: str, severity: str, status: str, description: str):
         self.__id = incident_id
         self.__incident_type = incident_type
         self.__severity = severity
         self.__status = status
         self.__description = description
+
+    @classmethod
+    def from_row(cls, row) -> "SecurityIncident":
+        """Builds an incident from a cyber_incidents row (id, date, incident_type, severity, status, ...)."""
+        return cls(row[0], row[2], row[3], row[4], "Reported on {}".format(row[1]))
+
     def get_id(self) -> int:
         return self.__id
         
@@ -22,13 +39,7 @@ class SecurityIncident:
     
     def get_severity_level(self) -> int:
         """Return an integer severity level (simple example)."""
-        mapping = {
-        "low": 1,
-        "medium": 2,
-        "high": 3,
-        "critical": 4,
-        }
-        return mapping.get(self.__severity.lower(), 0)
+        return self.SEVERITY_LEVELS.get(self.__severity.lower(), 0)
     
     def __str__(self) -> str:
         return f"Incident {self.__id}: {self.__incident_type} - Severity: {self.__severity}, Status: {self.__status}"
@@ -1,10 +1,18 @@
 class User:
     """Represents a user in the Multi-Domain Intelligence Platform.
     """
+    __slots__ = ("__username", "__password_hash", "__role")
+
     def __init__(self, username: str, password_hash: str, role: str):
         self.__username = username
         self.__password_hash = password_hash
         self.__role = role
+
+    @classmethod
+    def from_row(cls, row) -> "User":
+        """Builds a user from a users row (id, username, password_hash, role)."""
+        return cls(row[1], row[2], row[3])
+
     def get_username(self) -> str:
         return self.__username 
     def get_role(self) -> str:
@@ -16,4 +24,4 @@ class User:
         """
         return hasher.check_password(plain_password, self.__password_hash)
     def __str__(self) -> str:
-        return f"User({self.__username}, role={self.__role})"
\ No newline at end of file
+        return f"User({self.__username}, role={self.__role})"
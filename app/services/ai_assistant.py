@@ -1,23 +1,356 @@
-from typing import List, Dict
+import os
+import random
+from abc import ABC, abstractmethod
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+Message = Dict[str, Any]
+
+
+class AssistantBusyError(RuntimeError):
+    """Raised when no request slot frees up within the queue timeout."""
+
+
+class ChatBackend(ABC):
+    """
+    Interface for the model provider behind AIAssistant.
+    open_stream() must connect and return an iterator of text pieces;
+    anything it raises before returning may be retried.
+    """
+
+    @abstractmethod
+    def open_stream(self, messages: List[Message], model: str, timeout: float) -> Iterator[str]:
+        """Connects and returns an iterator of the reply's text pieces."""
+
+    @abstractmethod
+    def complete(self, messages: List[Message], model: str, timeout: float,
+                 tools: Optional[List[Dict[str, Any]]] = None) -> Message:
+        """Returns the whole assistant message as a dict, including any "tool_calls"."""
+
+    def open_turn(self, messages: List[Message], model: str, timeout: float,
+                  tools: Optional[List[Dict[str, Any]]] = None):
+        """
+        One model turn that may call tools. Returns (message, None) when the
+        model calls tools, else (None, iterator of text pieces). Backends that
+        can stream tool calls override this; here it falls back to complete().
+        """
+        reply = self.complete(messages, model, timeout, tools)
+        if reply.get("tool_calls"):
+            return reply, None
+        return None, iter([reply.get("content") or ""])
+
+    def is_retryable(self, error: Exception) -> bool:
+        return False
+
+    def close(self) -> None:
+        pass
+
+
+class OpenAIBackend(ChatBackend):
+    """
+    OpenAI chat completions over one pooled, keep-alive HTTP client.
+    Point base_url at app.services.llm_stub_server to run without a key.
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 max_connections: int = 20, keepalive_expiry: float = 30.0):
+        import httpx
+        import openai
+
+        self._openai = openai
+        self._http = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections,
+                                keepalive_expiry=keepalive_expiry))
+        # Retries are done by AIAssistant so they can use jitter and share the limit
+        self._client = openai.OpenAI(api_key=api_key, base_url=base_url,
+                                     http_client=self._http, max_retries=0)
+
+    def open_stream(self, messages, model, timeout):
+        completion = self._client.chat.completions.create(
+            model=model, messages=messages, stream=True, timeout=timeout)
+        return self._pieces(completion)
+
+    def complete(self, messages, model, timeout, tools=None):
+        extra = {"tools": tools} if tools else {}
+        response = self._client.chat.completions.create(
+            model=model, messages=messages, timeout=timeout, **extra)
+        return response.choices[0].message.model_dump(exclude_none=True)
+
+    def open_turn(self, messages, model, timeout, tools=None):
+        """
+        Streams the turn: tool call deltas are collected until the stream
+        ends, while a text answer is handed back as soon as it starts.
+        """
+        extra = {"tools": tools} if tools else {}
+        completion = self._client.chat.completions.create(
+            model=model, messages=messages, stream=True, timeout=timeout, **extra)
+        calls = {}
+        chunks = iter(completion)
+        try:
+            for chunk in chunks:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                for part in delta.tool_calls or ():
+                    call = calls.setdefault(part.index, {"id": "", "type": "function",
+                                                         "function": {"name": "", "arguments": ""}})
+                    call["id"] = part.id or call["id"]
+                    if part.function is not None:
+                        call["function"]["name"] += part.function.name or ""
+                        call["function"]["arguments"] += part.function.arguments or ""
+                if delta.content and not calls:
+                    return None, self._pieces(completion, first=delta.content, chunks=chunks)
+        except BaseException:
+            completion.close()
+            raise
+        completion.close()
+        if calls:
+            return {"role": "assistant", "tool_calls": [calls[i] for i in sorted(calls)]}, None
+        return None, iter([])
+
+    @staticmethod
+    def _pieces(completion, first: Optional[str] = None, chunks=None):
+        """Text pieces of a stream; first and chunks resume one open_turn() has started reading."""
+        try:
+            if first:
+                yield first
+            for chunk in chunks or completion:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            completion.close()
+
+    def is_retryable(self, error):
+        retryable = (self._openai.APIConnectionError, self._openai.RateLimitError,
+                     self._openai.InternalServerError)
+        return isinstance(error, retryable)
+
+    def close(self):
+        self._http.close()
+
+
+class StubBackend(ChatBackend):
+    """In-process fake that echoes the last user message. No network is used."""
+
+    def __init__(self, first_token_delay: float = 0.0, token_delay: float = 0.0):
+        self._first_token_delay = first_token_delay
+        self._token_delay = token_delay
+
+    def open_stream(self, messages, model, timeout):
+        time.sleep(self._first_token_delay)
+        lastUser = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        return self._pieces("[AI reply to]: " + lastUser[:50])
+
+    def complete(self, messages, model, timeout, tools=None):
+        return {"role": "assistant", "content": "".join(self.open_stream(messages, model, timeout))}
+
+    def open_turn(self, messages, model, timeout, tools=None):
+        return None, self.open_stream(messages, model, timeout)
+
+    def _pieces(self, text):
+        for word in text.split(" "):
+            time.sleep(self._token_delay)
+            yield word + " "
+
+
+class ReplyStream:
+    """
+    Iterator over a reply's text pieces that holds a request slot. The slot
+    is released once the pieces run out or fail, on close(), or when an
+    unread stream is garbage collected, so a dropped reply cannot leak it.
+    """
+
+    def __init__(self, pieces: Iterator[str], release: Callable[[], None]):
+        self._pieces = iter(pieces)
+        self._release = release
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> "ReplyStream":
+        return self
+
+    def __next__(self) -> str:
+        try:
+            return next(self._pieces)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        with self._lock:
+            release, self._release = self._release, None
+        if release is not None:
+            try:
+                closePieces = getattr(self._pieces, "close", None)
+                if closePieces is not None:
+                    closePieces()
+            finally:
+                release()
+
+    def __del__(self):
+        self.close()
+
+
 class AIAssistant:
-    """Simple wrapper around an AI/chat model.
-    In your real project, connect this to OpenAI or another provider.
     """
-    def __init__(self, system_prompt: str = "You are a helpful assistant."):
+    Process-wide chat client shared by every page and session.
+    Holds one backend (and so one connection pool) and applies a per-request
+    timeout, retries with jittered backoff and a limit on concurrent requests.
+    """
+
+    def __init__(self, backend: ChatBackend, system_prompt: str = "You are a helpful assistant.",
+                 model: str = "gpt-4o-mini", timeout: float = 30.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_cap: float = 8.0,
+                 max_concurrent: int = 8, queue_timeout: float = 60.0, max_tool_rounds: int = 3):
+        self._backend = backend
         self._system_prompt = system_prompt
-        self._history: List[Dict[str, str]] = []
-    def set_system_prompt(self, prompt: str) :
+        self._model = model
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_cap = backoff_cap
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._queue_timeout = queue_timeout
+        self._max_tool_rounds = max_tool_rounds
+
+    @property
+    def backend(self) -> ChatBackend:
+        return self._backend
+
+    def set_system_prompt(self, prompt: str):
         self._system_prompt = prompt
-    def send_message(self, user_message: str) :
-        """Send a message and get a (fake) response.
-        Replace this body with your real API call.
-        """
-        self._history.append({"role": "user", "content": user_message})
-        # Fake response for now:
-        response = f"[AI reply to]: {user_message[:50]}"
-        self._history.append({"role": "assistant", "content": response})
-        return response
-    def clear_history(self):
-        """Clear the chat history."""
-        self._history.clear()
 
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: a random wait up to the exponential backoff for this attempt."""
+        return random.uniform(0, min(self._backoff_cap, self._backoff_base * (2 ** attempt)))
+
+    def _with_retries(self, request: Callable[[], Any]) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return request()
+            except Exception as error:
+                if attempt >= self._max_retries or not self._backend.is_retryable(error):
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+
+    def _run_tools(self, messages: List[Message], model: str, tools, tool_handler):
+        """
+        Lets the model call tools until it answers in text.
+        Returns (messages including tool results, the streamed text answer, or
+        None if the round limit was hit and a final answer still has to be
+        requested).
+        """
+        for _ in range(self._max_tool_rounds):
+            reply, pieces = self._with_retries(
+                lambda: self._backend.open_turn(messages, model, self._timeout, tools))
+            if pieces is not None:
+                return messages, pieces
+            calls = reply["tool_calls"]
+            results = [{"role": "tool", "tool_call_id": call["id"],
+                        "content": tool_handler(call["function"]["name"], call["function"]["arguments"])}
+                       for call in calls]
+            messages = messages + [reply] + results
+        return messages, None
+
+    def stream_chat(self, messages: List[Message], model: Optional[str] = None,
+                    tools: Optional[List[Dict[str, Any]]] = None,
+                    tool_handler: Optional[Callable[[str, str], str]] = None) -> "ReplyStream":
+        """
+        Opens a streamed reply for the given messages and returns it as a
+        ReplyStream, which holds the request slot until it is read to the end
+        or closed.
+        If tools are given, tool_handler(name, arguments_json) runs the model's
+        tool calls and the answer that follows is streamed instead.
+        """
+        model = model or self._model
+
+        # 1. Wait for a free request slot
+        if not self._slots.acquire(timeout=self._queue_timeout):
+            raise AssistantBusyError("Too many assistant requests in progress, try again shortly.")
+
+        # 2. Resolve tool calls, then connect (retrying transient failures)
+        try:
+            if tools:
+                messages, answer = self._run_tools(messages, model, tools, tool_handler)
+                if answer is not None:
+                    return ReplyStream(answer, self._slots.release)
+            pieces = self._with_retries(
+                lambda: self._backend.open_stream(messages, model, self._timeout))
+        except Exception:
+            self._slots.release()
+            raise
+        return ReplyStream(pieces, self._slots.release)
+
+    def send_message(self, user_message: str, history: Optional[List[Message]] = None) -> str:
+        """Send a message and return the complete reply."""
+        messages = [{"role": "system", "content": self._system_prompt}]
+        messages += (history or []) + [{"role": "user", "content": user_message}]
+        return "".join(self.stream_chat(messages))
+
+    def close(self):
+        self._backend.close()
+
+
+_assistant: Optional[AIAssistant] = None
+_assistantLock = threading.Lock()
+
+
+def get_assistant(api_key: Optional[str] = None,
+                  backend_factory: Optional[Callable[[], ChatBackend]] = None) -> AIAssistant:
+    """
+    Returns the shared AIAssistant, creating it on first use.
+    The backend is OpenAI unless LLM_BACKEND=stub is set; OPENAI_BASE_URL
+    points the OpenAI backend at another server such as the local stub.
+    """
+    global _assistant
+    with _assistantLock:
+        if _assistant is None:
+            if backend_factory is not None:
+                backend = backend_factory()
+            elif os.environ.get("LLM_BACKEND") == "stub":
+                backend = StubBackend()
+            else:
+                backend = OpenAIBackend(api_key, base_url=os.environ.get("OPENAI_BASE_URL"))
+            _assistant = AIAssistant(backend)
+        return _assistant
+
+
+def reset_assistant() -> None:
+    """Close and drop the shared assistant, e.g. to switch backends."""
+    global _assistant
+    with _assistantLock:
+        if _assistant is not None:
+            _assistant.close()
+            _assistant = None
+
+
+if __name__ == "__main__":
+    # Shared pooled client against the local stub server vs a new client per request
+    from concurrent.futures import ThreadPoolExecutor
+    from app.services.llm_stub_server import start_stub_server
+
+    server, baseUrl = start_stub_server(first_token_delay=0.01)
+    messages = [{"role": "user", "content": "How many phishing incidents are open?"}]
+    requests = 200
+
+    def fresh_client_request(_):
+        assistant = AIAssistant(OpenAIBackend("stub", base_url=baseUrl))
+        try:
+            return "".join(assistant.stream_chat(messages))
+        finally:
+            assistant.close()
+
+    shared = AIAssistant(OpenAIBackend("stub", base_url=baseUrl))
+    for label, work in (("New client per request", fresh_client_request),
+                        ("Shared pooled client", lambda _: "".join(shared.stream_chat(messages)))):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(work, range(requests)))
+        elapsed = time.perf_counter() - start
+        print("{:<24} {} requests in {:.2f}s ({:.1f} ms each)".format(
+            label, requests, elapsed, elapsed * 1000 / requests))
+    shared.close()
+    server.shutdown()
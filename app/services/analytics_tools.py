@@ -0,0 +1,187 @@
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, List
+
+import app.data.datasets as dt
+import app.data.incidents as incidents
+import app.data.tickets as tickets
+from app.data.db import get_data_version
+
+# domain -> (data module, table name, groupable/filterable columns, what a row is called)
+DOMAINS: Dict[str, tuple] = {
+    "cyber": (incidents, "cyber_incidents", incidents.INCIDENT_COLUMNS, "incidents"),
+    "it": (tickets, "it_tickets", tickets.TICKET_COLUMNS, "IT tickets"),
+    "datasets": (dt, "datasets_metadata", dt.METADATA_COLUMNS, "datasets"),
+}
+
+MAX_TOP_N = 50
+MAX_TABLE_ROWS = 60  # Longer results are cut, with a note, to keep the model turn short
+
+
+class ToolArgumentError(ValueError):
+    """Raised when the model calls a tool with invalid arguments."""
+
+
+def _table(headers: List[str], rows) -> str:
+    """Formats rows as a compact pipe separated table."""
+    rows = list(rows)
+    lines = ["|".join(headers)]
+    lines += ["|".join(str(v) for v in row) for row in rows[:MAX_TABLE_ROWS]]
+    if len(rows) > MAX_TABLE_ROWS:
+        lines.append("... {} more rows".format(len(rows) - MAX_TABLE_ROWS))
+    return "\n".join(lines)
+
+
+class AnalyticsTools:
+    """
+    Read-only analytic functions one assistant may call, exposed as OpenAI tools.
+    Arguments are validated against a column whitelist, every call is a single
+    aggregate query, and results are cached until the table is written to.
+    """
+
+    def __init__(self, domain: str, cache_size: int = 256):
+        self._module, self._table, self._columns, self._noun = DOMAINS[domain]
+        self._cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._handlers: Dict[str, Callable[..., str]] = {
+            "count_records": self._count_records,
+            "count_by_column": self._count_by_column,
+            "count_over_time": self._count_over_time,
+            "top_values": self._top_values,
+        }
+
+    # --- Tool definitions -------------------------------------------------
+
+    def specs(self) -> List[Dict[str, Any]]:
+        """Tool definitions in the OpenAI chat completions format."""
+        filters = {
+            "type": "object",
+            "description": "Exact-match conditions, e.g. {\"status\": \"Open\"}. Values are case sensitive.",
+            "properties": {c: {"type": "string"} for c in self._columns},
+            "additionalProperties": False,
+        }
+        dateRange = {
+            "start": {"type": "string", "description": "Inclusive start date, YYYY-MM-DD"},
+            "end": {"type": "string", "description": "Exclusive end date, YYYY-MM-DD"},
+        }
+        column = {"type": "string", "enum": list(self._columns)}
+
+        def tool(name, description, properties, required=()):
+            return {"type": "function", "function": {
+                "name": name, "description": description,
+                "parameters": {"type": "object", "properties": properties,
+                               "required": list(required), "additionalProperties": False}}}
+
+        return [
+            tool("count_records", "Count {} matching filters and an optional date range.".format(self._noun),
+                 {"filters": filters, **dateRange}),
+            tool("count_by_column", "Count {} grouped by one column.".format(self._noun),
+                 {"column": column, "filters": filters, **dateRange}, ["column"]),
+            tool("count_over_time", "Count {} per day, week or month.".format(self._noun),
+                 {"period": {"type": "string", "enum": ["day", "week", "month"]},
+                  "filters": filters, **dateRange}, ["period"]),
+            tool("top_values", "The n most common values of a column among {}.".format(self._noun),
+                 {"column": column, "n": {"type": "integer", "minimum": 1, "maximum": MAX_TOP_N},
+                  "filters": filters}, ["column"]),
+        ]
+
+    def instructions(self) -> str:
+        """Text for the system prompt telling the model when to use the tools."""
+        return ("\n\nFor questions about counts, trends or rankings of {}, call the analytic "
+                "tools instead of estimating. Today's date is {}.".format(self._noun, date.today()))
+
+    # --- Validation -------------------------------------------------------
+
+    def _filters(self, filters) -> Dict[str, str]:
+        if filters is None:
+            return {}
+        if not isinstance(filters, dict):
+            raise ToolArgumentError("filters must be an object")
+        for key, value in filters.items():
+            if key not in self._columns:
+                raise ToolArgumentError("Unknown filter column '{}'".format(key))
+            if not isinstance(value, str):
+                raise ToolArgumentError("Filter values must be strings")
+        return filters
+
+    def _column(self, column) -> str:
+        if column not in self._columns:
+            raise ToolArgumentError("column must be one of: " + ", ".join(self._columns))
+        return column
+
+    @staticmethod
+    def _date(value):
+        if value is None:
+            return None
+        try:
+            return date.fromisoformat(str(value)).isoformat()
+        except ValueError:
+            raise ToolArgumentError("Dates must be YYYY-MM-DD, got '{}'".format(value))
+
+    # --- Tools ------------------------------------------------------------
+
+    def _count_records(self, filters=None, start=None, end=None):
+        count = self._module.count_between(self._date(start), self._date(end), self._filters(filters))
+        return _table(["count"], [(count,)])
+
+    def _count_by_column(self, column, filters=None, start=None, end=None):
+        rows = self._module.count_by(self._column(column), self._filters(filters),
+                                     start=self._date(start), end=self._date(end))
+        return _table([column, "count"], rows)
+
+    def _count_over_time(self, period, filters=None, start=None, end=None):
+        if period not in ("day", "week", "month"):
+            raise ToolArgumentError("period must be day, week or month")
+        rows = self._module.count_by_period(period, self._filters(filters), self._date(start), self._date(end))
+        return _table([period, "count"], rows)
+
+    def _top_values(self, column, n=10, filters=None):
+        if not isinstance(n, int) or not 1 <= n <= MAX_TOP_N:
+            raise ToolArgumentError("n must be an integer from 1 to {}".format(MAX_TOP_N))
+        return _table([column, "count"], self._module.count_by(self._column(column), self._filters(filters), n))
+
+    def call(self, name: str, arguments: str) -> str:
+        """
+        Runs one tool call from the model and returns its result as text.
+        Invalid calls return an error message for the model instead of raising.
+        """
+        if name not in self._handlers:
+            return "error: unknown tool '{}'".format(name)
+        try:
+            args = json.loads(arguments or "{}")
+            if not isinstance(args, dict):
+                raise ToolArgumentError("arguments must be an object")
+        except (ValueError, ToolArgumentError) as error:
+            return "error: {}".format(error)
+
+        key = (name, json.dumps(args, sort_keys=True), get_data_version(self._table))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        try:
+            result = self._handlers[name](**args)
+        except (TypeError, ToolArgumentError, ValueError) as error:
+            return "error: {}".format(error)
+
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+
+_tools: Dict[str, AnalyticsTools] = {}
+_toolsLock = threading.Lock()
+
+
+def get_analytics_tools(domain: str) -> AnalyticsTools:
+    """Returns the shared tool set for a domain ("cyber", "it" or "datasets")."""
+    with _toolsLock:
+        if domain not in _tools:
+            _tools[domain] = AnalyticsTools(domain)
+        return _tools[domain]
@@ -0,0 +1,212 @@
+import csv
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.data.db import connect_database, notify_change
+from app.models.dataset import Dataset
+
+# Directory walked for data files, overridable with CATALOG_DIR. Kept apart from
+# DATA itself so the app's own database, CSV sources and Parquet snapshots are not catalogued.
+CATALOG_DIR = Path(os.environ.get("CATALOG_DIR", str(Path("DATA") / "catalog")))
+EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+CHUNK_BYTES = 8 * 1024 * 1024
+SNIFF_BYTES = 64 * 1024
+# Below this many files the pool costs more than it saves
+MIN_PARALLEL_FILES = 4
+
+
+def scan_file(path: Path):
+    """
+    One pass over the file through mmap: returns (newline count, ends with a
+    newline, blake2b hex digest) without reading it into Python objects.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    size = path.stat().st_size
+    if size == 0:
+        return 0, True, digest.hexdigest()
+    newlines = 0
+    with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for offset in range(0, size, CHUNK_BYTES):
+            chunk = mapped[offset:offset + CHUNK_BYTES]
+            newlines += chunk.count(b"\n")
+            digest.update(chunk)
+        endsWithNewline = mapped[size - 1:size] == b"\n"
+    return newlines, endsWithNewline, digest.hexdigest()
+
+
+def _head(path: Path) -> str:
+    with open(path, "rb") as handle:
+        return handle.read(SNIFF_BYTES).decode("utf-8", errors="replace")
+
+
+def _csv_columns(path: Path) -> Optional[int]:
+    head = _head(path)
+    firstLine = head.splitlines()[0] if head else ""
+    if not firstLine:
+        return None
+    try:
+        dialect = csv.Sniffer().sniff(head[:SNIFF_BYTES // 4], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    return len(next(csv.reader([firstLine], dialect)))
+
+
+def _jsonl_columns(path: Path) -> Optional[int]:
+    for line in _head(path).splitlines():
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return None
+            return len(record) if isinstance(record, dict) else None
+    return None
+
+
+def profile_file(path) -> Dict[str, object]:
+    """
+    Size, row count, column count and checksum of one data file.
+    CSV rows are lines after the header (quoted newlines are not special-cased),
+    JSONL rows are lines, Parquet rows and columns come from the file footer.
+    Runs in a worker process, so it only takes and returns plain values.
+    """
+    path = Path(path)
+    stat = path.stat()
+    kind = EXTENSIONS[path.suffix.lower()]
+    newlines, endsWithNewline, checksum = scan_file(path)
+    lines = newlines + (0 if endsWithNewline else 1)
+    rows = columns = None
+    if kind == "csv":
+        rows, columns = max(lines - 1, 0), _csv_columns(path)
+    elif kind == "jsonl":
+        rows, columns = lines, _jsonl_columns(path)
+    else:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            pass
+        else:
+            metadata = pq.ParquetFile(path).metadata
+            rows, columns = metadata.num_rows, metadata.num_columns
+    return {"path": str(path), "size_bytes": stat.st_size, "mtime": stat.st_mtime,
+            "rows": rows, "columns": columns, "checksum": checksum}
+
+
+def find_files(directory: Path = CATALOG_DIR) -> List[Path]:
+    return sorted(p for p in Path(directory).rglob("*") if p.is_file() and p.suffix.lower() in EXTENSIONS)
+
+
+def _profiled(conn) -> Dict[str, tuple]:
+    """source_path -> (size_bytes, file_mtime) for every file profiled before."""
+    return {row[0]: (row[1], row[2]) for row in conn.execute(
+        "SELECT source_path, size_bytes, file_mtime FROM Datasets_Metadata WHERE source_path IS NOT NULL")}
+
+
+def _save(conn, profiles, directory: Path) -> None:
+    """Upserts one row per file; new rows are named by their path under directory."""
+    now = datetime.now().isoformat(" ", "seconds")
+    conn.executemany("""
+        INSERT INTO Datasets_Metadata
+            (dataset_name, category, file_size_mb, source_path, size_bytes, row_count, column_count,
+             checksum, file_mtime, profiled_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (source_path) WHERE source_path IS NOT NULL DO UPDATE SET
+            file_size_mb = excluded.file_size_mb,
+            size_bytes = excluded.size_bytes,
+            row_count = excluded.row_count,
+            column_count = excluded.column_count,
+            checksum = excluded.checksum,
+            file_mtime = excluded.file_mtime,
+            profiled_at = excluded.profiled_at
+    """, [(Path(p["path"]).relative_to(directory).as_posix(), Path(p["path"]).parent.name,
+           round(p["size_bytes"] / Dataset.BYTES_PER_MB, 2), p["path"], p["size_bytes"], p["rows"], p["columns"], p["checksum"], p["mtime"], now)
+          for p in profiles])
+    conn.commit()
+
+
+def _remove(conn, paths) -> None:
+    """Deletes the rows of files that no longer exist."""
+    conn.executemany("DELETE FROM Datasets_Metadata WHERE source_path = ?", [(p,) for p in paths])
+    conn.commit()
+
+
+def profile_catalog(directory: Path = CATALOG_DIR, workers: Optional[int] = None, force: bool = False) -> Dict[str, object]:
+    """
+    Profiles every data file under directory and writes the results to
+    Datasets_Metadata, one row per file keyed by source_path.
+    Files whose size and mtime match the last run are skipped unless force,
+    and rows for files under directory that are gone are deleted.
+    Returns counts of files profiled, skipped and removed, and the elapsed seconds.
+    """
+    started = datetime.now()
+    conn = connect_database()
+    profiled = _profiled(conn)
+    known = {} if force else profiled
+    files = find_files(directory)
+    # A missing directory (e.g. an unmounted share) is not taken to mean every file was deleted
+    seen = {str(path) for path in files}
+    removed = [p for p in profiled if p not in seen and Path(p).is_relative_to(directory)] \
+        if Path(directory).is_dir() else []
+    todo = []
+    for path in files:
+        stat = path.stat()
+        previous = known.get(str(path))
+        if previous is None or previous[0] != stat.st_size or previous[1] != stat.st_mtime:
+            todo.append(path)
+
+    if len(todo) >= MIN_PARALLEL_FILES and workers != 1:
+        # spawn, not fork: forking the multi-threaded Streamlit server can deadlock the children
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            profiles = list(pool.map(profile_file, todo, chunksize=max(1, len(todo) // 32)))
+    else:
+        profiles = [profile_file(path) for path in todo]
+
+    if profiles:
+        _save(conn, profiles, Path(directory))
+    if removed:
+        _remove(conn, removed)
+    conn.close()
+    if profiles or removed:
+        notify_change("datasets_metadata", "load")
+    return {"profiled": len(profiles), "skipped": len(files) - len(profiles), "removed": len(removed),
+            "seconds": (datetime.now() - started).total_seconds()}
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(description="Profile data files into Datasets_Metadata")
+    parser.add_argument("directory", nargs="?", default=str(CATALOG_DIR))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--benchmark", action="store_true", help="time serial vs pool on generated files")
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        print(profile_catalog(Path(args.directory), args.workers, args.force))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            line = b"2024-01-01,Phishing,High,Open,some free text describing the event\n"
+            for i in range(16):
+                with open(Path(tmp) / "feed_{}.csv".format(i), "wb") as handle:
+                    handle.write(b"date,type,severity,status,notes\n" + line * 400000)
+            files = find_files(Path(tmp))
+            start = time.perf_counter()
+            serial = [profile_file(p) for p in files]
+            middle = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                parallel = list(pool.map(profile_file, files))
+            end = time.perf_counter()
+            assert serial == parallel
+            total = sum(p["size_bytes"] for p in serial) / Dataset.BYTES_PER_MB
+            print("{} files, {:.0f} MB: serial {:.2f} s, pool {:.2f} s ({} rows each)".format(
+                len(files), total, middle - start, end - middle, serial[0]["rows"]))
@@ -0,0 +1,173 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import numpy as np
+
+# Assumed plot width when the browser's is unknown, and points drawn per pixel
+CHART_WIDTH_PX = 1000
+POINTS_PER_PX = 1.0
+# Width of the main column of Streamlit's centered page layout; the dashboards
+# draw their line charts at exactly this width and reduce to it
+CENTERED_LAYOUT_PX = 704
+# Series of more than this many raw points are drawn with WebGL
+WEBGL_THRESHOLD = 2000
+FIGURE_CACHE_SIZE = 64
+
+
+def target_points(width_px: int = CHART_WIDTH_PX, points_per_px: float = POINTS_PER_PX) -> int:
+    return max(int(width_px * points_per_px), 3)
+
+
+def _as_numeric(x: np.ndarray) -> np.ndarray:
+    """Datetimes become int64 nanoseconds so distances can be computed."""
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb(x, y, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of threshold points that keep the
+    visual shape of the series. Keeps the first and last point; from every
+    bucket in between keeps the point forming the largest triangle with the
+    previously kept point and the next bucket's average.
+    """
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    xs = _as_numeric(x)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        nextStart, nextEnd = end, edges[i + 2] if i + 2 < len(edges) else n
+        avgX = xs[nextStart:nextEnd].mean() if nextEnd > nextStart else xs[-1]
+        avgY = y[nextStart:nextEnd].mean() if nextEnd > nextStart else y[-1]
+        area = np.abs((xs[previous] - avgX) * (y[start:end] - y[previous])
+                      - (xs[previous] - xs[start:end]) * (avgY - y[previous]))
+        previous = start + int(area.argmax())
+        keep[i + 1] = previous
+    return keep
+
+
+def minmax(y, threshold: int) -> np.ndarray:
+    """
+    Indices of the minimum and maximum of each of threshold / 2 equal buckets,
+    in order. Cheaper than LTTB and never hides a spike.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    size = int(np.diff(edges).max())
+    # Pad every bucket to the same width so arg-min/max run as one 2-D operation
+    index = np.minimum(edges[:-1, None] + np.arange(size), edges[1:, None] - 1)
+    values = y[index]
+    keep = np.concatenate([index[np.arange(buckets), values.argmin(axis=1)],
+                           index[np.arange(buckets), values.argmax(axis=1)]])
+    return np.unique(keep)
+
+
+def reduce_series(x, y, width_px: int = CHART_WIDTH_PX, method: str = "lttb"):
+    """
+    Returns (x, y) cut down to about one point per pixel of chart width.
+    Date strings on the x axis are parsed to datetime64 first; points whose
+    date is missing or malformed are dropped rather than failing the chart.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if x.dtype.kind in "OU":
+        import pandas as pd
+
+        x = pd.to_datetime(pd.Series(x, dtype=object), errors="coerce", format="ISO8601").to_numpy()
+        valid = ~np.isnat(x)
+        x, y = x[valid], y[valid]
+    threshold = target_points(width_px)
+    if len(y) <= threshold:
+        return x, y
+    keep = lttb(x, y, threshold) if method == "lttb" else minmax(y, threshold)
+    return x[keep], y[keep]
+
+
+def line_figure(x, y, title: str = "", labels=None, width_px: int = CHART_WIDTH_PX, method: str = "lttb"):
+    """
+    A plotly line figure of the reduced series, drawn with Scattergl when the
+    raw series has more than WEBGL_THRESHOLD points.
+    """
+    import plotly.graph_objects as go
+
+    labels = labels or {}
+    trace = go.Scattergl if len(y) > WEBGL_THRESHOLD else go.Scatter
+    x, y = reduce_series(x, y, width_px, method)
+    fig = go.Figure(trace(x=x, y=y, mode="lines"))
+    fig.update_layout(title=title, xaxis_title=labels.get("x", "x"), yaxis_title=labels.get("y", "y"))
+    return fig
+
+
+class FigureCache:
+    """
+    Small LRU of built figures keyed by (query, params, data version), so a
+    rerun with unchanged data reuses the figure instead of rebuilding it.
+    """
+
+    def __init__(self, size: int = FIGURE_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._figures: "OrderedDict[tuple, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str, params: Hashable, version: Hashable, build: Callable[[], object]):
+        key = (query, params, version)
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return self._figures[key]
+        figure = build()
+        with self._lock:
+            self.misses += 1
+            self._figures[key] = figure
+            while len(self._figures) > self.size:
+                self._figures.popitem(last=False)
+        return figure
+
+
+_figureCache = FigureCache()
+
+
+def get_figure_cache() -> FigureCache:
+    return _figureCache
+
+
+if __name__ == "__main__":
+    import json
+    import time
+
+    rng = np.random.default_rng(0)
+    days = np.arange("2000-01-01", "2025-01-01", dtype="datetime64[D]")
+    counts = rng.poisson(20, size=len(days)).astype(np.float64)
+    counts[rng.integers(0, len(days), 20)] += 150
+    for method in ("lttb", "minmax"):
+        start = time.perf_counter()
+        x, y = reduce_series(days, counts, method=method)
+        elapsed = time.perf_counter() - start
+        print("{}: {} -> {} points in {:.1f} ms, spikes kept {}/{}".format(
+            method, len(days), len(x), elapsed * 1000, int((y > 100).sum()), int((counts > 100).sum())))
+
+    full = line_figure(days, counts, width_px=len(days))
+    reduced = line_figure(days, counts)
+    print("Figure JSON: {} KB full ({}), {} KB reduced ({})".format(
+        len(json.dumps(full.to_plotly_json(), default=str)) // 1024, type(full.data[0]).__name__,
+        len(json.dumps(reduced.to_plotly_json(), default=str)) // 1024, type(reduced.data[0]).__name__))
+
+    cache = get_figure_cache()
+    for _ in range(3):
+        start = time.perf_counter()
+        cache.get("series", (), 1, lambda: line_figure(days, counts))
+        print("figure: {:.2f} ms".format((time.perf_counter() - start) * 1000))
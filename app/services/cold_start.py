@@ -0,0 +1,66 @@
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+# Entry points measured, and the modules that should not be loaded before login
+ENTRY_POINTS = ("home.py", "pages/Overview.py", "pages/Cyber_Analytics.py", "pages/IT_Tickets.py",
+                "pages/Datasets_Metadata.py")
+HEAVY_MODULES = ("pandas", "plotly.express", "openai", "pyarrow")
+
+# Runs in a fresh interpreter so nothing is already imported or cached
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+ready = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+painted = time.perf_counter()
+print(json.dumps({
+    "streamlit_s": ready - start,
+    "first_paint_s": painted - start,
+    "script_s": painted - ready,
+    "heavy": [m for m in sys.argv[2:] if m in sys.modules],
+    "exceptions": [e.value for e in app.exception],
+}))
+"""
+
+
+def measure_cold_start(script: str) -> Dict[str, object]:
+    """
+    Time to first paint of one entry point for a logged-out visitor, from a
+    cold interpreter: importing Streamlit, then the script's first run.
+    """
+    result = subprocess.run([sys.executable, "-c", _PROBE, script, *HEAVY_MODULES],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def cold_start_report(scripts=ENTRY_POINTS, runs: int = 3) -> List[Dict[str, object]]:
+    """Median of runs cold starts per entry point."""
+    report = []
+    for script in scripts:
+        samples = [measure_cold_start(script) for _ in range(runs)]
+        report.append({
+            "script": script,
+            "first_paint_s": round(statistics.median(s["first_paint_s"] for s in samples), 3),
+            "script_s": round(statistics.median(s["script_s"] for s in samples), 3),
+            "heavy": samples[-1]["heavy"],
+            "exceptions": samples[-1]["exceptions"],
+        })
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time to first paint of the Streamlit entry points (run from the project root).")
+    parser.add_argument("scripts", nargs="*", default=list(ENTRY_POINTS))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for row in cold_start_report(args.scripts, args.runs):
+        print("{:<30} first paint {:>6.3f} s  script {:>6.3f} s  heavy modules: {}{}".format(
+            row["script"], row["first_paint_s"], row["script_s"], ", ".join(row["heavy"]) or "none",
+            "  exceptions: {}".format(row["exceptions"]) if row["exceptions"] else ""))
@@ -0,0 +1,189 @@
+import re
+import time
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional, fall back to a character estimate
+    tiktoken = None
+
+
+def _load_encoder(model: str):
+    """Return a tiktoken encoder for the model, or None if unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+class TokenCounter:
+    """Counts tokens locally so request sizes are known before sending."""
+
+    # Per-message overhead used by the chat format (role, separators)
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self._encoder = _load_encoder(model)
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoder is not None:
+            return len(self._encoder.encode(text))
+        # Roughly 4 characters per token for English text
+        return max(1, (len(text) + 3) // 4)
+
+    def count_message(self, message: Dict[str, str]) -> int:
+        return self.MESSAGE_OVERHEAD + self.count_text(message.get("content", ""))
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        # The reply is primed with 3 tokens
+        return 3 + sum(self.count_message(m) for m in messages)
+
+
+def _first_sentence(text: str, max_words: int) -> str:
+    """Return the first sentence of text, cut to max_words."""
+    text = " ".join(text.split())
+    sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    words = sentence.split()
+    if len(words) > max_words:
+        return " ".join(words[:max_words]) + "..."
+    return sentence
+
+
+class ConversationContext:
+    """
+    Builds the message list sent to the model for one chat history.
+    Keeps the most recent turns that fit in token_budget and folds older
+    turns into a running summary appended to the system prompt.
+    """
+
+    def __init__(self, system_prompt: str, token_budget: int = 1500,
+                 summary_budget: int = 300, model: str = "gpt-4o-mini",
+                 summary_words: int = 25):
+        self._system_prompt = system_prompt
+        self._token_budget = token_budget
+        self._summary_budget = summary_budget
+        self._summary_words = summary_words
+        self._counter = TokenCounter(model)
+        self._summary_lines: List[str] = []
+        self._summarised = 0  # Number of history messages already in the summary
+        self._request_start: Optional[float] = None
+        self.last_stats: Dict[str, float] = {}
+
+    @property
+    def counter(self) -> TokenCounter:
+        return self._counter
+
+    def set_system_prompt(self, prompt: str) -> None:
+        self._system_prompt = prompt
+
+    def reset(self) -> None:
+        """Forget the running summary, e.g. when the chat is cleared."""
+        self._summary_lines.clear()
+        self._summarised = 0
+        self.last_stats = {}
+
+    def summary(self) -> str:
+        return "\n".join(self._summary_lines)
+
+    def _summarise(self, messages: List[Dict[str, str]]) -> None:
+        """Compress evicted turns into one line each and trim to the summary budget."""
+        for message in messages:
+            if message["role"] == "system":
+                continue
+            speaker = "User" if message["role"] == "user" else "Assistant"
+            self._summary_lines.append(
+                "- {}: {}".format(speaker, _first_sentence(message["content"], self._summary_words)))
+
+        # Drop the oldest summary lines once the summary outgrows its budget
+        while (len(self._summary_lines) > 1
+               and self._counter.count_text(self.summary()) > self._summary_budget):
+            self._summary_lines.pop(0)
+
+    def _system_message(self) -> Dict[str, str]:
+        content = self._system_prompt
+        if self._summary_lines:
+            content += "\n\nSummary of the earlier conversation:\n" + self.summary()
+        return {"role": "system", "content": content}
+
+    def build(self, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Returns the messages to send for the given history.
+        The newest message is always kept, even if it alone exceeds the budget.
+        """
+        # 1. If the history was cleared or replaced, start over
+        if self._summarised > len(history):
+            self.reset()
+
+        # 2. Walk backwards through unsummarised turns while they fit the budget
+        # (the summary budget is reserved up front so the summary can still grow)
+        remaining = (self._token_budget - self._summary_budget
+                     - self._counter.count_message({"role": "system", "content": self._system_prompt}))
+        start = len(history)
+        while start > self._summarised:
+            cost = self._counter.count_message(history[start - 1])
+            if cost > remaining and start < len(history):
+                break
+            remaining -= cost
+            start -= 1
+
+        # 3. Fold everything older than the window into the running summary
+        if start > self._summarised:
+            self._summarise(history[self._summarised:start])
+            self._summarised = start
+
+        window = [m for m in history[start:] if m["role"] != "system"]
+        messages = [self._system_message()] + window
+
+        full = [{"role": "system", "content": self._system_prompt}] + history
+        self.last_stats = {
+            "full_tokens": self._counter.count_messages(full),
+            "sent_tokens": self._counter.count_messages(messages),
+            "window_messages": len(window),
+            "summarised_messages": self._summarised,
+        }
+        return messages
+
+    def mark_request(self) -> None:
+        """Call right before the request is sent, to time the first token."""
+        self._request_start = time.perf_counter()
+
+    def mark_first_token(self) -> None:
+        """Call when the first streamed chunk arrives."""
+        if self._request_start is not None:
+            self.last_stats["ttft_ms"] = (time.perf_counter() - self._request_start) * 1000
+            self._request_start = None
+
+    def describe(self) -> str:
+        """One line summary of the last request, for display under the chat."""
+        stats = self.last_stats
+        if not stats:
+            return ""
+        text = "Context: {} tokens sent (full history {}), {} recent messages, {} summarised".format(
+            stats["sent_tokens"], stats["full_tokens"],
+            stats["window_messages"], stats["summarised_messages"])
+        if "ttft_ms" in stats:
+            text += ", first token after {:.0f} ms".format(stats["ttft_ms"])
+        return text
+
+
+if __name__ == "__main__":
+    # Compare request size with and without the context manager on a long chat
+    context = ConversationContext("You are an expert in office related cyber incidents.")
+    history: List[Dict[str, str]] = []
+    fullTotal = sentTotal = 0
+    for turn in range(100):
+        history.append({"role": "user", "content": "Question {} about phishing and malware incidents. ".format(turn) * 8})
+        context.build(history)
+        fullTotal += context.last_stats["full_tokens"]
+        sentTotal += context.last_stats["sent_tokens"]
+        history.append({"role": "assistant", "content": "Answer {} with some detail on containment. ".format(turn) * 20})
+
+    print("Turns: 100")
+    print("Last request  - full: {} tokens, sent: {} tokens".format(
+        context.last_stats["full_tokens"], context.last_stats["sent_tokens"]))
+    print("All requests  - full: {} tokens, sent: {} tokens ({:.1%})".format(
+        fullTotal, sentTotal, sentTotal / fullTotal))
@@ -0,0 +1,146 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.data.changes import latest_sequence
+from app.data.db import connect_database, get_data_version
+
+# (table, date column, breakdown column) for each side of the comparison.
+# The *_all views include rows the retention job has moved to archive tables.
+INCIDENT_SERIES = ("cyber_incidents_all", "date", "incident_type")
+TICKET_SERIES = ("it_tickets_all", "created_date", "subject")
+
+
+def bucket_counts(series: Tuple[str, str, str], bucket_days: int, conn):
+    """
+    Counts rows per (time bucket, value) in SQL. Buckets are numbered
+    julianday / bucket_days, so two tables bucketed the same way line up.
+    Returns (distinct values, then bucket number, value index and count per (bucket, value) cell).
+    """
+    table, dateColumn, keyColumn = series
+    rows = conn.execute("""
+        SELECT CAST(julianday({0}) / ? AS INTEGER) AS bucket, {1}, COUNT(*)
+        FROM {2} WHERE julianday({0}) IS NOT NULL
+        GROUP BY bucket, {1}
+    """.format(dateColumn, keyColumn, table), (bucket_days,)).fetchall()
+    if not rows:
+        return np.array([], dtype=object), np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([])
+    buckets = np.array([r[0] for r in rows], dtype=np.int64)
+    keys, keyIndex = np.unique(np.array([str(r[1]) for r in rows], dtype=object), return_inverse=True)
+    counts = np.array([r[2] for r in rows], dtype=np.float64)
+    return keys, buckets, keyIndex, counts
+
+
+def _matrix(buckets, keyIndex, counts, first: int, length: int, width: int) -> np.ndarray:
+    matrix = np.zeros((length, width), dtype=np.float64)
+    np.add.at(matrix, (buckets - first, keyIndex), counts)
+    return matrix
+
+
+def lagged_correlation(x: np.ndarray, y: np.ndarray, max_lag: int) -> np.ndarray:
+    """
+    Pearson correlation between every column of x and every column of y with
+    y shifted by -max_lag..max_lag buckets. A positive lag means y follows x.
+    Returns an array of shape (2 * max_lag + 1, x columns, y columns).
+    """
+    n = x.shape[0]
+    result = np.zeros((2 * max_lag + 1, x.shape[1], y.shape[1]))
+    for i, lag in enumerate(range(-max_lag, max_lag + 1)):
+        a = x[max(-lag, 0):n - max(lag, 0)]
+        b = y[max(lag, 0):n - max(-lag, 0)]
+        if len(a) < 3:
+            continue
+        a = a - a.mean(axis=0)
+        b = b - b.mean(axis=0)
+        norm = np.outer(np.sqrt((a * a).sum(axis=0)), np.sqrt((b * b).sum(axis=0)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result[i] = np.nan_to_num((a.T @ b) / norm)
+    return result
+
+
+class CorrelationResult:
+    """Lagged correlations between incident types (rows) and ticket subjects (columns)."""
+    __slots__ = ("incident_types", "subjects", "lags", "matrix", "buckets")
+
+    def __init__(self, incident_types, subjects, lags, matrix, buckets):
+        self.incident_types = incident_types
+        self.subjects = subjects
+        self.lags = lags
+        self.matrix = matrix
+        self.buckets = buckets
+
+    def at_lag(self, lag: int) -> np.ndarray:
+        return self.matrix[list(self.lags).index(lag)]
+
+    def strongest(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Per pair, the correlation at the lag with the largest magnitude and that lag."""
+        best = np.abs(self.matrix).argmax(axis=0)
+        rows, cols = np.indices(best.shape)
+        return self.matrix[best, rows, cols], np.asarray(self.lags)[best]
+
+    def top_pairs(self, k: int = 10):
+        """The k (incident type, subject, correlation, lag) pairs with the strongest correlation."""
+        values, lags = self.strongest()
+        order = np.argsort(-np.abs(values), axis=None)[:k]
+        rows, cols = np.unravel_index(order, values.shape)
+        return [(self.incident_types[r], self.subjects[c], float(values[r, c]), int(lags[r, c]))
+                for r, c in zip(rows, cols)]
+
+
+_cache: Dict[tuple, CorrelationResult] = {}
+_cacheLock = threading.Lock()
+
+
+def get_correlations(bucket_days: int = 7, max_lag: int = 4) -> Optional[CorrelationResult]:
+    """
+    Incident/ticket correlations over shared time buckets, cached until either
+    table is written to (in this process or, via the changelog, any other).
+    Returns None if either table is empty.
+    """
+    version = (get_data_version("cyber_incidents", "it_tickets"), latest_sequence())
+    key = (bucket_days, max_lag)
+    with _cacheLock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    conn = connect_database()
+    incidentTypes, *incCells = bucket_counts(INCIDENT_SERIES, bucket_days, conn)
+    subjects, *tkCells = bucket_counts(TICKET_SERIES, bucket_days, conn)
+    incBuckets, tkBuckets = incCells[0], tkCells[0]
+    conn.close()
+    if not len(incBuckets) or not len(tkBuckets):
+        return None
+
+    first = int(min(incBuckets.min(), tkBuckets.min()))
+    length = int(max(incBuckets.max(), tkBuckets.max())) - first + 1
+    x = _matrix(*incCells, first, length, len(incidentTypes))
+    y = _matrix(*tkCells, first, length, len(subjects))
+    result = CorrelationResult(list(incidentTypes), list(subjects), list(range(-max_lag, max_lag + 1)),
+                               lagged_correlation(x, y, max_lag), length)
+    with _cacheLock:
+        _cache[key] = (version, result)
+    return result
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    x = rng.poisson(5, size=(520, 10)).astype(np.float64)
+    y = rng.poisson(5, size=(520, 15)).astype(np.float64)
+    y[2:, 4] += x[:-2, 1]  # subject 4 follows type 1 two buckets later
+    start = time.perf_counter()
+    corr = lagged_correlation(x, y, 8)
+    print("10 x 15 pairs, 17 lags over 520 buckets: {:.1f} ms".format((time.perf_counter() - start) * 1000))
+    lag, row, col = np.unravel_index(np.abs(corr).argmax(), corr.shape)
+    print("Strongest: type {} / subject {} at lag {} (r={:.2f})".format(row, col, lag - 8, corr[lag, row, col]))
+
+    for attempt in ("cold", "cached"):
+        start = time.perf_counter()
+        result = get_correlations()
+        print("{}: {:.1f} ms".format(attempt, (time.perf_counter() - start) * 1000))
+    if result:
+        for pair in result.top_pairs(5):
+            print("  {} / {}: r={:.2f} at lag {}".format(*pair))
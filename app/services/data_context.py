@@ -0,0 +1,124 @@
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+import app.data.datasets as dt
+import app.data.incidents as incidents
+import app.data.tickets as tickets
+from app.data.db import get_data_version
+from app.services.context_manager import TokenCounter
+
+
+def _format_counts(rows, limit=None) -> str:
+    rows = rows[:limit] if limit else rows
+    return ", ".join("{} {}".format(value, count) for value, count in rows)
+
+
+def _trend_line(label: str, counter: Callable[[str, str], int], latest) -> str:
+    """Compares the last 7 days of data with the 7 days before, ending at the latest date."""
+    if not latest:
+        return ""
+    end = date.fromisoformat(str(latest)[:10]) + timedelta(days=1)
+    week = timedelta(days=7)
+    recent = counter(str(end - week), str(end))
+    previous = counter(str(end - 2 * week), str(end - week))
+    return "{} in the 7 days to {}: {} (previous 7 days: {}, change {:+d})".format(
+        label, end - timedelta(days=1), recent, previous, recent - previous)
+
+
+def _cyber_lines() -> List[str]:
+    bySeverity = incidents.count_by("severity")
+    return [
+        "Total incidents: {}".format(sum(c for _, c in bySeverity)),
+        "By severity: " + _format_counts(bySeverity),
+        "By status: " + _format_counts(incidents.count_by("status")),
+        "Open by severity: " + _format_counts(incidents.count_by("severity", {"status": "Open"})),
+        _trend_line("Incidents", incidents.count_between, incidents.latest_date()),
+        "By type: " + _format_counts(incidents.count_by("incident_type")),
+    ]
+
+
+def _it_lines() -> List[str]:
+    byStatus = tickets.count_by("status")
+    return [
+        "Total tickets: {}".format(sum(c for _, c in byStatus)),
+        "By status: " + _format_counts(byStatus),
+        "By priority: " + _format_counts(tickets.count_by("priority")),
+        "Top subjects: " + _format_counts(tickets.count_by("subject", limit=5)),
+        _trend_line("Tickets", tickets.count_between, tickets.latest_date()),
+        "Open by priority: " + _format_counts(tickets.count_by("priority", {"status": "Open"})),
+    ]
+
+
+def _dataset_lines() -> List[str]:
+    bySize = dt.size_by_category()
+    return [
+        "Total datasets: {}, total size {:.0f} MB".format(
+            sum(r[1] for r in bySize), sum(r[2] or 0 for r in bySize)),
+        "Size by category (MB): " + ", ".join("{} {:.0f}".format(r[0], r[2] or 0) for r in bySize),
+        "Datasets by category: " + _format_counts(dt.count_by("category")),
+        _trend_line("New datasets", dt.count_between, dt.latest_date()),
+    ]
+
+
+# domain -> (table the summary is built from, heading, line builder)
+DOMAINS: Dict[str, tuple] = {
+    "cyber": ("cyber_incidents", "Current cyber incident data", _cyber_lines),
+    "it": ("it_tickets", "Current IT ticket data", _it_lines),
+    "datasets": ("datasets_metadata", "Current dataset catalogue", _dataset_lines),
+}
+
+
+class DataContextProvider:
+    """
+    Compact, cached summary of one domain's live data for the assistant's
+    system prompt. Only aggregate queries are run, never raw rows, and the
+    summary is rebuilt only after a write to the table (or after ttl seconds,
+    to pick up writes made by other processes).
+    """
+
+    def __init__(self, domain: str, max_tokens: int = 250, ttl: float = 300.0):
+        self._table, self._heading, self._builder = DOMAINS[domain]
+        self._max_tokens = max_tokens
+        self._ttl = ttl
+        self._counter = TokenCounter()
+        self._lock = threading.Lock()
+        self._version = None
+        self._builtAt = 0.0
+        self._text = ""
+
+    def _fit(self, lines: List[str]) -> str:
+        """Keeps lines, in priority order, while the summary fits the token budget."""
+        kept = [self._heading + ":"]
+        for line in lines:
+            if line and self._counter.count_text("\n".join(kept + [line])) <= self._max_tokens:
+                kept.append(line)
+        return "\n".join(kept)
+
+    def summary(self) -> str:
+        with self._lock:
+            version = get_data_version(self._table)
+            fresh = time.monotonic() - self._builtAt < self._ttl
+            if version != self._version or not fresh:
+                self._text = self._fit(self._builder())
+                self._version = version
+                self._builtAt = time.monotonic()
+            return self._text
+
+    def system_prompt(self, base_prompt: str) -> str:
+        """The base prompt with the data summary appended."""
+        return "{}\n\nAnswer using this live platform data where relevant:\n{}".format(
+            base_prompt, self.summary())
+
+
+_providers: Dict[str, DataContextProvider] = {}
+_providersLock = threading.Lock()
+
+
+def get_data_context(domain: str) -> DataContextProvider:
+    """Returns the shared provider for a domain ("cyber", "it" or "datasets")."""
+    with _providersLock:
+        if domain not in _providers:
+            _providers[domain] = DataContextProvider(domain)
+        return _providers[domain]
@@ -0,0 +1,440 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.data.db import connect_database
+from app.data.repository import INCIDENTS, TICKETS, TableRepository
+
+LEVELS = ("Critical", "High", "Medium", "Low")
+
+# path -> (repository, {field: rule}); rule is "int", "date", "text" or a tuple of allowed values.
+# Fields are listed in the repository's fields order.
+INGEST_SOURCES = {
+    "/ingest/incidents": (INCIDENTS, {"id": "int", "date": "date", "incident_type": "text",
+                                      "severity": LEVELS, "status": "text"}),
+    "/ingest/tickets": (TICKETS, {"ticket_id": "text", "subject": "text", "priority": LEVELS,
+                                  "status": "text", "created_date": "date"}),
+}
+
+BATCH_LINES = 1000       # Records validated and written per transaction
+MAX_REQUESTS = 4         # Requests streamed at once; others wait for a slot
+SLOT_WAIT_SECONDS = 2.0  # How long a request waits for a slot before a 503
+MAX_LINE_BYTES = 64 * 1024
+
+
+def validate_batch(lines: List[bytes], rules: Dict[str, object]) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Parses a batch of NDJSON lines and checks every field of every record
+    column by column. Returns the records with normalised values and, per
+    record, an error message or None.
+    """
+    # 1. Parse; unparseable lines become empty records with an error
+    records, errors = [], []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        records.append(record if isinstance(record, dict) else {})
+        errors.append(None if isinstance(record, dict) else "not a JSON object")
+    frame = pd.DataFrame.from_records(records, columns=list(rules))
+    errors = pd.Series(errors, dtype=object)
+
+    # 2. One vectorised check per field, keeping the first error found for a record
+    for field, rule in rules.items():
+        values = frame[field]
+        if rule == "int":
+            numbers = pd.to_numeric(values, errors="coerce")
+            # Outside int64 the cast below would raise, so such ids are rejected here
+            bad = numbers.isna() | (numbers % 1 != 0) | (numbers < -2 ** 63) | (numbers >= 2 ** 63)
+            frame[field] = numbers.where(~bad).astype("Int64")
+        elif rule == "date":
+            dates = pd.to_datetime(values.astype("string"), format="%Y-%m-%d", errors="coerce")
+            bad = dates.isna()
+            frame[field] = dates.dt.strftime("%Y-%m-%d")
+        elif rule == "text":
+            text = values.astype("string").str.strip()
+            bad = text.isna() | (text.str.len() == 0)
+            frame[field] = text
+        else:
+            bad = ~values.isin(rule)
+        message = "{} is missing or invalid".format(field) if rule in ("int", "date", "text") \
+            else "{} must be one of {}".format(field, ", ".join(rule))
+        errors = errors.where(errors.notna() | ~bad.to_numpy(), message)
+
+    # 3. The same key twice in one batch: keep the first
+    key = next(iter(rules))
+    repeated = frame[key].duplicated() & errors.isna()
+    errors = errors.where(~repeated, "duplicate {} in batch".format(key))
+    return frame, errors
+
+
+class IngestServer:
+    """
+    Accepts NDJSON batches of incidents and tickets over HTTP and streams
+    back one NDJSON result line per record, then a summary line.
+
+    POST /ingest/incidents or /ingest/tickets, one JSON object per line
+    (Content-Length or chunked body). GET /health returns counters.
+
+    Records are read, validated and written BATCH_LINES at a time, and the
+    next batch is only read once the previous one is written and its results
+    sent, so a fast client is held back by TCP flow control. At most
+    MAX_REQUESTS requests stream at once; the rest wait briefly for a slot and
+    then get 503 with Retry-After. All writes go through one writer thread,
+    SQLite only allowing one writer anyway.
+    """
+
+    def __init__(self, max_requests: int = MAX_REQUESTS, batch_lines: int = BATCH_LINES, connect=connect_database):
+        self.max_requests = max_requests
+        self.batch_lines = batch_lines
+        self.connect = connect
+        self.counters = {"requests": 0, "busy": 0, "records": 0, "accepted": 0, "rejected": 0, "active": 0}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+        self._local = threading.local()
+
+    # --- Writes (writer thread) ---------------------------------------------
+
+    def _write_batch(self, repository: TableRepository, rules, lines: List[bytes]) -> List[dict]:
+        """Validates a batch, drops keys that already exist and inserts the rest in one transaction."""
+        if not hasattr(self._local, "conn"):
+            self._local.conn = self.connect()
+        conn = self._local.conn
+        frame, errors = validate_batch(lines, rules)
+
+        # 1. Keys already in the table or its archives
+        key = repository.key
+        candidates = frame.loc[errors.isna().to_numpy(), key].tolist()
+        existing = repository.existing_keys(candidates, conn)
+        if existing:
+            errors = errors.where(errors.notna() | ~frame[key].isin(existing).to_numpy(), "{} already exists".format(key))
+
+        # 2. One transaction for the valid rows; row by row only if that fails
+        valid = errors.isna().to_numpy()
+        rows = list(frame.loc[valid, list(rules)].itertuples(index=False, name=None))
+        rows = [tuple(v.item() if hasattr(v, "item") else v for v in row) for row in rows]
+        try:
+            repository.insert_many(rows, conn)
+        except Exception:
+            failed = {}
+            for row in rows:
+                try:
+                    repository.insert_many([row], conn)
+                except Exception as error:
+                    failed[row[0]] = str(error)
+            if failed:
+                errors = errors.where(errors.notna() | ~frame[key].isin(list(failed)).to_numpy(),
+                                      frame[key].map(failed))
+
+        keys = frame[key].astype(object).where(frame[key].notna(), None).tolist()
+        return [{"status": "ok", "key": k} if e is None else {"status": "rejected", "key": k, "error": e}
+                for k, e in zip(keys, errors.tolist())]
+
+    # --- HTTP ---------------------------------------------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, path, headers = await self._read_head(reader)
+            if method == "GET" and path == "/health":
+                await self._send_json(writer, 200, self.counters)
+            elif method != "POST" or path not in INGEST_SOURCES:
+                await self._send_json(writer, 404, {"error": "POST /ingest/incidents or /ingest/tickets"})
+            else:
+                await self._ingest(reader, writer, path, headers)
+        except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as error:
+            await self._send_json(writer, 400, {"error": str(error) or "bad request"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _ingest(self, reader, writer, path, headers) -> None:
+        self.counters["requests"] += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), SLOT_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            self.counters["busy"] += 1
+            await self._send_json(writer, 503, {"error": "busy, retry later"}, {"Retry-After": "1"})
+            return
+
+        self.counters["active"] += 1
+        try:
+            repository, rules = INGEST_SOURCES[path]
+            loop = asyncio.get_running_loop()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                         b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+            lineNumber = accepted = 0
+            batch = []
+            try:
+                async for line in self._lines(reader, headers):
+                    if line is not None and line.strip():
+                        batch.append(line)
+                    if batch and (line is None or len(batch) >= self.batch_lines):
+                        try:
+                            results = await loop.run_in_executor(self._writer, self._write_batch,
+                                                                 repository, rules, batch)
+                        except Exception as error:
+                            # Reject this batch but keep the stream (and later batches) going
+                            results = [{"status": "rejected", "key": None, "error": "batch failed: {}".format(error)}
+                                       for _ in batch]
+                        out = []
+                        for result in results:
+                            lineNumber += 1
+                            result["line"] = lineNumber
+                            accepted += result["status"] == "ok"
+                            out.append(json.dumps(result))
+                        await self._send_chunk(writer, "\n".join(out) + "\n")
+                        batch = []
+            except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as error:
+                # The status line is already sent, so report a broken body in the stream
+                await self._send_chunk(writer, json.dumps({"error": str(error) or "bad request body"}) + "\n")
+            rejected = lineNumber - accepted
+            self.counters["records"] += lineNumber
+            self.counters["accepted"] += accepted
+            self.counters["rejected"] += rejected
+            await self._send_chunk(writer, json.dumps({"summary": {"records": lineNumber, "accepted": accepted,
+                                                                   "rejected": rejected}}) + "\n")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            self.counters["active"] -= 1
+            self._slots.release()
+
+    @staticmethod
+    async def _read_head(reader) -> Tuple[str, str, Dict[str, str]]:
+        requestLine = (await reader.readline()).decode("latin-1").split()
+        if len(requestLine) != 3:
+            raise ValueError("bad request line")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return requestLine[0].upper(), requestLine[1].split("?")[0], headers
+
+    @staticmethod
+    async def _lines(reader, headers):
+        """The body's lines, from a Content-Length or a chunked body, then None."""
+        chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        remaining = int(headers.get("content-length", 0))
+        pending = b""
+        while True:
+            if chunked:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                pending += await reader.readexactly(size)
+                await reader.readexactly(2)
+            else:
+                # Read exactly the declared length, so a last line without "\n" does not wait for more
+                if remaining <= 0:
+                    break
+                data = await reader.read(min(remaining, MAX_LINE_BYTES))
+                if not data:
+                    break
+                remaining -= len(data)
+                pending += data
+            if len(pending) > MAX_LINE_BYTES and b"\n" not in pending:
+                raise ValueError("line longer than {} bytes".format(MAX_LINE_BYTES))
+            *complete, pending = pending.split(b"\n")
+            for line in complete:
+                yield line
+        if pending:
+            yield pending
+        yield None
+
+    @staticmethod
+    async def _send_chunk(writer, text: str) -> None:
+        data = text.encode("utf-8")
+        writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+        await writer.drain()  # Waits while the client is slow to read
+
+    @staticmethod
+    async def _send_json(writer, status: int, body: dict, extra: Optional[Dict[str, str]] = None) -> None:
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 503: "Service Unavailable"}
+        data = json.dumps(body).encode("utf-8")
+        head = "HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: close\r\n".format(
+            status, reasons[status], len(data))
+        for name, value in (extra or {}).items():
+            head += "{}: {}\r\n".format(name, value)
+        writer.write(head.encode("latin-1") + b"\r\n" + data)
+        await writer.drain()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8780) -> asyncio.base_events.Server:
+        """Starts listening and returns the asyncio server."""
+        self._slots = asyncio.Semaphore(self.max_requests)
+        return await asyncio.start_server(self._handle, host, port, limit=MAX_LINE_BYTES)
+
+
+def start_ingest_server(host="127.0.0.1", port=0, **options):
+    """
+    Starts the ingestion server on an event loop in a background thread.
+    Returns (ingest, base_url, stop); call stop() to shut it down.
+    """
+    ingest = IngestServer(**options)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    holder = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        holder["server"] = loop.run_until_complete(ingest.serve(host, port))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="ingest-server", daemon=True).start()
+    ready.wait()
+
+    def stop():
+        loop.call_soon_threadsafe(holder["server"].close)
+        loop.call_soon_threadsafe(loop.stop)
+
+    baseUrl = "http://{}:{}".format(host, holder["server"].sockets[0].getsockname()[1])
+    return ingest, baseUrl, stop
+
+
+async def _post_ndjson(host, port, path, records, chunk_records=200):
+    """Sends records as a chunked NDJSON body; returns (status, result lines, seconds)."""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write("POST {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/x-ndjson\r\n"
+                 "Transfer-Encoding: chunked\r\n\r\n".format(path, host).encode("latin-1"))
+
+    async def send():
+        for i in range(0, len(records), chunk_records):
+            data = "".join(json.dumps(r) + "\n" for r in records[i:i + chunk_records]).encode("utf-8")
+            writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    sending = asyncio.ensure_future(send())
+    status = int((await reader.readline()).split()[1])
+    chunked = False
+    while True:
+        header = (await reader.readline()).strip().lower()
+        if not header:
+            break
+        chunked = chunked or header == b"transfer-encoding: chunked"
+    lines = []
+    if chunked:
+        pending = b""
+        while True:
+            size = int((await reader.readline()).strip() or b"0", 16)
+            if size == 0:
+                break
+            pending += (await reader.readexactly(size + 2))[:-2]
+            *complete, pending = pending.split(b"\n")
+            lines.extend(json.loads(line) for line in complete if line.strip())
+    else:
+        try:
+            await reader.read()
+        except ConnectionError:  # A 503 is sent while the body is still being written
+            pass
+    await asyncio.gather(sending, return_exceptions=True)
+    writer.close()
+    return status, lines, time.perf_counter() - start
+
+
+async def run_load_test(base_url: str, clients: int = 8, requests: int = 5, records: int = 2000) -> dict:
+    """
+    Load-test client: clients concurrent senders each post requests NDJSON
+    bodies of records incidents or tickets (alternating). A 503 is retried
+    after a short sleep. Returns throughput and request latency figures.
+    """
+    host, port = base_url.split("//")[1].split(":")
+    port = int(port)
+    base = int(time.time() * 1000) * 1000
+    latencies, busy, counts = [], 0, {"accepted": 0, "rejected": 0}
+
+    def batch(client, request):
+        offset = base + (client * requests + request) * records
+        if request % 2 == 0:
+            return "/ingest/incidents", [{"id": offset + i, "date": "2025-06-01", "incident_type": "Phishing",
+                                          "severity": LEVELS[i % 4], "status": "Open"} for i in range(records)]
+        return "/ingest/tickets", [{"ticket_id": "LT-{}".format(offset + i), "subject": "Password Reset",
+                                    "priority": LEVELS[i % 4], "status": "Open", "created_date": "2025-06-01"}
+                                   for i in range(records)]
+
+    async def client(number):
+        nonlocal busy
+        for request in range(requests):
+            path, body = batch(number, request)
+            while True:
+                status, lines, seconds = await _post_ndjson(host, port, path, body)
+                if status != 503:
+                    break
+                busy += 1
+                await asyncio.sleep(0.5)
+            latencies.append(seconds)
+            summary = lines[-1]["summary"] if lines else {"accepted": 0, "rejected": len(body)}
+            counts["accepted"] += summary["accepted"]
+            counts["rejected"] += summary["rejected"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {"records": clients * requests * records, **counts, "seconds": round(elapsed, 2),
+            "records_per_sec": round(clients * requests * records / elapsed),
+            "request_p50_s": round(latencies[len(latencies) // 2], 3),
+            "request_p95_s": round(latencies[int(len(latencies) * 0.95)], 3), "busy_retries": busy}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="NDJSON ingestion endpoint for incidents and tickets.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--load-test", action="store_true",
+                        help="Run the load-test client against --url, or a server on a scratch database")
+    parser.add_argument("--url", help="Server to load-test, e.g. http://127.0.0.1:8780")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--records", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.load_test:
+        stop = None
+        url = args.url
+        if not url:
+            import sqlite3
+            import tempfile
+            from pathlib import Path
+
+            from app.data.changes import create_changelog
+            from app.data.schema import (create_cyber_incidents_table, create_datasets_metadata_table,
+                                         create_it_tickets_table)
+            from app.data.status_history import create_status_history_tables
+
+            path = Path(tempfile.mkdtemp()) / "ingest.db"
+            setup = sqlite3.connect(str(path))
+            for create in (create_cyber_incidents_table, create_it_tickets_table, create_datasets_metadata_table,
+                           create_status_history_tables, create_changelog):
+                create(setup)
+            setup.close()
+            _, url, stop = start_ingest_server(connect=lambda: sqlite3.connect(str(path)))
+        print(asyncio.run(run_load_test(url, args.clients, args.requests, args.records)))
+        if stop:
+            stop()
+    else:
+        async def main():
+            server = await IngestServer().serve(args.host, args.port)
+            print("Ingestion server listening on http://{}:{}".format(args.host, args.port))
+            async with server:
+                await server.serve_forever()
+
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /v1/chat/completions like the OpenAI API does, so the
+    assistants can be tested and benchmarked without a real key.
+    The reply echoes the last user message, streamed word by word.
+    """
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse is visible
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply_words(self, body):
+        messages = body.get("messages", [])
+        lastUser = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        words = ("Stub reply to: " + lastUser).split()
+        return [w + " " for w in words[:self.server.reply_words]]
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        words = self._reply_words(body)
+        model = body.get("model", "stub")
+        time.sleep(self.server.first_token_delay)
+
+        if not body.get("stream"):
+            payload = json.dumps({
+                "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(words)}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        # Server sent events, one chunk per word, using chunked transfer encoding
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, word in enumerate(words + [None]):
+            delta = {"content": word} if word is not None else {}
+            if i == 0:
+                delta["role"] = "assistant"
+            event = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta,
+                                                  "finish_reason": None if word is not None else "stop"}]}
+            self._write_chunk("data: {}\n\n".format(json.dumps(event)))
+            time.sleep(self.server.token_delay)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def start_stub_server(host="127.0.0.1", port=0, first_token_delay=0.05,
+                      token_delay=0.0, reply_words=60):
+    """
+    Starts the stub server on a background thread.
+    Returns (server, base_url); call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), StubChatHandler)
+    server.daemon_threads = True
+    server.first_token_delay = first_token_delay
+    server.token_delay = token_delay
+    server.reply_words = reply_words
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    baseUrl = "http://{}:{}/v1".format(host, server.server_address[1])
+    return server, baseUrl
+
+
+if __name__ == "__main__":
+    server, baseUrl = start_stub_server(port=8765)
+    print("Stub chat server listening on {}".format(baseUrl))
+    print("Set OPENAI_BASE_URL to this address to point the assistants at it.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,203 @@
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+import pandas as pd
+
+from app.data.changes import latest_sequence, prune_consumed
+from app.data.db import connect_database
+from app.services.live_views import get_live_view
+
+# domain -> (table, columns with bar/pie breakdowns, date column for the time series)
+SNAPSHOT_DOMAINS = {
+    "cyber": ("cyber_incidents", ("incident_type", "severity", "status"), "date"),
+    "it": ("it_tickets", ("subject", "priority", "status"), "created_date"),
+    "datasets": ("datasets_metadata", ("category",), None),
+}
+
+# Seconds between the worker's checks for new changes
+SNAPSHOT_INTERVAL = 5
+# Seconds between prunes of the change_log rows every reader has applied
+PRUNE_INTERVAL = 300
+
+logger = logging.getLogger(__name__)
+
+_tableReady = False
+
+
+def create_snapshot_table(conn):
+    """One row per domain holding its latest chart payload."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chart_snapshots (
+            domain TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            built_at REAL NOT NULL,
+            payload TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+def build_payload(domain: str) -> dict:
+    """
+    Chart-ready data for one domain: value counts for every breakdown column
+    and counts per date, as [value, count] pairs in GROUP BY order.
+    """
+    table, columns, dateColumn = SNAPSHOT_DOMAINS[domain]
+    view = get_live_view(table)
+    view.refresh()
+    payload = {"counts": {c: view.counts(c).values.tolist() for c in columns}}
+    if dateColumn:
+        payload["series"] = view.counts(dateColumn).values.tolist()
+    return payload
+
+
+def write_snapshot(domain: str) -> int:
+    """Builds and stores a domain's snapshot. Returns its version (its table's changelog position)."""
+    version = latest_sequence(SNAPSHOT_DOMAINS[domain][0])
+    payload = json.dumps(build_payload(domain), separators=(",", ":"), default=str)
+    conn = connect_database()
+    create_snapshot_table(conn)
+    conn.execute("INSERT OR REPLACE INTO chart_snapshots (domain, version, built_at, payload) VALUES (?, ?, ?, ?)",
+                 (domain, version, time.time(), payload))
+    conn.commit()
+    conn.close()
+    return version
+
+
+class Snapshot:
+    """A decoded chart snapshot, with the DataFrames the pages plot."""
+    __slots__ = ("domain", "version", "built_at", "_counts", "_series")
+
+    def __init__(self, domain: str, version: int, built_at: float, payload: dict):
+        self.domain = domain
+        self.version = version
+        self.built_at = built_at
+        _, _, dateColumn = SNAPSHOT_DOMAINS[domain]
+        self._counts = {c: pd.DataFrame(pairs, columns=[c, "COUNT(*)"]) for c, pairs in payload["counts"].items()}
+        self._series = pd.DataFrame(payload["series"], columns=[dateColumn, "COUNT(*)"]) if dateColumn else None
+
+    def counts(self, column: str) -> pd.DataFrame:
+        return self._counts[column]
+
+    def series(self) -> Optional[pd.DataFrame]:
+        return self._series
+
+    def age(self) -> float:
+        return max(time.time() - self.built_at, 0.0)
+
+    def describe(self) -> str:
+        return "Snapshot v{} built {:.0f}s ago".format(self.version, self.age())
+
+
+_decoded: Dict[str, Snapshot] = {}
+_decodedLock = threading.Lock()
+
+
+def get_snapshot(domain: str) -> Snapshot:
+    """
+    Latest snapshot for a domain. The payload is only decoded when its version
+    changed since the last call, so rerenders cost one primary-key lookup.
+    If no snapshot exists yet (worker not running) one is built now.
+    """
+    global _tableReady
+    conn = connect_database()
+    if not _tableReady:
+        create_snapshot_table(conn)
+        _tableReady = True
+    row = conn.execute("SELECT version, built_at FROM chart_snapshots WHERE domain = ?", (domain,)).fetchone()
+    if row is None:
+        conn.close()
+        write_snapshot(domain)
+        conn = connect_database()
+        row = conn.execute("SELECT version, built_at FROM chart_snapshots WHERE domain = ?", (domain,)).fetchone()
+    with _decodedLock:
+        cached = _decoded.get(domain)
+        if cached is not None and (cached.version, cached.built_at) == tuple(row):
+            conn.close()
+            return cached
+    version, builtAt, payload = conn.execute(
+        "SELECT version, built_at, payload FROM chart_snapshots WHERE domain = ?", (domain,)).fetchone()
+    conn.close()
+    snapshot = Snapshot(domain, version, builtAt, json.loads(payload))
+    with _decodedLock:
+        _decoded[domain] = snapshot
+    return snapshot
+
+
+class SnapshotWorker(threading.Thread):
+    """
+    Daemon thread that rebuilds a domain's snapshot whenever its table's
+    changelog position has moved on, checking every interval seconds.
+    """
+
+    def __init__(self, interval: float = SNAPSHOT_INTERVAL):
+        super().__init__(name="snapshot-worker", daemon=True)
+        self.interval = interval
+        self.builds = 0
+        self.pruned = 0
+        self._halt = threading.Event()
+        self._built: Dict[str, int] = {}
+        self._pruned_at = 0.0
+
+    def run_once(self) -> int:
+        """Rebuilds the stale snapshots. Returns how many were rebuilt."""
+        rebuilt = 0
+        for domain, (table, _, _) in SNAPSHOT_DOMAINS.items():
+            if self._built.get(domain) != latest_sequence(table):
+                self._built[domain] = write_snapshot(domain)
+                rebuilt += 1
+        self.builds += rebuilt
+        # The snapshots have just brought the live views up to date, so this is a good time to prune
+        if time.time() - self._pruned_at >= PRUNE_INTERVAL:
+            self.pruned += prune_consumed()
+            self._pruned_at = time.time()
+        return rebuilt
+
+    def run(self) -> None:
+        while not self._halt.is_set():
+            try:
+                self.run_once()
+            except Exception:  # keep the worker alive, e.g. while the DB is locked
+                logger.exception("Snapshot worker run failed")
+            self._halt.wait(self.interval)
+
+    def stop(self) -> None:
+        self._halt.set()
+
+
+_worker: Optional[SnapshotWorker] = None
+_workerLock = threading.Lock()
+
+
+def start_snapshot_worker(interval: float = SNAPSHOT_INTERVAL) -> SnapshotWorker:
+    """Starts the process-wide worker thread once and returns it."""
+    global _worker
+    with _workerLock:
+        if _worker is None or not _worker.is_alive():
+            _worker = SnapshotWorker(interval)
+            _worker.start()
+        return _worker
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Keep chart snapshots current")
+    parser.add_argument("--once", action="store_true", help="rebuild stale snapshots and exit")
+    parser.add_argument("--interval", type=float, default=SNAPSHOT_INTERVAL)
+    args = parser.parse_args()
+
+    worker = SnapshotWorker(args.interval)
+    start = time.perf_counter()
+    print("Rebuilt {} snapshots in {:.1f} ms".format(worker.run_once(), (time.perf_counter() - start) * 1000))
+    for domain in SNAPSHOT_DOMAINS:
+        get_snapshot(domain)
+        start = time.perf_counter()
+        for _ in range(100):
+            get_snapshot(domain)
+        print("{}: read {:.2f} ms".format(domain, (time.perf_counter() - start) * 10))
+    if not args.once:
+        worker.run()
@@ -0,0 +1,178 @@
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.data.db import connect_database
+from app.data.status_history import DELETED_STATUS, ENTITY_INCIDENT, ENTITY_TICKET, get_events_since
+
+BATCH_EVENTS = 50000
+
+_jobLocks = {"resolution_times": threading.Lock(), "status_daily": threading.Lock()}
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(str(value).replace("T", " ")[:19])
+
+
+def _terminal_codes(conn) -> set:
+    return {row[0] for row in conn.execute("SELECT code FROM status_states WHERE terminal = 1")}
+
+
+def _deleted_code(conn):
+    row = conn.execute("SELECT code FROM status_states WHERE name = ?", (DELETED_STATUS,)).fetchone()
+    return row[0] if row else None
+
+
+def _run_job(job: str, process) -> int:
+    """
+    Feeds every status event newer than the job's checkpoint to process(conn, events, terminal)
+    in batches, advancing the checkpoint in the same transaction as the job's writes.
+    Returns the number of events processed.
+    Each batch holds the write lock from reading the checkpoint to committing,
+    and runs of the same job in this process take turns, so two pages
+    rerunning at once never process the same events twice.
+    """
+    with _jobLocks[job]:
+        conn = connect_database()
+        try:
+            terminal = _terminal_codes(conn)
+            total = 0
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT last_event_id FROM job_checkpoints WHERE job = ?", (job,)).fetchone()
+                events = get_events_since(row[0] if row else 0, BATCH_EVENTS, conn)
+                if not events:
+                    conn.rollback()
+                    break
+                process(conn, events, terminal)
+                conn.execute("INSERT OR REPLACE INTO job_checkpoints (job, last_event_id, updated_at) VALUES (?, ?, ?)",
+                             (job, events[-1][0], datetime.now().isoformat(" ", "seconds")))
+                conn.commit()
+                total += len(events)
+            return total
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def _process_resolution(conn, events, terminal) -> None:
+    """
+    Tracks when work opens and records how long it took once it is resolved.
+    Deleted work stops being open without counting as resolved.
+    """
+    deleted = _deleted_code(conn)
+    for _, entity, entityId, fromState, toState, changedAt in events:
+        wasOpen = fromState is not None and fromState not in terminal
+        isOpen = toState not in terminal
+        if isOpen and not wasOpen:
+            conn.execute("INSERT OR REPLACE INTO open_work (entity, entity_id, opened_at) VALUES (?, ?, ?)",
+                         (entity, entityId, changedAt))
+        elif wasOpen and toState == deleted:
+            conn.execute("DELETE FROM open_work WHERE entity = ? AND entity_id = ?", (entity, entityId))
+        elif wasOpen and not isOpen:
+            row = conn.execute("SELECT opened_at FROM open_work WHERE entity = ? AND entity_id = ?",
+                               (entity, entityId)).fetchone()
+            if row:
+                seconds = (_parse_time(changedAt) - _parse_time(row[0])).total_seconds()
+                conn.execute("INSERT INTO resolution_times (entity, entity_id, resolved_at, seconds) VALUES (?, ?, ?, ?)",
+                             (entity, entityId, changedAt, max(seconds, 0.0)))
+                conn.execute("DELETE FROM open_work WHERE entity = ? AND entity_id = ?", (entity, entityId))
+
+
+def _process_backlog(conn, events, terminal) -> None:
+    """Counts work opened, resolved, reopened and deleted while open per entity and day."""
+    deleted = _deleted_code(conn)
+    counts: Dict[tuple, List[int]] = {}
+    for _, entity, _, fromState, toState, changedAt in events:
+        wasOpen = fromState is not None and fromState not in terminal
+        isOpen = toState not in terminal
+        if wasOpen == isOpen:
+            continue
+        day = str(changedAt)[:10]
+        bucket = counts.setdefault((entity, day), [0, 0, 0, 0])
+        if toState == deleted:
+            bucket[3] += 1
+        elif not isOpen:
+            bucket[1] += 1
+        elif fromState is None:
+            bucket[0] += 1
+        else:
+            bucket[2] += 1
+    conn.executemany("""
+        INSERT INTO status_daily (entity, day, opened, resolved, reopened, removed) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (entity, day) DO UPDATE SET
+            opened = opened + excluded.opened,
+            resolved = resolved + excluded.resolved,
+            reopened = reopened + excluded.reopened,
+            removed = removed + excluded.removed
+    """, [(e, d, o, r, ro, rm) for (e, d), (o, r, ro, rm) in counts.items()])
+
+
+def run_resolution_job() -> int:
+    return _run_job("resolution_times", _process_resolution)
+
+
+def run_backlog_job() -> int:
+    return _run_job("status_daily", _process_backlog)
+
+
+def run_status_jobs() -> Dict[str, int]:
+    """Runs both aggregation jobs over the events added since they last ran."""
+    return {"resolution_times": run_resolution_job(), "status_daily": run_backlog_job()}
+
+
+def mttr_percentiles(entity: int, percentiles=(50, 90, 95), since: Optional[str] = None) -> Dict[int, float]:
+    """Time to resolve, in hours, at the given percentiles."""
+    conn = connect_database()
+    sql = "SELECT seconds FROM resolution_times WHERE entity = ?"
+    params = (entity,)
+    if since:
+        sql += " AND resolved_at >= ?"
+        params += (since,)
+    seconds = np.fromiter((row[0] for row in conn.execute(sql, params)), dtype=np.float64)
+    conn.close()
+    if not len(seconds):
+        return {}
+    values = np.percentile(seconds / 3600.0, percentiles)
+    return {p: float(v) for p, v in zip(percentiles, values)}
+
+
+def reopen_rate(entity: int) -> float:
+    """Share of resolutions that were later reopened."""
+    conn = connect_database()
+    resolved, reopened = conn.execute(
+        "SELECT COALESCE(SUM(resolved), 0), COALESCE(SUM(reopened), 0) FROM status_daily WHERE entity = ?",
+        (entity,)).fetchone()
+    conn.close()
+    return reopened / resolved if resolved else 0.0
+
+
+def backlog_by_day(entity: int):
+    """
+    Returns (days, open counts) arrays: the number of open items at the end of each day.
+    """
+    conn = connect_database()
+    rows = conn.execute("SELECT day, opened + reopened - resolved - removed FROM status_daily WHERE entity = ? ORDER BY day",
+                        (entity,)).fetchall()
+    conn.close()
+    if not rows:
+        return np.array([], dtype="datetime64[D]"), np.array([], dtype=np.int64)
+    days = np.array([r[0] for r in rows], dtype="datetime64[D]")
+    return days, np.cumsum([r[1] for r in rows])
+
+
+if __name__ == "__main__":
+    import time
+    from app.data.schema import create_all_tables
+
+    create_all_tables()
+    start = time.perf_counter()
+    print("Processed:", run_status_jobs(), "in {:.1f} ms".format((time.perf_counter() - start) * 1000))
+    for entity, name in ((ENTITY_INCIDENT, "Incidents"), (ENTITY_TICKET, "Tickets")):
+        days, backlog = backlog_by_day(entity)
+        print("{}: MTTR hours {}, reopen rate {:.1%}, backlog now {}".format(
+            name, mttr_percentiles(entity), reopen_rate(entity), int(backlog[-1]) if len(backlog) else 0))
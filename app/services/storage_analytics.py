@@ -0,0 +1,140 @@
+import threading
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.data.changes import latest_sequence
+from app.data.datasets import PERIOD_FORMATS
+from app.data.db import connect_database, get_data_version
+
+TABLE = "Datasets_Metadata"
+
+_cache: Dict[tuple, tuple] = {}
+_cacheLock = threading.Lock()
+
+
+def _cached(name: str, args: tuple, compute):
+    """
+    Returns compute() for (name, args), reusing the previous result until
+    Datasets_Metadata is written to by this or another process.
+    """
+    version = (get_data_version(TABLE), latest_sequence(TABLE))
+    key = (name,) + args
+    with _cacheLock:
+        hit = _cache.get(key)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+    result = compute()
+    with _cacheLock:
+        _cache[key] = (version, result)
+    return result
+
+
+def _query(sql: str, params=(), columns=None) -> pd.DataFrame:
+    conn = connect_database()
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+    return pd.DataFrame(rows, columns=columns)
+
+
+def size_percentiles(percentiles: Sequence[int] = (50, 90, 99)) -> pd.DataFrame:
+    """
+    Per category: dataset count, total size and nearest-rank size percentiles
+    in MB, largest total first. Ranks come from one window-function pass
+    over the (category, file_size_mb) index.
+    """
+    percentiles = tuple(int(p) for p in percentiles)
+
+    def compute():
+        picks = ", ".join("MAX(CASE WHEN rn = MAX(1, (? * n + 99) / 100) THEN file_size_mb END)"
+                          for _ in percentiles)
+        sql = """
+            WITH ranked AS (
+                SELECT category, file_size_mb,
+                       ROW_NUMBER() OVER (PARTITION BY category ORDER BY file_size_mb) AS rn,
+                       COUNT(*) OVER (PARTITION BY category) AS n
+                FROM {} WHERE file_size_mb IS NOT NULL
+            )
+            SELECT category, MAX(n), ROUND(SUM(file_size_mb), 2), {}, MAX(file_size_mb)
+            FROM ranked GROUP BY category ORDER BY SUM(file_size_mb) DESC
+        """.format(TABLE, picks)
+        return _query(sql, percentiles, ["category", "datasets", "total_mb"]
+                      + ["p{}_mb".format(p) for p in percentiles] + ["max_mb"])
+
+    return _cached("percentiles", percentiles, compute)
+
+
+def largest_datasets(k: int = 10, per_category: bool = False) -> pd.DataFrame:
+    """The k largest datasets overall, or the k largest in every category."""
+    k = int(k)
+
+    def compute():
+        columns = ["dataset_name", "category", "file_size_mb", "created_at"]
+        if not per_category:
+            return _query("SELECT {} FROM {} ORDER BY file_size_mb DESC LIMIT ?".format(", ".join(columns), TABLE),
+                          (k,), columns)
+        return _query("""
+            SELECT {0} FROM (
+                SELECT {0}, ROW_NUMBER() OVER (PARTITION BY category ORDER BY file_size_mb DESC) AS rn
+                FROM {1}
+            ) WHERE rn <= ? ORDER BY category, file_size_mb DESC
+        """.format(", ".join(columns), TABLE), (k,), columns)
+
+    return _cached("largest", (k, per_category), compute)
+
+
+def cumulative_growth(period: str = "month") -> pd.DataFrame:
+    """
+    Storage added per day, week or month of created_at, with running totals
+    of size and dataset count, oldest first.
+    """
+    if period not in PERIOD_FORMATS:
+        raise ValueError("Unknown period '{}'".format(period))
+
+    def compute():
+        return _query("""
+            SELECT period, added_mb,
+                   SUM(added_mb) OVER (ORDER BY period ROWS UNBOUNDED PRECEDING) AS total_mb,
+                   SUM(added) OVER (ORDER BY period ROWS UNBOUNDED PRECEDING) AS total_datasets
+            FROM (
+                SELECT strftime('{}', created_at) AS period, SUM(file_size_mb) AS added_mb, COUNT(*) AS added
+                FROM {} WHERE created_at IS NOT NULL GROUP BY period
+            ) ORDER BY period
+        """.format(PERIOD_FORMATS[period], TABLE), (), ["period", "added_mb", "total_mb", "total_datasets"])
+
+    return _cached("growth", (period,), compute)
+
+
+def project_storage(months: int = 12, history: int = 12) -> pd.DataFrame:
+    """
+    Projects total storage for the next months by fitting a straight line to
+    the last history months of cumulative growth. Empty if there is too little history.
+    """
+    def compute():
+        growth = cumulative_growth("month").tail(history)
+        if len(growth) < 2:
+            return pd.DataFrame(columns=["period", "projected_mb"])
+        periods = np.array(growth["period"].tolist(), dtype="datetime64[M]")
+        x = (periods - periods[0]).astype(np.int64)
+        slope, intercept = np.polyfit(x, growth["total_mb"].to_numpy(dtype=np.float64), 1)
+        future = periods[-1] + np.arange(1, months + 1)
+        projected = intercept + slope * (future - periods[0]).astype(np.int64)
+        return pd.DataFrame({"period": future.astype(str), "projected_mb": np.round(projected, 2)})
+
+    return _cached("projection", (months, history), compute)
+
+
+if __name__ == "__main__":
+    import time
+
+    for name, fn in (("percentiles", size_percentiles), ("largest", largest_datasets),
+                     ("growth", cumulative_growth), ("projection", project_storage)):
+        start = time.perf_counter()
+        result = fn()
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        fn()
+        warm = time.perf_counter() - start
+        print("{}: {} rows, {:.1f} ms cold, {:.2f} ms cached".format(name, len(result), cold * 1000, warm * 1000))
+    print(size_percentiles())
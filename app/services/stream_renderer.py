@@ -0,0 +1,106 @@
+import time
+from typing import Any, Callable, Iterable, List, Optional
+
+CURSOR = "▌"  # Left Hand Block, shown while the reply is still streaming
+
+
+def chunk_text(chunk: Any) -> str:
+    """
+    Returns the text carried by one streamed chunk.
+    Accepts plain strings as well as OpenAI chat completion chunks.
+    """
+    if isinstance(chunk, str):
+        return chunk
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return ""
+    return getattr(choices[0].delta, "content", None) or ""
+
+
+class StreamRenderer:
+    """
+    Renders a streamed reply into a Streamlit placeholder without redrawing
+    on every chunk. Chunks are buffered in a list and the placeholder is
+    only updated at most max_fps times a second, or once flush_chunks new
+    chunks have arrived, whichever comes first.
+    """
+
+    def __init__(self, container, max_fps: float = 12.0, flush_chunks: int = 40,
+                 clock: Callable[[], float] = time.perf_counter):
+        self._container = container
+        self._interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self._flush_chunks = flush_chunks
+        self._clock = clock
+        self.render_calls = 0
+        self.bytes_sent = 0
+
+    def _draw(self, text: str) -> None:
+        self._container.markdown(text)
+        self.render_calls += 1
+        self.bytes_sent += len(text.encode("utf-8"))
+
+    def render(self, chunks: Iterable[Any], on_first: Optional[Callable[[], None]] = None,
+               text_of: Callable[[Any], str] = chunk_text) -> str:
+        """
+        Consumes the chunk iterator, drawing the partial reply as it grows.
+        Returns the full reply text once the stream ends.
+        """
+        parts: List[str] = []
+        pending = 0
+        lastFlush = self._clock()
+
+        for chunk in chunks:
+            text = text_of(chunk)
+            if not text:
+                continue
+            if not parts and on_first is not None:
+                on_first()
+            parts.append(text)
+            pending += 1
+
+            # Redraw only when the frame interval passed or enough chunks piled up
+            now = self._clock()
+            if pending >= self._flush_chunks or now - lastFlush >= self._interval:
+                self._draw("".join(parts) + CURSOR)
+                pending = 0
+                lastFlush = now
+
+        # Final draw without the cursor
+        fullReply = "".join(parts)
+        self._draw(fullReply)
+        return fullReply
+
+
+class _CountingContainer:
+    """Stands in for st.empty() in the benchmark."""
+
+    def markdown(self, text: str) -> None:
+        pass
+
+
+def _naive_render(container, chunks: Iterable[str]):
+    """The previous per-chunk behaviour, kept for comparison."""
+    calls = sent = 0
+    fullReply = ""
+    for text in chunks:
+        fullReply += text
+        container.markdown(fullReply + CURSOR)
+        calls += 1
+        sent += len((fullReply + CURSOR).encode("utf-8"))
+    container.markdown(fullReply)
+    return calls + 1, sent + len(fullReply.encode("utf-8"))
+
+
+if __name__ == "__main__":
+    # A 1500 token reply arriving at ~60 tokens per second (simulated clock)
+    tokens = ["word{} ".format(i % 50) for i in range(1500)]
+    ticks = iter(i / 60.0 for i in range(10 * len(tokens)))
+
+    naiveCalls, naiveBytes = _naive_render(_CountingContainer(), tokens)
+    renderer = StreamRenderer(_CountingContainer(), clock=lambda: next(ticks))
+    renderer.render(tokens)
+
+    print("Chunks per reply: {}".format(len(tokens)))
+    print("Per-chunk render  - calls: {:>5}, bytes sent: {:>10}".format(naiveCalls, naiveBytes))
+    print("Throttled render  - calls: {:>5}, bytes sent: {:>10}".format(
+        renderer.render_calls, renderer.bytes_sent))
@@ -0,0 +1,251 @@
+import heapq
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from app.data.changes import add_change_reader, get_changes_since, sequence_range
+from app.data.db import add_change_listener, connect_database
+from app.models.batches import IncidentBatch
+from app.models.security_incident import SecurityIncident
+
+# Incidents waiting to be picked up by an analyst
+TRIAGE_STATUS = "Open"
+# Status an incident moves to when an analyst claims it
+CLAIMED_STATUS = "Under Investigation"
+
+
+class IndexedHeap:
+    """
+    Binary min-heap that also tracks where each item sits, so an item can be
+    re-prioritised or removed by id in O(log n) instead of O(n).
+    """
+
+    def __init__(self):
+        self._heap: List[list] = []  # [key, item_id, payload]
+        self._position: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self._position
+
+    def build(self, entries) -> None:
+        """Replaces the contents with (key, item_id, payload) entries in O(n)."""
+        self._heap = [list(e) for e in entries]
+        heapq.heapify(self._heap)
+        self._position = {entry[1]: i for i, entry in enumerate(self._heap)}
+
+    def _swap(self, i: int, j: int) -> None:
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._position[heap[i][1]] = i
+        self._position[heap[j][1]] = j
+
+    def _sift_up(self, i: int) -> None:
+        while i > 0:
+            parent = (i - 1) // 2
+            if self._heap[i][0] >= self._heap[parent][0]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int) -> None:
+        size = len(self._heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and self._heap[child][0] < self._heap[smallest][0]:
+                    smallest = child
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
+
+    def push(self, key, item_id, payload=None) -> None:
+        """Adds an item, or re-prioritises it if it is already present."""
+        if item_id in self._position:
+            i = self._position[item_id]
+            old = self._heap[i][0]
+            self._heap[i][0] = key
+            self._heap[i][2] = payload
+            self._sift_up(i) if key < old else self._sift_down(i)
+            return
+        self._heap.append([key, item_id, payload])
+        self._position[item_id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def remove(self, item_id) -> bool:
+        i = self._position.pop(item_id, None)
+        if i is None:
+            return False
+        last = self._heap.pop()
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._position[last[1]] = i
+            self._sift_up(i)
+            self._sift_down(self._position[last[1]])
+        return True
+
+    def pop(self) -> Optional[Tuple]:
+        if not self._heap:
+            return None
+        key, itemId, payload = self._heap[0]
+        self.remove(itemId)
+        return key, itemId, payload
+
+    def peek(self, k: int) -> List[Tuple]:
+        """The k smallest items in order, without removing them, in O(k log k)."""
+        result = []
+        frontier = [(self._heap[0][0], 0)] if self._heap else []
+        while frontier and len(result) < k:
+            _, i = heapq.heappop(frontier)
+            key, itemId, payload = self._heap[i]
+            result.append((key, itemId, payload))
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self._heap):
+                    heapq.heappush(frontier, (self._heap[child][0], child))
+        return result
+
+
+def _priority(severity: str, incident_date) -> tuple:
+    """Most severe first, then oldest first."""
+    level = SecurityIncident.SEVERITY_LEVELS.get(str(severity).lower(), 0)
+    try:
+        ordinal = date.fromisoformat(str(incident_date)[:10]).toordinal()
+    except ValueError:
+        ordinal = date.max.toordinal()
+    return (-level, ordinal)
+
+
+class TriageQueue:
+    """
+    In-process queue of untriaged incidents, most urgent first.
+    Loaded once from the database, then kept current by replaying the
+    change_log before every read, like a LiveView, so writes made by other
+    processes (ingest server, CSV sync, retention) are seen too.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self._heap = IndexedHeap()
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    def load(self) -> None:
+        """(Re)builds the heap from every incident currently waiting for triage."""
+        conn = connect_database()
+        conn.execute("BEGIN")
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        batch = IncidentBatch.from_query("status = ?", (TRIAGE_STATUS,), conn=conn)
+        conn.execute("COMMIT")
+        conn.close()
+        levels = batch.severity_levels().tolist()
+        ordinals = (batch["date"].astype("datetime64[D]").astype("int64") + date(1970, 1, 1).toordinal()).tolist()
+        ids = batch["id"].tolist()
+        types = batch.column_values("incident_type").tolist()
+        severities = batch.column_values("severity").tolist()
+        dates = batch["date"].astype(str).tolist()
+        with self._lock:
+            self._heap.build(((-levels[i], ordinals[i]), ids[i], (dates[i], types[i], severities[i]))
+                             for i in range(len(ids)))
+            self.seq = seq
+            self._loaded = True
+
+    def refresh(self) -> int:
+        """
+        Applies the incident changes logged since the last refresh and returns
+        how many there were. Falls back to a full load if the log was pruned past us.
+        """
+        with self._lock:
+            if not self._loaded:
+                self.load()
+                return 0
+            conn = connect_database()
+            oldest, newest = sequence_range(conn)
+            if oldest is not None and self.seq < oldest - 1:
+                conn.close()
+                self.load()
+                return 0
+            if newest is None or newest <= self.seq:
+                conn.close()
+                return 0
+            changes = get_changes_since(self.seq, "cyber_incidents", limit=-1, until=newest, conn=conn)
+            conn.close()
+            for change in changes:
+                self._apply(change)
+            self.seq = newest
+            return len(changes)
+
+    def _apply(self, change: dict) -> None:
+        if change["old"] is not None:
+            # Also covers an update of the id itself
+            self._heap.remove(int(change["old"]["id"]))
+        row = change["new"]
+        if row is None or row["status"] != TRIAGE_STATUS:
+            self._heap.remove(int(change["key"]))
+        else:
+            self._heap.push(_priority(row["severity"], row["date"]), int(row["id"]),
+                            (str(row["date"]), row["incident_type"], row["severity"]))
+
+    def on_change(self, table: str, action: str, key) -> None:
+        """Change listener: drops aren't in the changelog, so reload after one."""
+        if table == "cyber_incidents" and action == "drop":
+            with self._lock:
+                self._loaded = False
+
+    def __len__(self) -> int:
+        with self._lock:
+            self.refresh()
+            return len(self._heap)
+
+    def peek(self, k: int = 10) -> List[dict]:
+        """The k most urgent incidents, without removing them."""
+        with self._lock:
+            self.refresh()
+            return [self._as_dict(entry) for entry in self._heap.peek(k)]
+
+    def pop(self, k: int = 1) -> List[dict]:
+        """Removes and returns up to k of the most urgent incidents."""
+        with self._lock:
+            self.refresh()
+            entries = [self._heap.pop() for _ in range(min(k, len(self._heap)))]
+        return [self._as_dict(entry) for entry in entries]
+
+    def claim(self, k: int = 1) -> List[dict]:
+        """
+        Pops the k most urgent incidents and moves them to CLAIMED_STATUS in
+        the database, so they stay out of the queue for every session.
+        Only the status is written, and only while it is still TRIAGE_STATUS;
+        an incident another session or process changed first is skipped.
+        """
+        from app.data.repository import INCIDENTS
+
+        claimed = []
+        while len(claimed) < k:
+            items = self.pop(1)
+            if not items:
+                break
+            if INCIDENTS.change_status(items[0]["id"], TRIAGE_STATUS, CLAIMED_STATUS):
+                claimed.append(items[0])
+        return claimed
+
+    @staticmethod
+    def _as_dict(entry) -> dict:
+        _, incidentId, (incidentDate, incidentType, severity) = entry
+        return {"id": incidentId, "date": incidentDate, "incident_type": incidentType, "severity": severity}
+
+
+_queue: Optional[TriageQueue] = None
+_queueLock = threading.Lock()
+
+
+def get_triage_queue() -> TriageQueue:
+    """Returns the process-wide triage queue, subscribed to incident changes."""
+    global _queue
+    with _queueLock:
+        if _queue is None:
+            _queue = TriageQueue()
+            add_change_listener(_queue.on_change)
+            add_change_reader(_queue)
+        return _queue
@@ -2,9 +2,15 @@ import streamlit as st
 import app.services.user_service as LoginRegister
 import app.data.schema as Schema
 import auth
-import app.data.incidents as CyberFuncs
-import app.data.datasets as dt
-import app.data.tickets as tickets
+
+@st.cache_resource(show_spinner=False)
+def InitDatabase() -> None:
+    """
+    Creates the tables once per server process instead of on every rerun.
+    """
+    Schema.create_all_tables()
+
+
 def LoginCheck() -> None:
     """
     Checks if user has logged in through Login Page. Sets values to False/None if not
@@ -122,9 +128,7 @@ def Register(registerTab):
 
 
 if __name__ == "__main__": 
- 
-  
-    Schema.create_all_tables()
+    InitDatabase()
     LoginCheck()
     GoCyber()
     
@@ -1,7 +1,13 @@
 import streamlit as st
-from openai import OpenAI
-import plotly.express as exp
-import app.data.incidents as CyberFuncs
+from streamlit.errors import StreamlitSecretNotFoundError
+from app.services.ai_assistant import get_assistant, AssistantBusyError
+from app.services.context_manager import ConversationContext
+from app.services.stream_renderer import StreamRenderer
+from app.data.changes import POLL_SECONDS
+from app.data.status_history import ENTITY_INCIDENT
+from app.data.retention import start_retention_worker
+
+SYSTEM_PROMPT = "You are an expert in office related cyber incidents. Make sure your responses are not too long"
 
 def debug(*args):
     """
@@ -21,6 +27,8 @@ def check_login():
         st.session_state.logged_in = False
     if 'cyberMsgs' not in st.session_state:
         st.session_state.cyberMsgs = [] 
+    if 'cyberCtx' not in st.session_state:
+        st.session_state.cyberCtx = ConversationContext(SYSTEM_PROMPT)
 
     # 2. The Check
     if not st.session_state.logged_in:
@@ -48,32 +56,111 @@ def barchart(data, xAxis: str):
     """
     st.subheader("Breakdown of"+" "+xAxis)
 
+    import plotly.express as exp
     fig = exp.bar(data, x=xAxis,y="COUNT(*)",title=xAxis+" Distribution")
     
     st.plotly_chart(fig)
 
-def linechart(df):
+def linechart(df, version=None):
     """
     Creates a line chart and Contains all the dates
     grouped by the no of records in each date.
+    Long histories are downsampled to the chart width and the built
+    figure is reused until the data version changes.
     """
     st.subheader("Incidents Over Time")
-    date_counts = df['date'].value_counts().sort_index()
-    cntvalues = df['COUNT(*)'].values
-    fig = exp.line(x=date_counts.index, y=cntvalues, labels={'x': 'Date', 'y': 'Number of Incidents'}, title="Incidents Over Time")
-    st.plotly_chart(fig)
+    build = lambda: line_figure(df['date'], df['COUNT(*)'], title="Incidents Over Time",
+                                labels={'x': 'Date', 'y': 'Number of Incidents'},
+                                width_px=CENTERED_LAYOUT_PX)
+    fig = build() if version is None else get_figure_cache().get("incidents_by_date", (), version, build)
+    st.plotly_chart(fig, width=CENTERED_LAYOUT_PX)
 
-def piechart(column)->None:
+def piechart(column, data)->None:
     """
     Creates a pie chart showing the distribution of incident types.
     """
     st.subheader(column+" Distribution")
-    data = CyberFuncs.get_all_incidents("",column)
     incident_counts = data[column].value_counts()
     cntvalues = data['COUNT(*)'].values
+    import plotly.express as exp
     fig = exp.pie(values=cntvalues, names=incident_counts.index, title=column+" Distribution")
     st.plotly_chart(fig)
 
+@st.fragment(run_every=POLL_SECONDS)
+def livecharts(column):
+    """
+    Draws the incident charts from the latest snapshot.
+    Reruns every POLL_SECONDS on its own; the background worker rebuilds
+    the snapshot whenever the data changes.
+    """
+    snapshot = get_snapshot("cyber")
+    data = snapshot.counts(column)
+    barchart(data, column)
+    piechart(column, data)
+    linechart(snapshot.series(), snapshot.version)
+    st.caption(snapshot.describe())
+
+def spikes():
+    """
+    Flags days where an incident type had unusually many incidents compared with the
+    28 days before, from the shared spike detector (only new changes are applied).
+    """
+    st.subheader("Volume Spikes")
+    detector = get_spike_detector("cyber")
+    detector.refresh()
+    flagged = detector.flagged(days=90)
+    if flagged.empty:
+        st.caption("No unusual volume in the last 90 days of data.")
+        return
+    latest = flagged["date"].iloc[0]
+    st.warning("Latest spike on {}: {}".format(latest, ", ".join(flagged.loc[flagged["date"] == latest, "incident_type"])))
+    st.dataframe(flagged, hide_index=True)
+
+def risktable():
+    """
+    Shows the highest risk open incidents.
+    Scores that changed since the last run are recomputed first.
+    """
+    st.subheader("Highest Risk Open Incidents")
+    get_risk_scorer().refresh()
+    st.dataframe(CyberFuncs.get_incidents_by_risk(10), hide_index=True)
+
+def triagepanel():
+    """
+    Shows the most urgent untriaged incidents (highest severity, then oldest)
+    and lets the analyst claim the next ones.
+    """
+    queue = get_triage_queue()
+    st.subheader("Triage Queue")
+    st.caption("{} incidents waiting for triage".format(len(queue)))
+    count = st.slider("Incidents to show", min_value=1, max_value=50, value=10)
+    st.dataframe(queue.peek(count), hide_index=True)
+
+    if st.button("Claim next incident"):
+        claimed = queue.claim(1)
+        if claimed:
+            st.success("Incident '{}' moved to Under Investigation.".format(claimed[0]["id"]))
+        else:
+            st.info("Nothing left to triage.")
+
+def statusmetrics():
+    """
+    Shows time-to-resolve percentiles, reopen rate and open backlog over time,
+    from the status history aggregates (only new events are processed).
+    """
+    st.subheader("Resolution Metrics")
+    run_status_jobs()
+    mttr = mttr_percentiles(ENTITY_INCIDENT)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Median time to resolve", "{:.1f} h".format(mttr[50]) if mttr else "n/a")
+    col2.metric("90th percentile", "{:.1f} h".format(mttr[90]) if mttr else "n/a")
+    col3.metric("Reopen rate", "{:.1%}".format(reopen_rate(ENTITY_INCIDENT)))
+    days, backlog = backlog_by_day(ENTITY_INCIDENT)
+    if len(days):
+        fig = line_figure(days, backlog, labels={'x': 'Date', 'y': 'Open Incidents'}, title="Open Incidents Backlog",
+                          width_px=CENTERED_LAYOUT_PX)
+        st.plotly_chart(fig, width=CENTERED_LAYOUT_PX)
+
 def insertincident():
     """
     Collect incident details from user input.
@@ -112,7 +199,9 @@ def crud(operation):
     Read, Handle, Create, Update, or Delete operations for Cyber Security Incidents.
     """
     if operation =="Read":
-        st.dataframe(CyberFuncs.get_dataframequery(""))
+        view = get_live_view("cyber_incidents")
+        view.refresh()
+        st.dataframe(view.arrow())
     if operation == "Create":
 
         # Pass the tuple items directly to the insert function for incidents
@@ -138,22 +227,15 @@ def crud(operation):
                 else:
                     st.error("Unable to delete incident '{}'.".format(values))
 
-def Streaming(completion):
+def Streaming(completion, context=None):
     """
         Explanation: Takes delta time and displays ChatGPT response in small chunks
+        Redraws are throttled by StreamRenderer instead of happening on every chunk
+        If a ConversationContext is given, the arrival of the first chunk is recorded on it
     """
-    container = st.empty()
-    fullReply = ""
-    
-    for chunk in completion:
-        delta = chunk.choices[0].delta
-        if delta.content:
-            fullReply += delta.content
-            container.markdown(fullReply + "▌") # Add cursor effect, character is "Left Hand Block"
-    
-    # Remove cursor and show final response
-    container.markdown(fullReply)
-    return fullReply
+    renderer = StreamRenderer(st.empty())
+    onFirst = context.mark_first_token if context is not None else None
+    return renderer.render(completion, on_first=onFirst)
 
 def DisplayPrevMsgs():
     """
@@ -175,26 +257,34 @@ def AIAssistant():
     DisplayPrevMsgs()
     
     prompt = st.chat_input("Prompt our IT expert (GPT 4.0mini)...")
-    gptMsg = [{"role": "system", "content": "You are an expert in office related cyber incidents. Make sure your responses are not too long"}]
     if prompt:
         #Save user response
         st.session_state.cyberMsgs.append({ "role": "user", "content": prompt })
         with st.chat_message("user"): 
             st.markdown(prompt)
         
-        # Call OpenAI API with streaming
+        # Call the shared assistant service with streaming
+        # Only recent turns plus a summary of older ones are sent,
+        # with a cached summary of the live data in the system prompt
+        # and whitelisted aggregate queries the model can call as tools
+        context = st.session_state.cyberCtx
+        tools = get_analytics_tools("cyber")
+        context.set_system_prompt(get_data_context("cyber").system_prompt(SYSTEM_PROMPT) + tools.instructions())
+        messages = context.build(st.session_state.cyberMsgs)
         with st.spinner("Thinking..."):
-            completion = client.chat.completions.create( 
-                model = "gpt-4o-mini",
-                messages = gptMsg + st.session_state.cyberMsgs,
-                stream = True,
-            )
+            context.mark_request()
+            try:
+                completion = assistant.stream_chat(messages, tools=tools.specs(), tool_handler=tools.call)
+            except AssistantBusyError as error:
+                st.error(str(error))
+                return
             
         with st.chat_message("assistant"):
-            fullReply = Streaming(completion)
+            fullReply = Streaming(completion, context)
         
         #Save AI response
         st.session_state.cyberMsgs.append({ "role": "assistant", "content": fullReply })
+        st.caption(context.describe())
 
 def logout():
     """
@@ -210,21 +300,46 @@ def logout():
         st.switch_page("home.py")
 
 if __name__ == "__main__":
-    client = OpenAI(api_key = st.secrets['OPENAI_API_KEY'])
-
-
+    # Logged-out visitors stop here, before the AI client and workers are set up
     check_login()
+    # The data, chart and analytics modules load numpy, pandas and pyarrow, so they are
+    # imported only once the visitor is logged in (as plotly is, inside the chart functions)
+    from app.services.data_context import get_data_context
+    from app.services.analytics_tools import get_analytics_tools
+    from app.services.status_metrics import run_status_jobs, mttr_percentiles, reopen_rate, backlog_by_day
+    from app.services.risk_scoring import get_risk_scorer
+    from app.services.triage_queue import get_triage_queue
+    from app.services.live_views import get_live_view
+    from app.services.snapshots import get_snapshot, start_snapshot_worker
+    from app.services.chart_reduction import line_figure, get_figure_cache, CENTERED_LAYOUT_PX
+    from app.services.anomaly_detection import get_spike_detector
+    import app.data.incidents as CyberFuncs
+    from app.data.columnar import start_columnar_exporter
+    # One pooled client is shared by every rerun and session
+    try:
+        apiKey = st.secrets.get('OPENAI_API_KEY')
+    except StreamlitSecretNotFoundError:  # No secrets.toml: the OpenAI client reads OPENAI_API_KEY from the environment
+        apiKey = None
+    assistant = get_assistant(apiKey)
+    # Chart snapshots (and, with COLUMNAR_SNAPSHOTS=1, Parquet copies for the
+    # aggregate queries) are rebuilt in the background as the data changes
+    start_snapshot_worker()
+    start_columnar_exporter()
+    # With RETENTION_ARCHIVING=1, old closed/resolved rows move to monthly archive tables daily
+    start_retention_worker()
     st.title("Data Analysis")
-    analysis,crudop,ai=st.tabs(["Data Analysis","CRUD Operations","AI Assistant"])
+    analysis,triage,crudop,ai=st.tabs(["Data Analysis","Triage","CRUD Operations","AI Assistant"])
     with analysis:
         st.subheader("Cyber Security Incidents Analysis Dashboard")
         column=selectcolumn()
-        data = CyberFuncs.get_all_incidents("",column)
-        print(data)
-        barchart(data, column)
-        piechart(column)
-        linechart(CyberFuncs.get_all_incidents("", "date"))
+        livecharts(column)
+        spikes()
+        risktable()
+        statusmetrics()
         
+    with triage:
+        triagepanel()
+
     with crudop:
         st.subheader("Cyber Security Incidents - CRUD Operations")
         option=st.selectbox("Select Operation", ("Read","Create", "Update", "Delete"), key="cud_select")
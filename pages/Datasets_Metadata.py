@@ -1,9 +1,14 @@
 import streamlit as st
-import app.data.datasets as dt
-import plotly.express as exp
-from openai import OpenAI
+from streamlit.errors import StreamlitSecretNotFoundError
+from app.services.ai_assistant import get_assistant, AssistantBusyError
+from app.services.context_manager import ConversationContext
+from app.services.stream_renderer import StreamRenderer
+from app.data.changes import POLL_SECONDS
+from app.services.catalog_profiler import profile_catalog, CATALOG_DIR
 from datetime import datetime
 
+SYSTEM_PROMPT = "You are a data expert, you hold knowledge specialising in dataset metadata and analysis. Make sure your responses are not too long"
+
 def debug(*args):
     """
     Debugging function to print arguments to console.
@@ -22,6 +27,8 @@ def check_login():
         st.session_state.logged_in = False
     if 'dtMsgs' not in st.session_state:
         st.session_state.dtMsgs = [] 
+    if 'dtCtx' not in st.session_state:
+        st.session_state.dtCtx = ConversationContext(SYSTEM_PROMPT)
 
     # 2. The Check
     if not st.session_state.logged_in:
@@ -51,23 +58,77 @@ def barchart(data, xAxis: str):
     """
     st.subheader("Breakdown of Datasets")
 
+    import plotly.express as exp
     fig = exp.bar(data, x=xAxis,y="COUNT(*)",title="Datasets Distribution")
     
     st.plotly_chart(fig)
 
-def piechart(column)->None:
+def piechart(column, data)->None:
     """
     Create and display a pie chart using Plotly Express.
     """
     st.subheader("Datasets Distribution Pie Chart")
 
-    # Fetch data for pie chart
-    data = dt.get_all_metadata("", column)
     subcount=data[column].value_counts()
     cntvalues = data['COUNT(*)'].values
+    import plotly.express as exp
     fig = exp.pie(values=cntvalues,names=subcount.index, title="Datasets Distribution by {}".format(column))
     st.plotly_chart(fig)
 
+@st.fragment(run_every=POLL_SECONDS)
+def livecharts(column):
+    """
+    Draws the dataset charts from the latest snapshot.
+    Reruns every POLL_SECONDS on its own; the background worker rebuilds
+    the snapshot whenever the data changes.
+    """
+    snapshot = get_snapshot("datasets")
+    data = snapshot.counts(column)
+    barchart(data, column)
+    piechart(column, data)
+    st.caption(snapshot.describe())
+
+def storagepanel():
+    """
+    Shows storage used per category (total and size percentiles), the largest
+    datasets, and cumulative growth with a 12 month projection.
+    Results are cached until the metadata table changes.
+    """
+    st.subheader("Storage Footprint")
+    sizes = size_percentiles()
+    col1, col2 = st.columns(2)
+    col1.metric("Total storage", "{:,.1f} GB".format(sizes["total_mb"].sum() / 1024))
+    col2.metric("Datasets", "{:,}".format(int(sizes["datasets"].sum())))
+    st.dataframe(sizes, hide_index=True)
+
+    perCategory = st.checkbox("Largest per category")
+    st.dataframe(largest_datasets(5 if perCategory else 10, per_category=perCategory), hide_index=True)
+
+    growth = cumulative_growth("month")
+    projection = project_storage(12)
+    if not growth.empty:
+        import plotly.express as exp
+        fig = exp.line(x=growth["period"], y=growth["total_mb"], labels={'x': 'Month', 'y': 'Total Size (MB)'},
+                       title="Cumulative Storage")
+        if not projection.empty:
+            fig.add_scatter(x=projection["period"], y=projection["projected_mb"], mode="lines",
+                            line={"dash": "dash"}, name="Projected")
+        st.plotly_chart(fig)
+
+def profilerpanel():
+    """
+    Profiles the data files in the catalog directory (size, rows, columns,
+    checksum) into the metadata table. Unchanged files are skipped and
+    rows for deleted files are removed.
+    """
+    st.subheader("Catalog Profiler")
+    st.caption("Scans data files under '{}'.".format(CATALOG_DIR))
+    if st.button("Profile data files"):
+        with st.spinner("Profiling..."):
+            result = profile_catalog()
+        st.success("Profiled {} files, skipped {} unchanged, removed {} deleted, in {:.1f} s.".format(
+            result["profiled"], result["skipped"], result["removed"], result["seconds"]))
+
 def insertmetadata():
     """
     Collect dataset details from user input based on CSV values.
@@ -123,7 +184,9 @@ def crud(operation):
     Read, Handle, Create, Update, or Delete operations for Dataset Metadata.
     """
     if operation =="Read":
-        st.dataframe(dt.get_metadata_dataframe(""))
+        view = get_live_view("datasets_metadata")
+        view.refresh()
+        st.dataframe(view.arrow())
     if operation == "Create":
 
         # Pass the tuple items directly to the insert function for metadata
@@ -149,22 +212,15 @@ def crud(operation):
             else:
                 st.error("Unable to delete Dataset Metadata '{}'.".format(dataset_name))
 
-def Streaming(completion):
+def Streaming(completion, context=None):
     """
         Explanation: Takes delta time and displays ChatGPT response in small chunks
+        Redraws are throttled by StreamRenderer instead of happening on every chunk
+        If a ConversationContext is given, the arrival of the first chunk is recorded on it
     """
-    container = st.empty()
-    fullReply = ""
-    
-    for chunk in completion:
-        delta = chunk.choices[0].delta
-        if delta.content:
-            fullReply += delta.content
-            container.markdown(fullReply + "▌") # Add cursor effect, character is "Left Hand Block"
-    
-    # Remove cursor and show final response
-    container.markdown(fullReply)
-    return fullReply
+    renderer = StreamRenderer(st.empty())
+    onFirst = context.mark_first_token if context is not None else None
+    return renderer.render(completion, on_first=onFirst)
 
 def DisplayPrevMsgs():
 
@@ -182,26 +238,34 @@ def AIAssistant():
     DisplayPrevMsgs()
     
     prompt = st.chat_input("Prompt our data expert (GPT 4.0mini)...")
-    gptMsg = [{"role": "system", "content": "You are a data expert, you hold knowledge specialising in dataset metadata and analysis. Make sure your responses are not too long"}]
     if prompt:
         #Save user response
         st.session_state.dtMsgs.append({ "role": "user", "content": prompt })
         with st.chat_message("user"): 
             st.markdown(prompt)
         
-        # Call OpenAI API with streaming
+        # Call the shared assistant service with streaming
+        # Only recent turns plus a summary of older ones are sent,
+        # with a cached summary of the live data in the system prompt
+        # and whitelisted aggregate queries the model can call as tools
+        context = st.session_state.dtCtx
+        tools = get_analytics_tools("datasets")
+        context.set_system_prompt(get_data_context("datasets").system_prompt(SYSTEM_PROMPT) + tools.instructions())
+        messages = context.build(st.session_state.dtMsgs)
         with st.spinner("Thinking..."):
-            completion = client.chat.completions.create( 
-                model = "gpt-4o-mini",
-                messages = gptMsg + st.session_state.dtMsgs,
-                stream = True,
-            )
+            context.mark_request()
+            try:
+                completion = assistant.stream_chat(messages, tools=tools.specs(), tool_handler=tools.call)
+            except AssistantBusyError as error:
+                st.error(str(error))
+                return
             
         with st.chat_message("assistant"):
-            fullReply = Streaming(completion)
+            fullReply = Streaming(completion, context)
         
         #Save AI response
         st.session_state.dtMsgs.append({ "role": "assistant", "content": fullReply })
+        st.caption(context.describe())
 
 def logout():
     """
@@ -217,17 +281,35 @@ def logout():
         st.switch_page("home.py")
 
 if __name__ == "__main__":
-   
-    client = OpenAI(api_key = st.secrets['OPENAI_API_KEY'])
+    # Logged-out visitors stop here, before the AI client and workers are set up
     check_login()
+    # The data, chart and analytics modules load numpy, pandas and pyarrow, so they are
+    # imported only once the visitor is logged in (as plotly is, inside the chart functions)
+    import app.data.datasets as dt
+    from app.services.data_context import get_data_context
+    from app.services.analytics_tools import get_analytics_tools
+    from app.services.live_views import get_live_view
+    from app.services.snapshots import get_snapshot, start_snapshot_worker
+    from app.services.storage_analytics import size_percentiles, largest_datasets, cumulative_growth, project_storage
+    from app.data.columnar import start_columnar_exporter
+    # One pooled client is shared by every rerun and session
+    try:
+        apiKey = st.secrets.get('OPENAI_API_KEY')
+    except StreamlitSecretNotFoundError:  # No secrets.toml: the OpenAI client reads OPENAI_API_KEY from the environment
+        apiKey = None
+    assistant = get_assistant(apiKey)
+    # Chart snapshots (and, with COLUMNAR_SNAPSHOTS=1, Parquet copies for the
+    # aggregate queries) are rebuilt in the background as the data changes
+    start_snapshot_worker()
+    start_columnar_exporter()
     st.title("Dataset Metadata Dashboard")
     analysis,crudop,ai = st.tabs(["Data Analysis","CRUD Operations","AI Assistant"])
     with analysis:
         st.subheader("Datasets Metadata Analysis Dashboard")
         column=selectcolumn()
-        data=dt.get_all_metadata("",column)
-        barchart(data,column)
-        piechart(column)
+        livecharts(column)
+        storagepanel()
+        profilerpanel()
     with crudop:
         st.subheader("Manage Dataset Metadata")
         operation = st.selectbox("Select Operation", ["Read", "Create", "Update", "Delete"])
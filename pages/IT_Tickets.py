@@ -1,10 +1,16 @@
 import streamlit as st
-import app.data.tickets as tickets
-import plotly.express as exp
-from openai import OpenAI
+from streamlit.errors import StreamlitSecretNotFoundError
+from app.services.ai_assistant import get_assistant, AssistantBusyError
+from app.services.context_manager import ConversationContext
+from app.services.stream_renderer import StreamRenderer
+from app.data.changes import POLL_SECONDS
+from app.data.status_history import ENTITY_TICKET
+from app.data.retention import start_retention_worker
 from datetime import datetime
 
 
+SYSTEM_PROMPT = "You are an IT expert, you hold knowledge specialising in office related IT incidents. Make sure your responses are not too long"
+
 def debug(*args):
     """
     Debugging function to print arguments to console.
@@ -23,6 +29,8 @@ def check_login():
         st.session_state.logged_in = False
     if 'itMsgs' not in st.session_state:
         st.session_state.itMsgs = [] 
+    if 'itCtx' not in st.session_state:
+        st.session_state.itCtx = ConversationContext(SYSTEM_PROMPT)
 
     # 2. The Check
     if not st.session_state.logged_in:
@@ -51,41 +59,35 @@ def barchart(data, xAxis: str):
     st.subheader("Breakdown of "+xAxis)
 
     # Updated title to match the dataset (assuming xAxis maps to subject/priority)
+    import plotly.express as exp
     fig = exp.bar(data, x=xAxis,y="COUNT(*)", title=xAxis+" Distribution")
     
     st.plotly_chart(fig)
 
-def linechart(df):
+def linechart(df, version=None):
     """
     Creates a line chart and Contains all the dates
     grouped by the no of records in each date.
+    Long histories are downsampled to the chart width and the built
+    figure is reused until the data version changes.
     """
     st.subheader("Tickets Over Time")
-    
-    # Updated column to 'created_date'
-    print(df)
-    date_counts = df['created_date'].value_counts().sort_index()
-    cntvalues= df['COUNT(*)'].values
-    fig = exp.line(
-        x=date_counts.index, 
-        y=cntvalues, 
-        labels={'x': 'Date', 'y': 'Number of Tickets'}, 
-        title="Tickets Over Time"
-    )
-    st.plotly_chart(fig)
+    build = lambda: line_figure(df['created_date'], df['COUNT(*)'], title="Tickets Over Time",
+                                labels={'x': 'Date', 'y': 'Number of Tickets'},
+                                width_px=CENTERED_LAYOUT_PX)
+    fig = build() if version is None else get_figure_cache().get("tickets_by_date", (), version, build)
+    st.plotly_chart(fig, width=CENTERED_LAYOUT_PX)
 
-def piechart(column) -> None:
+def piechart(column, data) -> None:
     """
     Creates a pie chart showing the distribution of ticket subjects.
     """
     st.subheader(column+" Distribution")
     
-    # Use the updated function to get the dataframe
-    data = tickets.get_all_tickets("",column)
-    
     # 'subject' is the equivalent of 'incident_type' in the new CSV
     subject_counts = data[column].value_counts()
     cntvalues= data['COUNT(*)'].values   
+    import plotly.express as exp
     fig = exp.pie(
         values=cntvalues, 
         names=subject_counts.index, 
@@ -93,6 +95,54 @@ def piechart(column) -> None:
     )
     st.plotly_chart(fig)
 
+@st.fragment(run_every=POLL_SECONDS)
+def livecharts(column):
+    """
+    Draws the ticket charts from the latest snapshot.
+    Reruns every POLL_SECONDS on its own; the background worker rebuilds
+    the snapshot whenever the data changes.
+    """
+    snapshot = get_snapshot("it")
+    data = snapshot.counts(column)
+    barchart(data, column)
+    piechart(column, data)
+    linechart(snapshot.series(), snapshot.version)
+    st.caption(snapshot.describe())
+
+def spikes():
+    """
+    Flags days where a ticket subject had unusually many tickets compared with the
+    28 days before, from the shared spike detector (only new changes are applied).
+    """
+    st.subheader("Volume Spikes")
+    detector = get_spike_detector("it")
+    detector.refresh()
+    flagged = detector.flagged(days=90)
+    if flagged.empty:
+        st.caption("No unusual volume in the last 90 days of data.")
+        return
+    latest = flagged["date"].iloc[0]
+    st.warning("Latest spike on {}: {}".format(latest, ", ".join(flagged.loc[flagged["date"] == latest, "subject"])))
+    st.dataframe(flagged, hide_index=True)
+
+def statusmetrics():
+    """
+    Shows time-to-resolve percentiles, reopen rate and open backlog over time,
+    from the status history aggregates (only new events are processed).
+    """
+    st.subheader("Resolution Metrics")
+    run_status_jobs()
+    mttr = mttr_percentiles(ENTITY_TICKET)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Median time to resolve", "{:.1f} h".format(mttr[50]) if mttr else "n/a")
+    col2.metric("90th percentile", "{:.1f} h".format(mttr[90]) if mttr else "n/a")
+    col3.metric("Reopen rate", "{:.1%}".format(reopen_rate(ENTITY_TICKET)))
+    days, backlog = backlog_by_day(ENTITY_TICKET)
+    if len(days):
+        fig = line_figure(days, backlog, labels={'x': 'Date', 'y': 'Open Tickets'}, title="Open Tickets Backlog",
+                          width_px=CENTERED_LAYOUT_PX)
+        st.plotly_chart(fig, width=CENTERED_LAYOUT_PX)
+
 def insertticket():
     """
     Collect ticket details from user input based on CSV values.
@@ -161,7 +211,9 @@ def crud(operation):
     Read, Handle, Create, Update, or Delete operations for IT Tickets.
     """
     if operation =="Read":
-        st.dataframe(tickets.get_tickets_dataframe(""))
+        view = get_live_view("it_tickets")
+        view.refresh()
+        st.dataframe(view.arrow())
     if operation == "Create":
 
         # Pass the tuple items directly to the insert function for tickets
@@ -187,22 +239,15 @@ def crud(operation):
             else:
                 st.error("Unable to delete ticket '{}'.".format(values))
 
-def Streaming(completion):
+def Streaming(completion, context=None):
     """
         Explanation: Takes delta time and displays ChatGPT response in small chunks
+        Redraws are throttled by StreamRenderer instead of happening on every chunk
+        If a ConversationContext is given, the arrival of the first chunk is recorded on it
     """
-    container = st.empty()
-    fullReply = ""
-    
-    for chunk in completion:
-        delta = chunk.choices[0].delta
-        if delta.content:
-            fullReply += delta.content
-            container.markdown(fullReply + "▌") # Add cursor effect, character is "Left Hand Block"
-    
-    # Remove cursor and show final response
-    container.markdown(fullReply)
-    return fullReply
+    renderer = StreamRenderer(st.empty())
+    onFirst = context.mark_first_token if context is not None else None
+    return renderer.render(completion, on_first=onFirst)
 
 def DisplayPrevMsgs():
     """
@@ -222,26 +267,34 @@ def AIAssistant():
     DisplayPrevMsgs()
     
     prompt = st.chat_input("Prompt our IT expert (GPT 4.0mini)...")
-    gptMsg = [{"role": "system", "content": "You are an IT expert, you hold knowledge specialising in office related IT incidents. Make sure your responses are not too long"}]
     if prompt:
         #Save user response
         st.session_state.itMsgs.append({ "role": "user", "content": prompt })
         with st.chat_message("user"): 
             st.markdown(prompt)
         
-        # Call OpenAI API with streaming
+        # Call the shared assistant service with streaming
+        # Only recent turns plus a summary of older ones are sent,
+        # with a cached summary of the live data in the system prompt
+        # and whitelisted aggregate queries the model can call as tools
+        context = st.session_state.itCtx
+        tools = get_analytics_tools("it")
+        context.set_system_prompt(get_data_context("it").system_prompt(SYSTEM_PROMPT) + tools.instructions())
+        messages = context.build(st.session_state.itMsgs)
         with st.spinner("Thinking..."):
-            completion = client.chat.completions.create( 
-                model = "gpt-4o-mini",
-                messages = gptMsg + st.session_state.itMsgs,
-                stream = True,
-            )
+            context.mark_request()
+            try:
+                completion = assistant.stream_chat(messages, tools=tools.specs(), tool_handler=tools.call)
+            except AssistantBusyError as error:
+                st.error(str(error))
+                return
             
         with st.chat_message("assistant"):
-            fullReply = Streaming(completion)
+            fullReply = Streaming(completion, context)
         
         #Save AI response
         st.session_state.itMsgs.append({ "role": "assistant", "content": fullReply })
+        st.caption(context.describe())
 
 def logout():
     """
@@ -256,20 +309,40 @@ def logout():
     # 2. Redirect immediately
         st.switch_page("home.py")
 
-if __name__ == "__main__": 
-    
-
-    client = OpenAI(api_key = st.secrets['OPENAI_API_KEY'])
+if __name__ == "__main__":
+    # Logged-out visitors stop here, before the AI client and workers are set up
     check_login()
+    # The data, chart and analytics modules load numpy, pandas and pyarrow, so they are
+    # imported only once the visitor is logged in (as plotly is, inside the chart functions)
+    import app.data.tickets as tickets
+    from app.services.data_context import get_data_context
+    from app.services.analytics_tools import get_analytics_tools
+    from app.services.status_metrics import run_status_jobs, mttr_percentiles, reopen_rate, backlog_by_day
+    from app.services.live_views import get_live_view
+    from app.services.snapshots import get_snapshot, start_snapshot_worker
+    from app.services.chart_reduction import line_figure, get_figure_cache, CENTERED_LAYOUT_PX
+    from app.services.anomaly_detection import get_spike_detector
+    from app.data.columnar import start_columnar_exporter
+    # One pooled client is shared by every rerun and session
+    try:
+        apiKey = st.secrets.get('OPENAI_API_KEY')
+    except StreamlitSecretNotFoundError:  # No secrets.toml: the OpenAI client reads OPENAI_API_KEY from the environment
+        apiKey = None
+    assistant = get_assistant(apiKey)
+    # Chart snapshots (and, with COLUMNAR_SNAPSHOTS=1, Parquet copies for the
+    # aggregate queries) are rebuilt in the background as the data changes
+    start_snapshot_worker()
+    start_columnar_exporter()
+    # With RETENTION_ARCHIVING=1, old closed/resolved rows move to monthly archive tables daily
+    start_retention_worker()
     st.title("IT Tickets Dashboard")
     analysis,crudop,ai = st.tabs(["Data Analysis","CRUD Operations","AI Assistant"])
     with analysis:
         st.subheader("IT Tickets Analysis Dashboard")
         column=selectcolumn()
-        data=tickets.get_all_tickets("",column)
-        barchart(data,column)
-        piechart(column)
-        linechart(tickets.get_all_tickets("","created_date"))
+        livecharts(column)
+        spikes()
+        statusmetrics()
     with crudop:
         st.subheader("Manage IT Tickets")
         operation = st.selectbox("Select Operation", ["Read", "Create", "Update", "Delete"])
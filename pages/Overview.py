@@ -0,0 +1,88 @@
+import streamlit as st
+
+def check_login():
+    """
+    Check if user is logged in and handle redirection.
+    """
+    # 1. Initialize Default State
+    if 'username' not in st.session_state:
+        st.session_state.username = None
+    if 'logged_in' not in st.session_state:
+        st.session_state.logged_in = False
+
+    # 2. The Check
+    if not st.session_state.logged_in:
+        st.warning("Please log in to access the Overview dashboard.")
+
+        # 3. Navigation Button
+        if st.button("Go to Login Page"):
+            st.switch_page("home.py")
+        st.stop()
+
+def selectoptions():
+    """
+    Select the time bucket size and the lag to show.
+    """
+    st.divider()
+    col1, col2 = st.columns(2)
+    buckets = {"Day": 1, "Week": 7, "Month": 30}
+    bucket = col1.selectbox("Time bucket", list(buckets), index=1)
+    maxLag = col2.slider("Maximum lag (buckets)", min_value=0, max_value=8, value=4)
+    return buckets[bucket], maxLag
+
+def heatmap(result, lag):
+    """
+    Create and display a heatmap of incident type vs ticket subject correlations.
+    lag=None shows, per pair, the strongest correlation at any lag.
+    """
+    if lag is None:
+        values, _ = result.strongest()
+        title = "Strongest correlation at any lag"
+    else:
+        values = result.at_lag(lag)
+        title = "Correlation with tickets {} buckets {}".format(abs(lag), "later" if lag >= 0 else "earlier")
+    import plotly.express as exp
+    fig = exp.imshow(values, x=result.subjects, y=result.incident_types, zmin=-1, zmax=1,
+                     color_continuous_scale="RdBu_r", aspect="auto", title=title,
+                     labels={'x': 'Ticket Subject', 'y': 'Incident Type', 'color': 'r'})
+    st.plotly_chart(fig)
+
+def toppairs(result):
+    """
+    Shows the incident type / ticket subject pairs that move together most.
+    """
+    st.subheader("Strongest Pairs")
+    rows = [{"incident_type": t, "subject": s, "correlation": round(r, 2), "lag": lag}
+            for t, s, r, lag in result.top_pairs(10)]
+    st.dataframe(rows, hide_index=True)
+    st.caption("A positive lag means the tickets follow the incidents.")
+
+def logout():
+    """
+    Log out the current user and redirect to the login page.
+    """
+    st.divider()
+    if st.button("Log Out", type="primary"):
+    # 1. Clear session state
+        st.session_state.logged_in = False
+        st.session_state.username = ""
+
+    # 2. Redirect immediately
+        st.switch_page("home.py")
+
+if __name__ == "__main__":
+    check_login()
+    # The correlation engine loads numpy, so it is imported only once the visitor is logged in
+    from app.services.correlation import get_correlations
+    st.title("Overview")
+    st.subheader("Incidents vs IT Tickets")
+    bucketDays, maxLag = selectoptions()
+    result = get_correlations(bucketDays, maxLag)
+    if result is None:
+        st.info("Both incidents and tickets are needed to compare them.")
+    else:
+        lagOptions = ["Strongest"] + result.lags
+        lag = st.select_slider("Lag", options=lagOptions, value="Strongest")
+        heatmap(result, None if lag == "Strongest" else lag)
+        toppairs(result)
+    logout()